@@ -5,19 +5,40 @@ Designed for Railway deployment.
 """
 
 import os
-import io
+import json
+import asyncio
+import hashlib
+import struct
 import logging
-from typing import Optional, List, Tuple
+from typing import Dict, Optional, List, Tuple, AsyncIterator
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from pydantic import BaseModel, Field
 import uvicorn
 
-from services.embedding_service import EmbeddingService
+from services.embedding_service import MODEL_CONFIGS, EmbeddingService
+from services.image_decoding import ImageDecodeError
+from services.image_fetcher import ImageFetcher, ImageFetchError, ImageFetchTimeout, ImageTooLarge, ImageURLRejected
+from services.video_decoding import VideoDecodeError, VideoDecoderUnavailable, sample_frames
 from services.supabase_service import SupabaseSearchService
+from services.local_search import LocalSearchService, parse_embedding_columns
 from services.translation_service import get_translation_service
+from services.text_batcher import TextBatcher
+from services.inference_executor import InferenceExecutor, InferenceQueueFull
+from services.worker_pool import WorkerPool, WorkersUnavailable
+from services.embedding_cache import QueryEmbeddingCache, normalize_query
+from services.query_embedding_store import QueryEmbeddingStore
+from services.model_registry import (
+    LoadedModel, ModelBudgetExceeded, ModelRegistry, UnknownModel, parse_search_rpcs
+)
+from services.runtime_profile import load_runtime_profile
+from services.single_flight import SingleFlight
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -29,10 +50,39 @@ DEFAULT_SUPABASE_ANON_KEY = (
 )
 
 # Global services (initialized at startup)
-embedding_service: Optional[EmbeddingService] = None
+embedding_service: Optional[EmbeddingService] = None  # the default model's service
+model_registry: Optional[ModelRegistry] = None
+query_cache: Optional[QueryEmbeddingCache] = None
+image_cache: Optional[QueryEmbeddingCache] = None  # query image embeddings keyed by content hash
+image_fetcher: Optional[ImageFetcher] = None
+search_flight: Optional[SingleFlight] = None  # collapses identical concurrent text searches
+query_store: Optional[QueryEmbeddingStore] = None
 supabase_service: Optional[SupabaseSearchService] = None
+local_search: Optional[LocalSearchService] = None  # in-process index in front of the search RPC
+video_decode_slots: Optional[asyncio.Semaphore] = None
 _supabase_init_attempted: bool = False
 
+# Services loaded by serve.py before forking workers; lifespan adopts them instead of loading again
+preloaded_services: Dict[str, EmbeddingService] = {}
+
+EMBED_BATCH_MAX_ITEMS = int(os.getenv("EMBED_BATCH_MAX_ITEMS", "5000"))
+# Unset batch sizes come from the model's runtime profile, then these defaults
+EMBED_TEXT_BATCH_SIZE = int(os.getenv("EMBED_TEXT_BATCH_SIZE", "0")) or None
+EMBED_IMAGE_BATCH_SIZE = int(os.getenv("EMBED_IMAGE_BATCH_SIZE", "0")) or None
+DEFAULT_EMBED_TEXT_BATCH_SIZE = 64
+DEFAULT_EMBED_IMAGE_BATCH_SIZE = 16
+
+# Video query limits: decoding runs off the inference executor, bounded per clip and in concurrency
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "1.0"))
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "16"))
+VIDEO_MAX_DURATION_SECONDS = float(os.getenv("VIDEO_MAX_DURATION_SECONDS", "60"))
+VIDEO_MAX_DECODE_SECONDS = float(os.getenv("VIDEO_MAX_DECODE_SECONDS", "10"))
+VIDEO_MAX_UPLOAD_BYTES = int(float(os.getenv("VIDEO_MAX_UPLOAD_MB", "100")) * 1024 * 1024)
+VIDEO_DECODE_WAIT_SECONDS = float(os.getenv("VIDEO_DECODE_WAIT_SECONDS", "2"))
+
+# Binary frame header for /embed/batch?format=float32: kind, start index, count, dim
+EMBED_FRAME_HEADER = struct.Struct("<cIII")
+
 
 SUPABASE_KEY_ENV_VARS = [
     "SUPABASE_KEY",  # existing default
@@ -122,22 +172,176 @@ def get_supabase_service() -> Optional[SupabaseSearchService]:
             )
         return None
 
+def get_search_service() -> Optional[SupabaseSearchService]:
+    """Return the service that answers searches: the local index when enabled (it falls back to Supabase itself)."""
+    db_service = get_supabase_service()
+    if db_service is not None and local_search is not None:
+        return local_search
+    return db_service
+
+
+def create_embedding_service(
+    model_name: str,
+    preload_vision: bool = False,
+    runtime_profile: Optional[dict] = None,
+    defer_warmup: bool = False
+) -> EmbeddingService:
+    """
+    Load an EmbeddingService configured from the environment.
+
+    Args:
+        model_name: MODEL_CONFIGS name
+        preload_vision: Load the vision tower now instead of on first use
+        runtime_profile: Autotuned thread and batch settings, if any
+        defer_warmup: Leave warmup to a later service.warmup() call (see EmbeddingService)
+
+    Returns:
+        Loaded EmbeddingService
+    """
+    device = os.getenv("DEVICE", "auto")
+    backend = os.getenv("INFERENCE_BACKEND", "torch").lower()
+    logger.info(f"Loading CLIP model: {model_name} on device: {device} (backend: {backend})")
+    return EmbeddingService(
+        model_name=model_name,
+        device=device,
+        backend=backend,
+        onnx_cache_dir=os.getenv("ONNX_CACHE_DIR"),
+        onnx_tolerance=float(os.getenv("ONNX_TOLERANCE", "1e-3")),
+        quantize=os.getenv("QUANTIZE") or None,
+        quantize_min_cosine=float(os.getenv("QUANTIZE_MIN_COSINE", "0.98")),
+        max_image_pixels=int(os.getenv("MAX_IMAGE_PIXELS", "100000000")),
+        decode_workers=int(os.getenv("DECODE_WORKERS", "4")),
+        decode_prefetch=int(os.getenv("DECODE_PREFETCH_BATCHES", "2")),
+        preload_vision=preload_vision,
+        torch_compile=os.getenv("TORCH_COMPILE", "false").lower() == "true",
+        compile_cache_dir=os.getenv("TORCH_COMPILE_CACHE_DIR"),
+        warmup_batch_sizes=[int(size) for size in os.getenv("WARMUP_BATCH_SIZES", "1,8").split(",") if size.strip()],
+        defer_warmup=defer_warmup,
+        runtime_profile=runtime_profile or None,
+        weight_cache=os.getenv("WEIGHT_CACHE", "false").lower() == "true",
+        weight_cache_dir=os.getenv("WEIGHT_CACHE_DIR"),
+    )
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events."""
-    global embedding_service, supabase_service
+    global embedding_service, model_registry, query_cache, query_store, supabase_service, video_decode_slots
+    global image_cache, image_fetcher, search_flight, local_search
 
     # Startup: Load model and initialize services
     logger.info("Starting up Saga Search API...")
 
-    # Initialize embedding service (loads CLIP model)
+    # Initialize embedding service (loads CLIP model, unless serve.py preloaded it)
     model_name = os.getenv("CLIP_MODEL", "clip-ViT-B-32-multilingual-v1")
-    device = os.getenv("DEVICE", "auto")
-    logger.info(f"Loading CLIP model: {model_name} on device: {device}")
+    executor_kind = os.getenv("INFERENCE_EXECUTOR", "thread").lower()
+    inference_workers = int(os.getenv("INFERENCE_WORKERS", "1"))
+    inference_queue_depth = int(os.getenv("INFERENCE_QUEUE_DEPTH", "64"))
+
+    # The vision tower loads on the first image request unless preloaded; forked
+    # workers need it before the fork so they share its weights
+    preload_vision = os.getenv("PRELOAD_VISION", "false").lower() == "true" or executor_kind == "process"
+
+    def _load_model_runtime(name: str, on_demand: bool = True) -> LoadedModel:
+        """Load one model together with its own inference executor and text batcher."""
+        runtime_profile = load_runtime_profile(os.getenv("RUNTIME_PROFILE"), name) or {}
+        service = preloaded_services.pop(name, None)
+        if service is not None:
+            logger.info(f"Using preloaded CLIP model: {name}")
+        else:
+            service = create_embedding_service(
+                name, preload_vision=preload_vision, runtime_profile=runtime_profile, defer_warmup=True
+            )
 
-    embedding_service = EmbeddingService(model_name=model_name, device=device)
+        # Run model inference on a bounded executor, off the event loop
+        kind = executor_kind
+        if kind == "process" and service.device.type != "cpu":
+            logger.warning("INFERENCE_EXECUTOR=process requires a CPU model; falling back to thread executor")
+            kind = "thread"
+        if kind == "process" and on_demand:
+            # On-demand models load on a worker thread of the running server, where forking is unsafe
+            logger.info(f"{name} loads on demand; using the thread executor instead of worker processes")
+            kind = "thread"
+
+        if kind == "process":
+            executor = WorkerPool(
+                service,
+                num_workers=inference_workers,
+                max_queue=inference_queue_depth,
+                # Not the profile's threads: forked workers must stay single-threaded
+                torch_threads=int(os.getenv("WORKER_TORCH_THREADS") or 1),
+                request_bytes=int(float(os.getenv("WORKER_REQUEST_SLOT_MB", "0.25")) * 1024 * 1024),
+            )
+        else:
+            executor = InferenceExecutor(
+                service,
+                max_workers=inference_workers,
+                max_queue=inference_queue_depth,
+            )
+            # Warm up where requests run; pool workers warm up themselves after the fork
+            service.warmup()
+
+        # Batch concurrent text queries into shared model calls
+        async def _encode_text_batch(texts: List[str]) -> np.ndarray:
+            return await executor.run("encode_text", texts, as_numpy=True)
+
+        batcher = TextBatcher(
+            encode_batch=_encode_text_batch,
+            max_batch_size=int(os.getenv("TEXT_BATCH_MAX_SIZE") or runtime_profile.get("text_batch_size") or 32),
+            max_wait_ms=float(os.getenv("TEXT_BATCH_MAX_WAIT_MS", "5")),
+        )
+        return LoadedModel(service, executor, batcher)
+
+    # The default model loads before serving; other servable models load on first request
+    model_registry = ModelRegistry(
+        loader=_load_model_runtime,
+        default=_load_model_runtime(model_name, on_demand=False),
+        servable_models=[name.strip() for name in os.getenv("SERVABLE_MODELS", "").split(",") if name.strip()],
+        memory_budget_mb=float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0")),
+        search_rpcs=parse_search_rpcs(os.getenv("MODEL_SEARCH_RPCS", "")),
+    )
+    embedding_service = model_registry.default.service
     logger.info("CLIP model loaded successfully!")
 
+    # Cache embeddings of repeated query texts
+    query_cache = QueryEmbeddingCache(
+        max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+        max_bytes=int(float(os.getenv("QUERY_CACHE_MAX_MB", "64")) * 1024 * 1024),
+    )
+
+    if os.getenv("SEARCH_SINGLE_FLIGHT", "true").lower() == "true":
+        search_flight = SingleFlight()
+
+    # Cache embeddings of repeated query images by content hash
+    image_cache = QueryEmbeddingCache(
+        max_entries=int(os.getenv("IMAGE_CACHE_SIZE", "256")),
+        max_bytes=int(float(os.getenv("IMAGE_CACHE_MAX_MB", "16")) * 1024 * 1024),
+    )
+
+    # One pooled HTTP client for /search/image-url
+    image_fetcher = ImageFetcher(
+        max_bytes=int(float(os.getenv("IMAGE_URL_MAX_MB", "20")) * 1024 * 1024),
+        timeout_seconds=float(os.getenv("IMAGE_URL_TIMEOUT_SECONDS", "10")),
+        max_connections=int(os.getenv("IMAGE_URL_MAX_CONNECTIONS", "20")),
+        allow_private_hosts=os.getenv("IMAGE_URL_ALLOW_PRIVATE", "false").lower() == "true",
+        max_pixels=int(os.getenv("MAX_IMAGE_PIXELS", "100000000")),
+    )
+
+    # Persist query embeddings on disk so they survive restarts
+    query_store_dir = os.getenv("QUERY_STORE_DIR")
+    if query_store_dir:
+        try:
+            query_store = QueryEmbeddingStore(
+                directory=query_store_dir,
+                max_records=int(os.getenv("QUERY_STORE_MAX_RECORDS", "100000")),
+                read_only=os.getenv("QUERY_STORE_READ_ONLY", "false").lower() == "true",
+            )
+        except Exception as exc:
+            logger.error("Failed to open query embedding store: %s", exc)
+            query_store = None
+
+    video_decode_slots = asyncio.Semaphore(max(1, int(os.getenv("VIDEO_DECODE_CONCURRENCY", "2"))))
+
     # Initialize Supabase service
     supabase_url, supabase_key, key_source, key_is_default, url_source = _get_supabase_env()
 
@@ -159,12 +363,79 @@ async def lifespan(app: FastAPI):
         logger.error("Failed to initialize Supabase service: %s", exc)
         supabase_service = None
 
+    # Optionally answer embedding searches from an in-process index; it loads and syncs
+    # in the background and the RPC serves every search until it is ready
+    local_index_kind = os.getenv("LOCAL_INDEX", "").lower()
+    local_index_task = None
+    if local_index_kind and supabase_service:
+        if local_index_kind == "hnsw":
+            index_params = {
+                "m": int(os.getenv("HNSW_M", "16")),
+                "ef_construction": int(os.getenv("HNSW_EF_CONSTRUCTION", "200")),
+                "ef_search": int(os.getenv("HNSW_EF_SEARCH", "64")),
+            }
+        elif local_index_kind == "ivfpq":
+            index_params = {
+                "nlist": int(os.getenv("IVFPQ_NLIST", "256")),
+                "nprobe": int(os.getenv("IVFPQ_NPROBE", "16")),
+                "m": int(os.getenv("IVFPQ_M", "0")),
+                "rerank": int(os.getenv("IVFPQ_RERANK", "100")),
+                "train_size": int(os.getenv("IVFPQ_TRAIN_SIZE", "20000")),
+                "storage_dir": os.getenv("LOCAL_INDEX_DIR"),
+            }
+        else:
+            index_params = {
+                "block_rows": int(os.getenv("EXACT_BLOCK_ROWS", "65536")),
+                "storage_dir": os.getenv("LOCAL_INDEX_DIR"),
+            }
+        local_search = LocalSearchService(
+            supabase_service,
+            index_kind=local_index_kind,
+            index_params=index_params,
+            embedding_columns=parse_embedding_columns(
+                os.getenv("LOCAL_INDEX_COLUMNS", "visual=visual_embedding,text=text_embedding,combined=combined_embedding")
+            ),
+            rpc_name=os.getenv("LOCAL_INDEX_RPC", "search_media_by_embedding"),
+            page_size=int(os.getenv("LOCAL_INDEX_PAGE_SIZE", "1000")),
+            state_dir=os.getenv("LOCAL_INDEX_DIR"),
+            reconcile_seconds=float(os.getenv("LOCAL_INDEX_RECONCILE_SECONDS", "3600")),
+            save_seconds=float(os.getenv("LOCAL_INDEX_SAVE_SECONDS", "300")),
+            shards=int(os.getenv("LOCAL_INDEX_SHARDS", "1")),
+            shard_timeout_seconds=float(os.getenv("LOCAL_INDEX_SHARD_TIMEOUT_SECONDS", "10")),
+            sync_overlap_seconds=float(os.getenv("LOCAL_INDEX_SYNC_OVERLAP_SECONDS", "30")),
+        )
+        sync_seconds = float(os.getenv("LOCAL_INDEX_SYNC_SECONDS", "60"))
+
+        async def _run_local_index():
+            """Load the index, then apply table changes every sync_seconds (retrying a failed load)."""
+            try:
+                await asyncio.to_thread(local_search.load)
+            except Exception as exc:
+                logger.error("Failed to load local search index; searches use the RPC: %s", exc)
+            while sync_seconds > 0:
+                await asyncio.sleep(sync_seconds)
+                try:
+                    await asyncio.to_thread(local_search.sync)
+                except Exception as exc:
+                    logger.warning("Local search index sync failed: %s", exc)
+
+        local_index_task = asyncio.create_task(_run_local_index())
+
     logger.info("Saga Search API ready!")
 
     yield
 
     # Shutdown
     logger.info("Shutting down Saga Search API...")
+    if model_registry:
+        for loaded_model in model_registry.loaded_models():
+            loaded_model.shutdown()
+    if image_fetcher:
+        await image_fetcher.aclose()
+    if local_index_task and not local_index_task.done():
+        local_index_task.cancel()
+    if local_search:
+        local_search.shutdown()
 
 
 # Create FastAPI app
@@ -224,6 +495,7 @@ class TextSearchRequest(BaseModel):
         default=False,
         description="When enabled, translates Icelandic query to English for visual search (improves results for non-English queries)"
     )
+    model: Optional[str] = Field(default=None, description="Model to encode the query with (default: the CLIP_MODEL model)")
 
 
 class TextSearchResponse(BaseModel):
@@ -236,6 +508,17 @@ class TextSearchResponse(BaseModel):
     count: int
 
 
+class ImageUrlSearchRequest(BaseModel):
+    """Request body for search by image URL."""
+    url: str = Field(..., description="http(s) URL of the query image", min_length=1)
+    search_type: str = Field(default="combined", description="Embedding type: 'visual', 'text', or 'combined'")
+    limit: int = Field(default=20, ge=1, le=100, description="Max results to return")
+    threshold: float = Field(default=0.0, ge=0.0, le=1.0, description="Minimum similarity threshold")
+    file_type: Optional[str] = Field(default=None, description="Filter by file type: 'image' or 'video'")
+    decade: Optional[str] = Field(default=None, description="Filter by decade (e.g., '1950s')")
+    model: Optional[str] = Field(default=None, description="Model to encode the image with (default: the CLIP_MODEL model)")
+
+
 class ImageSearchResponse(BaseModel):
     """Response for image search."""
     search_type: str
@@ -243,6 +526,15 @@ class ImageSearchResponse(BaseModel):
     count: int
 
 
+class VideoSearchResponse(BaseModel):
+    """Response for video clip search."""
+    search_type: str
+    pooling: str
+    frames_sampled: int
+    results: List[SearchResult]
+    count: int
+
+
 class HealthResponse(BaseModel):
     """Health check response."""
     status: str
@@ -251,6 +543,14 @@ class HealthResponse(BaseModel):
     supabase_connected: bool
     supabase_url_set: bool
     supabase_key_set: bool
+    inference_executor: Optional[dict] = None
+    query_cache: Optional[dict] = None
+    query_store: Optional[dict] = None
+    image_cache: Optional[dict] = None
+    image_fetcher: Optional[dict] = None
+    single_flight: Optional[dict] = None
+    local_index: Optional[dict] = None
+    models: Optional[dict] = None
 
 
 # --- Helper Functions ---
@@ -311,6 +611,152 @@ def _merge_hybrid_results(
     return merged[:limit]
 
 
+def _merge_multi_vector_results(result_lists: List[List[dict]], limit: int) -> List[dict]:
+    """
+    Merge per-frame search results, scoring each item by its best-matching frame.
+
+    Args:
+        result_lists: One result list per query vector
+        limit: Maximum results to return
+
+    Returns:
+        Merged results sorted by max similarity
+    """
+    best_by_id = {}
+    for results in result_lists:
+        for result in results:
+            best = best_by_id.get(result["id"])
+            if best is None or result["similarity_score"] > best["similarity_score"]:
+                best_by_id[result["id"]] = result
+
+    merged = sorted(best_by_id.values(), key=lambda x: x["similarity_score"], reverse=True)
+    return merged[:limit]
+
+
+@asynccontextmanager
+async def _use_model(model_name: Optional[str]) -> AsyncIterator[LoadedModel]:
+    """Hold a registry model for a request, turning registry errors into HTTP errors."""
+    try:
+        async with model_registry.use(model_name) as model:
+            yield model
+    except UnknownModel as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ModelBudgetExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+def _profile_setting(model: LoadedModel, key: str, default: int) -> int:
+    """Return a setting from the model's runtime profile, or the default without one."""
+    return (model.service.runtime_profile or {}).get(key) or default
+
+
+def _search_rpc(model: LoadedModel) -> str:
+    """Return the Supabase RPC that searches the embedding columns of a model's embedding space."""
+    return model_registry.search_rpc(model.model_name)
+
+
+async def _encode_query_text(text: str, model: LoadedModel) -> np.ndarray:
+    """
+    Encode a query text, consulting the in-process cache and the on-disk store before inference.
+
+    Args:
+        text: Query text (original or translated)
+        model: Registry model to encode with
+
+    Returns:
+        Query embedding as a float32 array
+    """
+    normalized = normalize_query(text)
+    model_name = model.model_name
+    embedding = query_cache.get(model_name, normalized)
+    if embedding is not None:
+        return embedding
+
+    if query_store:
+        # File I/O: kept off the event loop
+        embedding = await asyncio.to_thread(query_store.get, model_name, normalized)
+        if embedding is not None:
+            query_cache.put(model_name, normalized, embedding)
+            return embedding
+
+    embedding = await model.batcher.encode(normalized)
+    query_cache.put(model_name, normalized, embedding)
+    if query_store:
+        await asyncio.to_thread(query_store.put, model_name, normalized, embedding)
+    return embedding
+
+
+async def _encode_query_image(image_bytes: bytes, model: LoadedModel) -> np.ndarray:
+    """
+    Encode a query image, reusing the embedding of identical bytes seen before.
+
+    Args:
+        image_bytes: Encoded image
+        model: Registry model to encode with
+
+    Returns:
+        Query embedding as a float32 array
+
+    Raises:
+        HTTPException: 400 for undecodable images, 503 when the executor is full, 500 otherwise
+    """
+    content_hash = "sha256:" + hashlib.sha256(image_bytes).hexdigest()
+    embedding = image_cache.get(model.model_name, content_hash)
+    if embedding is not None:
+        return embedding
+
+    try:
+        await _ensure_vision_tower(model)
+        embedding = await model.executor.run("encode_image", image_bytes, as_numpy=True)
+    except (InferenceQueueFull, WorkersUnavailable) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+    except Exception as e:
+        logger.error(f"Failed to encode image: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to encode image: {str(e)}"
+        )
+
+    image_cache.put(model.model_name, content_hash, embedding)
+    return embedding
+
+
+async def _ensure_vision_tower(model: LoadedModel):
+    """Load the vision tower on first use, off the inference executor so text queries keep flowing."""
+    if not model.service.is_loaded("vision"):
+        await asyncio.to_thread(model.service.load_tower, "vision")
+
+
+async def _run_inference_with_backoff(model: LoadedModel, method: str, *args, attempts: int = 20, **kwargs):
+    """
+    Run an inference call, waiting for queue space instead of failing immediately.
+
+    Used by streaming endpoints, which cannot turn a full queue into a 503 once
+    the response has started.
+    """
+    for attempt in range(attempts):
+        try:
+            return await model.executor.run(method, *args, **kwargs)
+        except InferenceQueueFull:
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(0.05 * (attempt + 1))
+
+
+def _embed_frame(kind: bytes, start: int, vectors: np.ndarray) -> bytes:
+    """Encode a batch of vectors as one binary frame."""
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    return EMBED_FRAME_HEADER.pack(kind, start, vectors.shape[0], vectors.shape[1]) + vectors.tobytes()
+
+
+def _embed_error_frame(start: int, message: str) -> bytes:
+    """Encode an item error as a binary frame (the dim field holds the message length)."""
+    payload = message.encode("utf-8")
+    return EMBED_FRAME_HEADER.pack(b"E", start, 1, len(payload)) + payload
+
+
 # --- Endpoints ---
 
 @app.get("/", tags=["Info"])
@@ -337,11 +783,19 @@ async def health_check():
 
     return HealthResponse(
         status="healthy",
-        model_loaded=embedding_service is not None and embedding_service.model is not None,
+        model_loaded=embedding_service is not None and embedding_service.is_loaded("text"),
         model_name=embedding_service.model_name if embedding_service else "not loaded",
         supabase_connected=db_service is not None,
         supabase_url_set=supabase_url_set,
-        supabase_key_set=supabase_key_set
+        supabase_key_set=supabase_key_set,
+        inference_executor=model_registry.default.executor.stats() if model_registry else None,
+        models=model_registry.stats() if model_registry else None,
+        query_cache=query_cache.stats() if query_cache else None,
+        query_store=query_store.stats() if query_store else None,
+        image_cache=image_cache.stats() if image_cache else None,
+        image_fetcher=image_fetcher.stats() if image_fetcher else None,
+        single_flight=search_flight.stats() if search_flight else None,
+        local_index=local_search.stats() if local_search else None
     )
 
 
@@ -365,7 +819,31 @@ async def search_by_text(
     When `ai_enhance=true`, the query is translated from Icelandic to English
     for the visual embedding search, which can improve results for non-English queries.
     The text search component (in hybrid mode) uses the original Icelandic query.
+
+    Identical searches arriving while one is already running wait for and share its result.
     """
+    if not search_flight:
+        return await _search_by_text(request)
+
+    key = (
+        normalize_query(request.query),
+        request.search_type,
+        request.limit,
+        request.threshold,
+        request.file_type,
+        request.decade,
+        request.ai_enhance,
+        request.model or model_registry.default_model,
+    )
+    response = await search_flight.run(key, lambda: _search_by_text(request))
+    if response.query != request.query:
+        # Shared with a request whose query differed only in normalization
+        response = response.model_copy(update={"query": request.query})
+    return response
+
+
+async def _search_by_text(request: TextSearchRequest) -> TextSearchResponse:
+    """Run one text search: translate, encode and query Supabase."""
     if not embedding_service:
         raise HTTPException(
             status_code=503,
@@ -373,7 +851,7 @@ async def search_by_text(
         )
 
     # Try to get or initialize Supabase service
-    db_service = get_supabase_service()
+    db_service = get_search_service()
     if not db_service:
         raise HTTPException(
             status_code=503,
@@ -405,14 +883,18 @@ async def search_by_text(
             logger.info(f"AI Enhance: Using translated query for embedding: '{translated_query}'")
 
     # Encode the query text
-    try:
-        query_embedding = embedding_service.encode_text(query_for_embedding)
-    except Exception as e:
-        logger.error(f"Embedding encode failed: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to encode query text: {str(e)}"
-        )
+    async with _use_model(request.model) as model:
+        try:
+            query_embedding = await _encode_query_text(query_for_embedding, model)
+        except (InferenceQueueFull, WorkersUnavailable) as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            logger.error(f"Embedding encode failed: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to encode query text: {str(e)}"
+            )
+    search_rpc = _search_rpc(model)
 
     # Search in Supabase
     try:
@@ -427,7 +909,8 @@ async def search_by_text(
                 limit=request.limit * 2,  # Fetch more to allow merging
                 threshold=0.0,  # No threshold for component searches
                 file_type=request.file_type,
-                decade=request.decade
+                decade=request.decade,
+                rpc_name=search_rpc
             )
 
             # Get text search results (using original query)
@@ -455,7 +938,8 @@ async def search_by_text(
                 limit=request.limit,
                 threshold=request.threshold,
                 file_type=request.file_type,
-                decade=request.decade
+                decade=request.decade,
+                rpc_name=search_rpc
             )
     except Exception as e:
         logger.error(f"Supabase search failed: {e}")
@@ -482,7 +966,8 @@ async def search_by_text_get(
     threshold: float = Query(default=0.0, ge=0.0, le=1.0, description="Minimum similarity"),
     file_type: Optional[str] = Query(default=None, description="Filter: 'image' or 'video'"),
     decade: Optional[str] = Query(default=None, description="Filter by decade"),
-    ai_enhance: bool = Query(default=False, description="Translate Icelandic query to English for visual search")
+    ai_enhance: bool = Query(default=False, description="Translate Icelandic query to English for visual search"),
+    model: Optional[str] = Query(default=None, description="Model to encode the query with")
 ):
     """
     Search for images using a text query (GET method).
@@ -496,7 +981,8 @@ async def search_by_text_get(
         threshold=threshold,
         file_type=file_type,
         decade=decade,
-        ai_enhance=ai_enhance
+        ai_enhance=ai_enhance,
+        model=model
     )
     return await search_by_text(request)
 
@@ -508,7 +994,8 @@ async def search_by_image(
     limit: int = Query(default=20, ge=1, le=100, description="Max results"),
     threshold: float = Query(default=0.0, ge=0.0, le=1.0, description="Minimum similarity"),
     file_type: Optional[str] = Query(default=None, description="Filter: 'image' or 'video'"),
-    decade: Optional[str] = Query(default=None, description="Filter by decade")
+    decade: Optional[str] = Query(default=None, description="Filter by decade"),
+    model: Optional[str] = Query(default=None, description="Model to encode the image with")
 ):
     """
     Search for similar images using an uploaded image.
@@ -525,7 +1012,7 @@ async def search_by_image(
         )
 
     # Try to get or initialize Supabase service
-    db_service = get_supabase_service()
+    db_service = get_search_service()
     if not db_service:
         raise HTTPException(
             status_code=503,
@@ -552,14 +1039,8 @@ async def search_by_image(
     image_bytes = await image.read()
 
     # Encode the image
-    try:
-        query_embedding = embedding_service.encode_image(io.BytesIO(image_bytes))
-    except Exception as e:
-        logger.error(f"Failed to encode image: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to encode image: {str(e)}"
-        )
+    async with _use_model(model) as loaded_model:
+        query_embedding = await _encode_query_image(image_bytes, loaded_model)
 
     # Search in Supabase
     try:
@@ -569,7 +1050,79 @@ async def search_by_image(
             limit=limit,
             threshold=threshold,
             file_type=file_type,
-            decade=decade
+            decade=decade,
+            rpc_name=_search_rpc(loaded_model)
+        )
+    except Exception as e:
+        logger.error(f"Supabase search failed: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database search failed: {str(e)}"
+        )
+
+    return ImageSearchResponse(
+        search_type=search_type,
+        results=results,
+        count=len(results)
+    )
+
+
+@app.post("/search/image-url", response_model=ImageSearchResponse, tags=["Search"])
+async def search_by_image_url(
+    request: ImageUrlSearchRequest
+):
+    """
+    Search for similar images using an image that is already online.
+
+    The image is fetched server-side (size- and time-limited, public hosts only)
+    and then searched exactly like an uploaded image.
+    """
+    if not embedding_service:
+        raise HTTPException(
+            status_code=503,
+            detail="Embedding service not initialized. Check CLIP model configuration."
+        )
+
+    db_service = get_search_service()
+    if not db_service:
+        raise HTTPException(
+            status_code=503,
+            detail="Database service not initialized. Check SUPABASE_URL and SUPABASE_KEY environment variables and redeploy."
+        )
+
+    if request.search_type not in ["visual", "text", "combined"]:
+        raise HTTPException(
+            status_code=400,
+            detail="search_type must be 'visual', 'text', or 'combined'"
+        )
+
+    logger.info(f"Image URL search: {request.url} (type={request.search_type}, limit={request.limit})")
+
+    try:
+        image_bytes = await image_fetcher.fetch(request.url)
+    except ImageURLRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ImageFetchTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ImageFetchError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+
+    async with _use_model(request.model) as loaded_model:
+        query_embedding = await _encode_query_image(image_bytes, loaded_model)
+
+    try:
+        results = await db_service.search_by_embedding(
+            embedding=query_embedding,
+            search_type=request.search_type,
+            limit=request.limit,
+            threshold=request.threshold,
+            file_type=request.file_type,
+            decade=request.decade,
+            rpc_name=_search_rpc(loaded_model)
         )
     except Exception as e:
         logger.error(f"Supabase search failed: {e}")
@@ -579,48 +1132,387 @@ async def search_by_image(
         )
 
     return ImageSearchResponse(
+        search_type=request.search_type,
+        results=results,
+        count=len(results)
+    )
+
+
+@app.post("/search/video", response_model=VideoSearchResponse, tags=["Search"])
+async def search_by_video(
+    video: UploadFile = File(..., description="Short video clip to search with"),
+    search_type: str = Query(default="combined", description="Embedding type: 'visual', 'text', or 'combined'"),
+    pooling: str = Query(default="mean", description="'mean' (one pooled query) or 'max' (one query per frame)"),
+    sample_fps: float = Query(default=VIDEO_SAMPLE_FPS, gt=0.0, le=10.0, description="Frames sampled per second"),
+    limit: int = Query(default=20, ge=1, le=100, description="Max results"),
+    threshold: float = Query(default=0.0, ge=0.0, le=1.0, description="Minimum similarity"),
+    file_type: Optional[str] = Query(default=None, description="Filter: 'image' or 'video'"),
+    decade: Optional[str] = Query(default=None, description="Filter by decade"),
+    model: Optional[str] = Query(default=None, description="Model to encode the frames with")
+):
+    """
+    Search for similar items using a short video clip.
+
+    Frames are sampled from the clip at `sample_fps` (at most `VIDEO_MAX_FRAMES`
+    frames from the first `VIDEO_MAX_DURATION_SECONDS` seconds) and encoded in one batch.
+
+    **Pooling:**
+    - `mean`: average the frame embeddings into one query (one database search)
+    - `max`: search with every frame and score each item by its best-matching frame
+
+    **Supported formats:** anything FFmpeg decodes (MP4, WebM, MOV, ...)
+    """
+    if not embedding_service:
+        raise HTTPException(
+            status_code=503,
+            detail="Embedding service not initialized. Check CLIP model configuration."
+        )
+
+    db_service = get_search_service()
+    if not db_service:
+        raise HTTPException(
+            status_code=503,
+            detail="Database service not initialized. Check SUPABASE_URL and SUPABASE_KEY environment variables and redeploy."
+        )
+
+    if search_type not in ["visual", "text", "combined"]:
+        raise HTTPException(
+            status_code=400,
+            detail="search_type must be 'visual', 'text', or 'combined'"
+        )
+    if pooling not in ["mean", "max"]:
+        raise HTTPException(status_code=400, detail="pooling must be 'mean' or 'max'")
+
+    if not video.content_type or not video.content_type.startswith("video/"):
+        raise HTTPException(status_code=400, detail="Uploaded file must be a video")
+
+    video_bytes = await video.read(VIDEO_MAX_UPLOAD_BYTES + 1)
+    if len(video_bytes) > VIDEO_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Video is larger than {VIDEO_MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+        )
+
+    logger.info(f"Video search: {video.filename} (type={search_type}, pooling={pooling}, fps={sample_fps})")
+
+    model_name = model or model_registry.default_model
+    if model_name not in model_registry.servable_models:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Model {model_name} is not served. Available: {model_registry.servable_models}"
+        )
+    vision_config = MODEL_CONFIGS[MODEL_CONFIGS[model_name].get("vision_model", model_name)]
+
+    # Decode in a bounded number of threads outside the inference executor, before
+    # taking the model, so a slow decode does not keep it from being evicted
+    try:
+        await asyncio.wait_for(video_decode_slots.acquire(), timeout=VIDEO_DECODE_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Too many videos are being decoded; retry shortly")
+    try:
+        frames = await asyncio.to_thread(
+            sample_frames,
+            video_bytes,
+            sample_fps=sample_fps,
+            max_frames=VIDEO_MAX_FRAMES,
+            max_duration_seconds=VIDEO_MAX_DURATION_SECONDS,
+            max_decode_seconds=VIDEO_MAX_DECODE_SECONDS,
+            target_size=vision_config.get("image_size", 224),
+        )
+    except VideoDecoderUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except VideoDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid video: {str(e)}")
+    finally:
+        video_decode_slots.release()
+
+    async with _use_model(model_name) as loaded_model:
+        # All frames go through the model in one executor call
+        try:
+            await _ensure_vision_tower(loaded_model)
+            frame_embeddings = await loaded_model.executor.run(
+                "encode_images_batch", frames, batch_size=len(frames), as_numpy=True
+            )
+        except (InferenceQueueFull, WorkersUnavailable) as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            logger.error(f"Failed to encode video frames: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to encode video frames: {str(e)}"
+            )
+
+    search_kwargs = dict(
         search_type=search_type,
+        threshold=threshold,
+        file_type=file_type,
+        decade=decade,
+        rpc_name=_search_rpc(loaded_model)
+    )
+    try:
+        if pooling == "mean":
+            pooled = frame_embeddings.mean(axis=0)
+            pooled /= max(float(np.linalg.norm(pooled)), 1e-12)
+            results = await db_service.search_by_embedding(embedding=pooled, limit=limit, **search_kwargs)
+        else:
+            result_lists = [
+                await db_service.search_by_embedding(embedding=vector, limit=limit, **search_kwargs)
+                for vector in frame_embeddings
+            ]
+            results = _merge_multi_vector_results(result_lists, limit)
+    except Exception as e:
+        logger.error(f"Supabase search failed: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database search failed: {str(e)}"
+        )
+
+    return VideoSearchResponse(
+        search_type=search_type,
+        pooling=pooling,
+        frames_sampled=len(frames),
         results=results,
         count=len(results)
     )
 
 
+# The multipart body is parsed by the endpoint, so it is documented here
+EMBED_BATCH_REQUEST_BODY = {
+    "requestBody": {
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "texts": {
+                            "type": "array", "items": {"type": "string"},
+                            "description": "Texts to embed (repeat the field for each text)",
+                        },
+                        "images": {
+                            "type": "array", "items": {"type": "string", "format": "binary"},
+                            "description": "Images to embed (repeat the field for each image)",
+                        },
+                    },
+                }
+            }
+        }
+    }
+}
+
+
+@app.post("/embed/batch", tags=["Embeddings"], openapi_extra=EMBED_BATCH_REQUEST_BODY)
+async def embed_batch(
+    request: Request,
+    format: str = Query(default="ndjson", description="Output format: 'ndjson' or 'float32'"),
+    batch_size: Optional[int] = Query(default=None, ge=1, le=256, description="Override the model batch size"),
+    model: Optional[str] = Query(default=None, description="Model to embed with (default: the CLIP_MODEL model)")
+):
+    """
+    Embed many texts and/or images, streaming results as each batch finishes.
+
+    Texts are encoded first, then images, in model-sized batches. Items are
+    indexed in that order: texts `0..T-1`, then images `T..T+I-1`.
+
+    **Formats:**
+    - `ndjson`: one JSON object per line: `{"index", "type", "embedding"}`,
+      or `{"index", "type", "error"}` for an item that failed
+    - `float32`: binary frames, each a 13-byte little-endian header
+      (`kind` byte `T`/`I`/`E`, `start` uint32, `count` uint32, `dim` uint32)
+      followed by `count * dim` float32 values. For `E` frames, `dim` is the
+      length of the UTF-8 error message that follows.
+
+    The form is parsed here rather than declared as parameters, because
+    Starlette's default multipart limits (1000 fields and 1000 files) are
+    below EMBED_BATCH_MAX_ITEMS.
+    """
+    if not embedding_service:
+        raise HTTPException(
+            status_code=503,
+            detail="Embedding service not initialized. Check CLIP model configuration."
+        )
+
+    if format not in ["ndjson", "float32"]:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'float32'")
+
+    model_name = model or model_registry.default_model
+    if model_name not in model_registry.servable_models:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Model {model_name} is not served. Available: {model_registry.servable_models}"
+        )
+
+    try:
+        form = await request.form(max_fields=EMBED_BATCH_MAX_ITEMS, max_files=EMBED_BATCH_MAX_ITEMS)
+    except StarletteHTTPException as e:
+        raise HTTPException(status_code=400, detail=f"Too many items (max {EMBED_BATCH_MAX_ITEMS}): {e.detail}")
+    texts = form.getlist("texts")
+    images = form.getlist("images")
+    if not all(isinstance(text, str) for text in texts) or not all(
+        isinstance(image, StarletteUploadFile) for image in images
+    ):
+        await form.close()
+        raise HTTPException(status_code=400, detail="texts must be form fields and images must be files")
+    if not texts and not images:
+        await form.close()
+        raise HTTPException(status_code=400, detail="Provide at least one text or image")
+    if len(texts) + len(images) > EMBED_BATCH_MAX_ITEMS:
+        await form.close()
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many items: {len(texts) + len(images)} (max {EMBED_BATCH_MAX_ITEMS})"
+        )
+
+    binary = format == "float32"
+
+    def _encode_results(kind: str, start: int, vectors: np.ndarray) -> bytes:
+        if binary:
+            return _embed_frame(b"T" if kind == "text" else b"I", start, vectors)
+        return "".join(
+            json.dumps({"index": start + i, "type": kind, "embedding": vector.tolist()}) + "\n"
+            for i, vector in enumerate(vectors)
+        ).encode("utf-8")
+
+    def _encode_error(kind: str, index: int, message: str) -> bytes:
+        if binary:
+            return _embed_error_frame(index, message)
+        return (json.dumps({"index": index, "type": kind, "error": message}) + "\n").encode("utf-8")
+
+    async def _stream() -> AsyncIterator[bytes]:
+        try:
+            async with model_registry.use(model_name) as loaded_model:
+                async for chunk in _stream_items(loaded_model):
+                    yield chunk
+        except ModelBudgetExceeded as e:
+            logger.error(f"Embed batch could not load {model_name}: {e}")
+            for i, kind in enumerate(["text"] * len(texts) + ["image"] * len(images)):
+                yield _encode_error(kind, i, str(e))
+        finally:
+            # The uploads are read while streaming, so they are closed only at the end
+            await form.close()
+
+    async def _stream_items(loaded_model: LoadedModel) -> AsyncIterator[bytes]:
+        text_batch_size = batch_size or EMBED_TEXT_BATCH_SIZE or _profile_setting(
+            loaded_model, "text_batch_size", DEFAULT_EMBED_TEXT_BATCH_SIZE
+        )
+        image_batch_size = batch_size or EMBED_IMAGE_BATCH_SIZE or _profile_setting(
+            loaded_model, "image_batch_size", DEFAULT_EMBED_IMAGE_BATCH_SIZE
+        )
+
+        for start in range(0, len(texts), text_batch_size):
+            chunk = texts[start:start + text_batch_size]
+            try:
+                vectors = await _run_inference_with_backoff(loaded_model, "encode_text", chunk, as_numpy=True)
+            except Exception as e:
+                logger.error(f"Batch text encode failed at {start}: {e}")
+                for i in range(len(chunk)):
+                    yield _encode_error("text", start + i, str(e))
+                continue
+            yield _encode_results("text", start, vectors)
+
+        offset = len(texts)
+        if images:
+            try:
+                await _ensure_vision_tower(loaded_model)
+            except Exception as e:
+                logger.error(f"Failed to load vision tower: {e}")
+                for i in range(len(images)):
+                    yield _encode_error("image", offset + i, str(e))
+                return
+
+        for start in range(0, len(images), image_batch_size):
+            chunk = [await upload.read() for upload in images[start:start + image_batch_size]]
+            try:
+                vectors = await _run_inference_with_backoff(
+                    loaded_model, "encode_images_batch", chunk, batch_size=image_batch_size, as_numpy=True
+                )
+            except ImageDecodeError:
+                # Re-encode one by one so a single bad image only fails itself
+                for i, image_bytes in enumerate(chunk):
+                    try:
+                        vector = await _run_inference_with_backoff(loaded_model, "encode_image", image_bytes, as_numpy=True)
+                    except Exception as e:
+                        yield _encode_error("image", offset + start + i, str(e))
+                    else:
+                        yield _encode_results("image", offset + start + i, vector[np.newaxis])
+                continue
+            except Exception as e:
+                logger.error(f"Batch image encode failed at {start}: {e}")
+                for i in range(len(chunk)):
+                    yield _encode_error("image", offset + start + i, str(e))
+                continue
+            yield _encode_results("image", offset + start, vectors)
+
+    logger.info(f"Embed batch: {len(texts)} texts, {len(images)} images (model={model_name}, format={format})")
+
+    return StreamingResponse(
+        _stream(),
+        media_type="application/octet-stream" if binary else "application/x-ndjson",
+        headers={
+            "X-Embedding-Dim": str(MODEL_CONFIGS[model_name]["embedding_dim"]),
+            "X-Embedding-Model": model_name,
+        }
+    )
+
+
+AVAILABLE_MODELS = [
+    {
+        "id": "clip-ViT-B-32-multilingual-v1",
+        "name": "Multilingual CLIP ViT-B/32",
+        "dimensions": 512,
+        "languages": "50+ including Icelandic",
+        "size": "~600MB"
+    },
+    {
+        "id": "clip-ViT-B-32",
+        "name": "CLIP ViT-B/32 (OpenAI)",
+        "dimensions": 512,
+        "languages": "English only",
+        "size": "~350MB"
+    },
+    {
+        "id": "clip-ViT-L-14",
+        "name": "CLIP ViT-L/14 (OpenAI)",
+        "dimensions": 768,
+        "languages": "English only",
+        "size": "~900MB"
+    },
+    {
+        "id": "xlm-roberta-large-ViT-H-14",
+        "name": "XLM-RoBERTa + ViT-H/14",
+        "dimensions": 1024,
+        "languages": "100+ languages",
+        "size": "~2.5GB"
+    }
+]
+
+
 @app.get("/models", tags=["Info"])
 async def list_models():
-    """List available CLIP models and current model info."""
+    """List available CLIP models, which ones requests may select, and the default model's info."""
     return {
         "current_model": embedding_service.model_name if embedding_service else None,
         "embedding_dimension": embedding_service.embedding_dim if embedding_service else None,
         "device": str(embedding_service.device) if embedding_service else None,
+        "backend": embedding_service.backend if embedding_service else None,
+        "quantize": embedding_service.quantize if embedding_service else None,
+        "quantization_agreement": embedding_service.quantization_agreement if embedding_service else None,
+        "towers": embedding_service.tower_status() if embedding_service else None,
+        "torch_compile": {
+            "enabled": embedding_service.torch_compile,
+            "cache_hit": embedding_service.compile_cache_hit,
+            "fallbacks": embedding_service.compile_fallbacks,
+        } if embedding_service else None,
+        "runtime_profile": {
+            key: value for key, value in embedding_service.runtime_profile.items() if key != "measurements"
+        } if embedding_service and embedding_service.runtime_profile else None,
+        "registry": model_registry.stats() if model_registry else None,
         "available_models": [
             {
-                "id": "clip-ViT-B-32-multilingual-v1",
-                "name": "Multilingual CLIP ViT-B/32",
-                "dimensions": 512,
-                "languages": "50+ including Icelandic",
-                "size": "~600MB"
-            },
-            {
-                "id": "clip-ViT-B-32",
-                "name": "CLIP ViT-B/32 (OpenAI)",
-                "dimensions": 512,
-                "languages": "English only",
-                "size": "~350MB"
-            },
-            {
-                "id": "clip-ViT-L-14",
-                "name": "CLIP ViT-L/14 (OpenAI)",
-                "dimensions": 768,
-                "languages": "English only",
-                "size": "~900MB"
-            },
-            {
-                "id": "xlm-roberta-large-ViT-H-14",
-                "name": "XLM-RoBERTa + ViT-H/14",
-                "dimensions": 1024,
-                "languages": "100+ languages",
-                "size": "~2.5GB"
+                **model,
+                "servable": bool(model_registry) and model["id"] in model_registry.servable_models,
+                "search_rpc": model_registry.search_rpcs.get(model["id"]) if model_registry else None,
             }
+            for model in AVAILABLE_MODELS
         ]
     }
 
@@ -0,0 +1,178 @@
+"""
+Saga Archive Search API server.
+Loads the default CLIP model once, then forks uvicorn workers that share its memory copy-on-write.
+
+Usage:
+    python serve.py --workers 4
+
+Each worker runs the app's lifespan after the fork, so per-process state
+(inference executor and text batcher threads, Supabase client, translation
+client, query caches) is created in the worker, while the model weights loaded
+by this master process are inherited, not reloaded. Models other than the
+default one still load inside each worker on first use.
+"""
+
+import argparse
+import gc
+import logging
+import multiprocessing as mp
+import os
+import signal
+import socket
+import time
+from multiprocessing.connection import wait
+from typing import Optional
+
+import uvicorn
+
+import main
+from services.runtime_profile import load_runtime_profile
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies sooner than this after starting is restarted with a delay
+MIN_WORKER_UPTIME_SECONDS = 10.0
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    """Open the listening socket in the master so every worker accepts on it."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _worker_main(worker_id: int, sock: socket.socket, torch_threads: int, log_level: str):
+    """Worker process: run uvicorn on the inherited socket."""
+    # Drop the master's stop handlers; uvicorn installs its own for graceful shutdown
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    # The master loaded the model single-threaded, so no thread pool was inherited
+    import torch
+
+    torch.set_num_threads(torch_threads)
+
+    logger.info(f"Worker {worker_id} (pid {os.getpid()}) serving")
+    config = uvicorn.Config(main.app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _worker_torch_threads(workers: int, runtime_profile: Optional[dict]) -> int:
+    """Return torch threads per worker: WORKER_TORCH_THREADS, else the runtime profile's, else a core share."""
+    if os.getenv("WORKER_TORCH_THREADS"):
+        return int(os.getenv("WORKER_TORCH_THREADS"))
+    if runtime_profile and runtime_profile.get("torch_threads"):
+        return runtime_profile["torch_threads"]
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def _preload_model(model_name: str, workers: int, runtime_profile: Optional[dict]):
+    """
+    Load the default model in the master, single-threaded, for the workers to inherit.
+
+    Loading runs torch ops (weight copies, quantization and ONNX agreement
+    checks). With more than one thread they start torch's intra-op thread
+    pool, and a forked worker that then uses more than one thread deadlocks
+    on its first parallel op. With one thread no pool is started, so each
+    worker can set its own thread count after the fork (ONNX Runtime
+    sessions created here keep their single thread). Warmup is left to the
+    workers.
+    """
+    # With several workers both towers load here, since a tower loaded later inside a
+    # worker would be private to it; a single worker keeps the vision tower lazy
+    preload_vision = (
+        workers > 1
+        or os.getenv("PRELOAD_VISION", "false").lower() == "true"
+        or os.getenv("INFERENCE_EXECUTOR", "thread").lower() == "process"
+    )
+    service = main.create_embedding_service(
+        model_name,
+        preload_vision=preload_vision,
+        runtime_profile=dict(runtime_profile or {}, torch_threads=1),
+        defer_warmup=True,
+    )
+    # Report the profile the workers run with, not the master's single thread
+    service.runtime_profile = runtime_profile
+    return service
+
+
+def main_loop(args):
+    """Preload the model, fork the workers and restart any that exit until told to stop."""
+    model_name = os.getenv("CLIP_MODEL", "clip-ViT-B-32-multilingual-v1")
+    runtime_profile = load_runtime_profile(os.getenv("RUNTIME_PROFILE"), model_name)
+    main.preloaded_services[model_name] = _preload_model(model_name, args.workers, runtime_profile)
+
+    sock = _bind_socket(args.host, args.port)
+    torch_threads = _worker_torch_threads(args.workers, runtime_profile)
+
+    # Keep the garbage collector from touching (and so copying) the preloaded objects' pages
+    gc.collect()
+    gc.freeze()
+
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    ctx = mp.get_context("fork")
+    workers = {}
+
+    def _start(worker_id: int):
+        process = ctx.Process(
+            target=_worker_main,
+            args=(worker_id, sock, torch_threads, args.log_level),
+            name=f"web-worker-{worker_id}",
+        )
+        process.start()
+        workers[worker_id] = (process, time.monotonic())
+
+    for worker_id in range(args.workers):
+        _start(worker_id)
+    logger.info(
+        f"Serving on {args.host}:{args.port} with {args.workers} workers "
+        f"({torch_threads} torch threads each)"
+    )
+
+    while not stopping:
+        sentinels = {process.sentinel: worker_id for worker_id, (process, _) in workers.items()}
+        for sentinel in wait(list(sentinels), timeout=1.0):
+            worker_id = sentinels[sentinel]
+            process, started = workers[worker_id]
+            process.join()
+            if stopping:
+                break
+
+            logger.error(f"Worker {worker_id} (pid {process.pid}) exited with code {process.exitcode}; restarting")
+            if time.monotonic() - started < MIN_WORKER_UPTIME_SECONDS:
+                # Crash loop: back off instead of forking continuously
+                time.sleep(MIN_WORKER_UPTIME_SECONDS)
+                if stopping:
+                    break
+            _start(worker_id)
+
+    logger.info("Shutting down workers...")
+    for process, _ in workers.values():
+        if process.is_alive():
+            process.terminate()
+    for process, _ in workers.values():
+        process.join(timeout=30)
+        if process.is_alive():
+            process.kill()
+    sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    main_loop(parser.parse_args())
@@ -0,0 +1,218 @@
+"""
+Autotune.
+Benchmarks torch thread counts and batch sizes for one model on this machine and writes a runtime profile.
+
+Usage:
+    python -m services.autotune --model clip-ViT-B-32-multilingual-v1 --workers 2
+
+Each inter-op thread count is measured in a fresh subprocess, since torch only
+allows setting it once per process. Within a subprocess, every intra-op thread
+count is measured at every batch size for both towers.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import List
+
+import torch
+
+from .embedding_service import AGREEMENT_SAMPLE_TEXTS, EmbeddingService, sample_images
+from .runtime_profile import PROFILE_VERSION, profile_path, save_runtime_profile
+
+logger = logging.getLogger(__name__)
+
+# Prefer fewer threads when they are within this factor of the fastest
+THREAD_LATENCY_SLACK = 1.05
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def _default_thread_counts(workers: int) -> List[int]:
+    """Powers of two up to this worker's share of the cores, plus the share itself."""
+    share = max(1, (os.cpu_count() or 1) // max(1, workers))
+    counts = {share}
+    count = 1
+    while count < share:
+        counts.add(count)
+        count *= 2
+    return sorted(counts)
+
+
+def _time_call(fn, repeats: int) -> float:
+    """Run fn once untimed, then return the median of `repeats` timed calls in milliseconds."""
+    fn()
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def _measure(args) -> List[dict]:
+    """Measure every thread count and batch size at one inter-op thread count (runs in a subprocess)."""
+    torch.set_num_interop_threads(args.measure_interop)
+
+    service = EmbeddingService(
+        model_name=args.model,
+        device=args.device,
+        backend=args.backend,
+        onnx_cache_dir=args.onnx_cache_dir,
+        quantize=args.quantize,
+        preload_vision=True
+    )
+
+    records = []
+    for threads in _int_list(args.threads):
+        torch.set_num_threads(threads)
+        if args.backend == "onnx":
+            # Session thread pools are fixed at creation, so reload the sessions
+            service.num_threads = threads
+            service.text_model = service.vision_model = None
+            service.load_tower("text")
+            service.load_tower("vision")
+
+        for batch_size in _int_list(args.text_batch_sizes):
+            texts = [AGREEMENT_SAMPLE_TEXTS[i % len(AGREEMENT_SAMPLE_TEXTS)] for i in range(batch_size)]
+            median_ms = _time_call(lambda: service.encode_text(texts, as_numpy=True), args.repeats)
+            records.append(_record("text", threads, args.measure_interop, batch_size, median_ms))
+
+        for batch_size in _int_list(args.image_batch_sizes):
+            images = sample_images(count=batch_size)
+            median_ms = _time_call(
+                lambda: service.encode_images_batch(images, batch_size=batch_size, as_numpy=True),
+                args.repeats
+            )
+            records.append(_record("vision", threads, args.measure_interop, batch_size, median_ms))
+
+        logger.info(f"Measured {threads} threads / {args.measure_interop} interop threads")
+
+    return records
+
+
+def _record(tower: str, threads: int, interop: int, batch_size: int, median_ms: float) -> dict:
+    return {
+        "tower": tower,
+        "threads": threads,
+        "interop_threads": interop,
+        "batch_size": batch_size,
+        "median_ms": round(median_ms, 2),
+        "items_per_second": round(batch_size * 1000 / median_ms, 1) if median_ms else 0.0,
+    }
+
+
+def choose_profile(records: List[dict], max_batch_latency_ms: float) -> dict:
+    """
+    Pick thread counts and batch sizes from benchmark records.
+
+    Threads are chosen for the lowest single-query text latency (the search path),
+    preferring fewer threads when within THREAD_LATENCY_SLACK of the fastest.
+    Batch sizes are the highest-throughput ones whose batch latency stays within
+    max_batch_latency_ms.
+    """
+    text_records = [r for r in records if r["tower"] == "text"]
+    smallest = min(r["batch_size"] for r in text_records)
+    single = [r for r in text_records if r["batch_size"] == smallest]
+    fastest = min(r["median_ms"] for r in single)
+    chosen = min(
+        (r for r in single if r["median_ms"] <= fastest * THREAD_LATENCY_SLACK),
+        key=lambda r: (r["threads"], r["interop_threads"], r["median_ms"])
+    )
+
+    def _best_batch(tower: str) -> int:
+        candidates = [
+            r for r in records
+            if r["tower"] == tower
+            and r["threads"] == chosen["threads"]
+            and r["interop_threads"] == chosen["interop_threads"]
+        ]
+        within = [r for r in candidates if r["median_ms"] <= max_batch_latency_ms] or candidates
+        return max(within, key=lambda r: r["items_per_second"])["batch_size"]
+
+    return {
+        "torch_threads": chosen["threads"],
+        "interop_threads": chosen["interop_threads"],
+        "text_batch_size": _best_batch("text"),
+        "image_batch_size": _best_batch("vision"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("CLIP_MODEL", "clip-ViT-B-32-multilingual-v1"))
+    parser.add_argument("--backend", default=os.getenv("INFERENCE_BACKEND", "torch").lower())
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--onnx-cache-dir", default=os.getenv("ONNX_CACHE_DIR"))
+    parser.add_argument("--quantize", default=os.getenv("QUANTIZE") or None)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes that will share this machine (uvicorn or inference workers)")
+    parser.add_argument("--threads", default=None, help="Comma-separated intra-op thread counts to try")
+    parser.add_argument("--interop", default="1,2", help="Comma-separated inter-op thread counts to try")
+    parser.add_argument("--text-batch-sizes", default="1,8,32,64")
+    parser.add_argument("--image-batch-sizes", default="1,4,8,16")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-batch-latency-ms", type=float, default=500.0)
+    parser.add_argument("--output", default=os.getenv("RUNTIME_PROFILE", "runtime-profiles/"),
+                        help="Profile file, or directory to write <model>.json into")
+    parser.add_argument("--measure-interop", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.threads is None:
+        args.threads = ",".join(str(count) for count in _default_thread_counts(args.workers))
+
+    if args.measure_interop is not None:
+        # Subprocess mode: results go to stdout, logs to stderr
+        print(json.dumps(_measure(args)))
+        return
+
+    records = []
+    for interop in _int_list(args.interop):
+        logger.info(f"Benchmarking {args.model} with {interop} interop threads (threads: {args.threads})...")
+        command = [sys.executable, "-m", "services.autotune", "--measure-interop", str(interop)]
+        for name in ("model", "backend", "device", "onnx_cache_dir", "quantize", "threads",
+                     "text_batch_sizes", "image_batch_sizes", "repeats"):
+            value = getattr(args, name)
+            if value is not None:
+                command += [f"--{name.replace('_', '-')}", str(value)]
+        result = subprocess.run(command, stdout=subprocess.PIPE, check=True, text=True)
+        records.extend(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    profile = {
+        "version": PROFILE_VERSION,
+        "model": args.model,
+        "backend": args.backend,
+        "device": args.device,
+        "quantize": args.quantize,
+        "workers": args.workers,
+        **choose_profile(records, args.max_batch_latency_ms),
+        "machine": {
+            "cpu_count": os.cpu_count(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "torch": torch.__version__,
+        },
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "measurements": records,
+    }
+
+    path = profile_path(args.output, args.model)
+    save_runtime_profile(profile, path)
+    logger.info(
+        f"Wrote {path}: {profile['torch_threads']} threads, {profile['interop_threads']} interop threads, "
+        f"text batch {profile['text_batch_size']}, image batch {profile['image_batch_size']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Query Embedding Cache.
+Bounded in-process LRU of query text embeddings, keyed on model name plus normalized query text.
+"""
+
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize query text for caching.
+
+    Applies Unicode NFC and collapses whitespace. Case is preserved because
+    some text encoders are cased, so the normalized text encodes identically.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class QueryEmbeddingCache:
+    """Size- and memory-capped LRU cache of query embeddings."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached queries (0 disables the cache)
+            max_bytes: Maximum total size of cached vectors in bytes
+        """
+        self.max_entries = max(0, max_entries)
+        self.max_bytes = max(0, max_bytes)
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """
+        Look up a cached embedding.
+
+        Args:
+            model_name: Model that produced the embedding
+            text: Normalized query text
+
+        Returns:
+            Read-only float32 embedding, or None on a miss
+        """
+        key = (model_name, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return vector
+
+    def put(self, model_name: str, text: str, embedding: Union[List[float], np.ndarray]):
+        """
+        Store an embedding, evicting least-recently-used entries to stay within limits.
+
+        Args:
+            model_name: Model that produced the embedding
+            text: Normalized query text
+            embedding: Embedding vector
+        """
+        if not self.max_entries:
+            return
+
+        key = (model_name, text)
+        vector = np.array(embedding, dtype=np.float32)
+        vector.flags.writeable = False
+        if vector.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[key] = vector
+            self._bytes += vector.nbytes
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """Return cache size and hit/miss/eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
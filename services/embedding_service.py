@@ -3,58 +3,254 @@ Embedding Service for CLIP model.
 Handles loading the model and encoding text/images to embeddings.
 """
 
+import gc
 import logging
-from typing import Union, List, Optional
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Union, List, Optional, Sequence
 from io import BytesIO
 
 import torch
 import numpy as np
 from PIL import Image
 
+from .image_decoding import DEFAULT_MAX_IMAGE_PIXELS, decode_image
+from .runtime_profile import apply_thread_settings
+from .weight_cache import (
+    DEFAULT_WEIGHT_CACHE_DIR,
+    WeightCacheError,
+    assign_weights,
+    load_weights,
+    save_weights,
+    weight_cache_path,
+)
+
 logger = logging.getLogger(__name__)
 
-# Model configurations
+# Model configurations. Models with the same embedding_space can be searched through
+# the same RPC (and the embedding columns behind it); size_mb estimates weight memory
+# before loading.
 MODEL_CONFIGS = {
     "clip-ViT-B-32-multilingual-v1": {
         "type": "sentence-transformers",
         "embedding_dim": 512,
+        # Text-only student model trained into the clip-ViT-B-32 embedding space
+        "vision_model": "clip-ViT-B-32",
+        "embedding_space": "clip-vit-b-32",
+        "size_mb": 600,
     },
     "clip-ViT-B-32": {
         "type": "sentence-transformers",
         "embedding_dim": 512,
+        "embedding_space": "clip-vit-b-32",
+        "size_mb": 350,
     },
     "clip-ViT-L-14": {
         "type": "sentence-transformers",
         "embedding_dim": 768,
+        "embedding_space": "clip-vit-l-14",
+        "size_mb": 900,
     },
     "xlm-roberta-large-ViT-H-14": {
         "type": "open_clip",
         "pretrained": "frozen_laion5b_s13b_b90k",
         "embedding_dim": 1024,
+        "embedding_space": "vit-h-14",
+        "size_mb": 2500,
+    },
+}
+
+TOWERS = ("text", "vision")
+
+DEFAULT_COMPILE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "saga-search", "compile")
+
+# Submodules holding each tower's weights in a dual-tower checkpoint
+TOWER_SUBMODULES = {
+    # transformers CLIPModel wrapped by sentence-transformers
+    "sentence-transformers": {
+        "text": ("text_model", "text_projection"),
+        "vision": ("vision_model", "visual_projection"),
+    },
+    # OpenCLIP CLIP / CustomTextCLIP
+    "open_clip": {
+        "text": ("transformer", "token_embedding", "positional_embedding", "ln_final", "text_projection", "text"),
+        "vision": ("visual",),
     },
 }
 
+# Fixed inputs used to check that an alternative backend reproduces the torch embeddings
+AGREEMENT_SAMPLE_TEXTS = [
+    "Reykjavík 1950",
+    "bátar í höfn",
+    "fólk á götu í miðbænum",
+    "sunset over the mountains",
+    "a black and white portrait of a woman",
+    "fishing boats in a harbour",
+    "children playing in the snow",
+    "an old farmhouse with a turf roof",
+]
+
+
+def sample_images(count: int = 4, size: int = 256) -> List[Image.Image]:
+    """Generate deterministic synthetic RGB images for backend agreement checks."""
+    rng = np.random.default_rng(0)
+    ramp = np.linspace(0, 255, size, dtype=np.float32)
+    images = []
+    for i in range(count):
+        noise = rng.uniform(0, 255, (size, size, 3)).astype(np.float32)
+        gradient = np.stack([np.add.outer(ramp, ramp * (i % 2)) / (1 + i % 2)] * 3, axis=-1)
+        pixels = np.clip(0.5 * noise + 0.5 * gradient, 0, 255).astype(np.uint8)
+        images.append(Image.fromarray(pixels, mode="RGB"))
+    return images
+
+
+def _rss_bytes() -> int:
+    """Return this process's resident set size in bytes (0 where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _state_bytes(value) -> int:
+    """Return the storage size of a state_dict value (tensors, or tuples of packed quantized params)."""
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(_state_bytes(item) for item in value)
+    return 0
+
+
+def embedding_agreement(reference, candidate) -> dict:
+    """
+    Compare two sets of embeddings row by row.
+
+    Args:
+        reference: Reference embeddings (N x D)
+        candidate: Embeddings to check against the reference (N x D)
+
+    Returns:
+        Dict with sample count, min/mean cosine similarity and max absolute difference
+    """
+    reference = np.asarray(reference, dtype=np.float32).reshape(-1, np.shape(reference)[-1])
+    candidate = np.asarray(candidate, dtype=np.float32).reshape(reference.shape)
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    cosine = (reference * candidate).sum(axis=1) / np.maximum(norms, 1e-12)
+    return {
+        "samples": int(reference.shape[0]),
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "max_abs_diff": float(np.abs(reference - candidate).max()),
+    }
+
 
 class EmbeddingService:
     """Service for generating CLIP embeddings from text and images."""
 
-    def __init__(self, model_name: str = "clip-ViT-B-32-multilingual-v1", device: str = "auto"):
+    def __init__(
+        self,
+        model_name: str = "clip-ViT-B-32-multilingual-v1",
+        device: str = "auto",
+        backend: str = "torch",
+        onnx_cache_dir: Optional[str] = None,
+        onnx_tolerance: float = 1e-3,
+        quantize: Optional[str] = None,
+        quantize_min_cosine: float = 0.98,
+        max_image_pixels: int = DEFAULT_MAX_IMAGE_PIXELS,
+        decode_workers: int = 4,
+        decode_prefetch: int = 2,
+        preload_vision: bool = False,
+        torch_compile: bool = False,
+        compile_cache_dir: Optional[str] = None,
+        warmup_batch_sizes: Sequence[int] = (),
+        defer_warmup: bool = False,
+        runtime_profile: Optional[dict] = None,
+        weight_cache: bool = False,
+        weight_cache_dir: Optional[str] = None
+    ):
         """
         Initialize the embedding service.
 
+        The text tower is loaded immediately; the vision tower is loaded on the
+        first image encode unless preload_vision is set.
+
         Args:
             model_name: Name of the CLIP model to use
             device: Device to run model on ("auto", "cuda", "mps", "cpu")
+            backend: Inference backend ("torch" or "onnx")
+            onnx_cache_dir: Directory for exported ONNX artifacts (onnx backend only)
+            onnx_tolerance: Max absolute difference allowed between ONNX and torch embeddings
+            quantize: Optional CPU quantization mode ("int8")
+            quantize_min_cosine: Min cosine agreement with fp32 required to keep the quantized model
+            max_image_pixels: Reject input images whose declared size exceeds this many pixels
+            decode_workers: Threads decoding images for encode_images_batch
+            decode_prefetch: Batches decoded ahead of the model in encode_images_batch
+            preload_vision: Load the vision tower at startup instead of on first use
+            torch_compile: Compile each tower's transformer with torch.compile (torch backend only)
+            compile_cache_dir: Directory for compiled artifacts reused by later boots
+            warmup_batch_sizes: Batch sizes pushed through each tower right after it loads
+            defer_warmup: Skip the warmup of towers loaded until warmup() is called, for
+                processes that fork their serving workers after loading
+            runtime_profile: Autotuned thread and batch settings (see services.runtime_profile)
+            weight_cache: Load fp32 CPU tower weights from memory-mapped safetensors files,
+                converting each checkpoint on first use, so processes share one copy of the pages
+            weight_cache_dir: Directory for the converted weight files
         """
         self.model_name = model_name
-        self.model = None
+        self.vision_model_name = model_name
+        self.text_model = None
+        self.vision_model = None
         self.tokenizer = None
         self.preprocess = None
         self.model_type = None
+        self.vision_model_type = None
         self.embedding_dim = None
+        self.backend = backend
+        self.onnx_cache_dir = onnx_cache_dir
+        self.onnx_tolerance = onnx_tolerance
+        self.onnx_agreement: Dict[str, dict] = {}
+        self.quantize = quantize
+        self.quantize_min_cosine = quantize_min_cosine
+        self.quantization_agreement: Dict[str, dict] = {}
+        self.image_size = 224
+        self.max_image_pixels = max_image_pixels
+        self.decode_workers = max(1, decode_workers)
+        self.decode_prefetch = max(1, decode_prefetch)
+        self.preload_vision = preload_vision
+        self.torch_compile = torch_compile and backend == "torch"
+        self.compile_cache_dir = compile_cache_dir or DEFAULT_COMPILE_CACHE_DIR
+        self.compile_cache_hit = False
+        self.compile_fallbacks: List[str] = []
+        self.warmup_batch_sizes = sorted({int(size) for size in warmup_batch_sizes if int(size) > 0})
+        self.warmup_stats: Dict[str, dict] = {}
+        self._warmup_deferred = defer_warmup
+        self.runtime_profile = runtime_profile
+        self.num_threads = (runtime_profile or {}).get("torch_threads") or 0
+        self.weight_cache_dir = weight_cache_dir or DEFAULT_WEIGHT_CACHE_DIR
+        self._weight_cache_status: Dict[str, str] = {}
+        self._tower_load_stats: Dict[str, dict] = {}
+        self._compile_cache_loaded = False
+        self._load_lock = threading.Lock()
+        self._decode_pool: Optional[ThreadPoolExecutor] = None
+        self._decode_pool_pid: Optional[int] = None
+
+        if backend not in ("torch", "onnx"):
+            raise ValueError(f"Unknown backend: {backend}. Available: ['torch', 'onnx']")
+        if quantize not in (None, "int8"):
+            raise ValueError(f"Unknown quantize mode: {quantize}. Available: ['int8']")
+        if quantize and backend != "torch":
+            raise ValueError("Quantization is only supported with the torch backend")
 
         # Determine device
-        if device == "auto":
+        if backend == "onnx":
+            # onnxruntime runs on CPU; torch is only used to export the graphs
+            self.device = torch.device("cpu")
+        elif device == "auto":
             if torch.cuda.is_available():
                 self.device = torch.device("cuda")
             elif hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
@@ -64,13 +260,22 @@ class EmbeddingService:
         else:
             self.device = torch.device(device)
 
+        if quantize and self.device.type != "cpu":
+            raise ValueError("INT8 dynamic quantization requires the CPU device")
+
+        # Mapped pages only help weights that stay on the CPU unmodified
+        self.weight_cache = weight_cache and backend == "torch" and self.device.type == "cpu" and not quantize
+
         logger.info(f"Using device: {self.device}")
 
+        if runtime_profile:
+            apply_thread_settings(runtime_profile)
+
         # Load the model
         self._load_model()
 
     def _load_model(self):
-        """Load the CLIP model based on configuration."""
+        """Resolve the per-tower checkpoints and load the text tower (and the vision tower if preloading)."""
         if self.model_name not in MODEL_CONFIGS:
             raise ValueError(f"Unknown model: {self.model_name}. Available: {list(MODEL_CONFIGS.keys())}")
 
@@ -78,47 +283,508 @@ class EmbeddingService:
         self.model_type = config["type"]
         self.embedding_dim = config["embedding_dim"]
 
-        logger.info(f"Loading model: {self.model_name} (type: {self.model_type})")
+        self.vision_model_name = config.get("vision_model", self.model_name)
+        vision_config = MODEL_CONFIGS[self.vision_model_name]
+        if vision_config["embedding_dim"] != self.embedding_dim:
+            raise ValueError(
+                f"Vision model {self.vision_model_name} has dimension {vision_config['embedding_dim']}, "
+                f"expected {self.embedding_dim}"
+            )
+        self.vision_model_type = vision_config["type"]
+        self.image_size = vision_config.get("image_size", 224)
+
+        logger.info(
+            f"Loading model: {self.model_name} (type: {self.model_type}, "
+            f"vision tower: {self.vision_model_name}, preload_vision: {self.preload_vision})"
+        )
 
-        if self.model_type == "sentence-transformers":
-            self._load_sentence_transformer()
-        elif self.model_type == "open_clip":
-            self._load_open_clip(config.get("pretrained"))
+        self.load_tower("text")
+        if self.preload_vision:
+            self.load_tower("vision")
 
         logger.info(f"Model loaded! Embedding dimension: {self.embedding_dim}")
 
-    def _load_sentence_transformer(self):
-        """Load a sentence-transformers CLIP model."""
-        from sentence_transformers import SentenceTransformer
+    def memory_bytes(self) -> int:
+        """Return the size of the loaded towers' weights (ONNX: the loaded graph files)."""
+        total = 0
+        for model in (self.text_model, self.vision_model):
+            if isinstance(model, torch.nn.Module):
+                total += sum(_state_bytes(value) for value in model.state_dict().values())
+            elif model is not None:
+                total += model.memory_bytes()
+        return total
+
+    def _checkpoint(self, tower: str) -> str:
+        """Return the MODEL_CONFIGS entry a tower is loaded from."""
+        return self.model_name if tower == "text" else self.vision_model_name
+
+    def is_loaded(self, tower: str) -> bool:
+        """Return True if the given tower ("text" or "vision") is loaded."""
+        return (self.text_model if tower == "text" else self.vision_model) is not None
+
+    def load_tower(self, tower: str):
+        """
+        Load one tower if it is not loaded yet.
+
+        Safe to call concurrently; callers racing on the same tower wait for
+        the first load instead of loading it twice.
+
+        Args:
+            tower: "text" or "vision"
+        """
+        if tower not in TOWERS:
+            raise ValueError(f"Unknown tower: {tower}. Available: {list(TOWERS)}")
+        if self.is_loaded(tower):
+            return
 
-        self.model = SentenceTransformer(self.model_name, device=str(self.device))
+        with self._load_lock:
+            if self.is_loaded(tower):
+                return
+
+            checkpoint = self._checkpoint(tower)
+            started = time.perf_counter()
+            rss_before = _rss_bytes()
+
+            if self.backend == "onnx":
+                model = self._load_onnx_tower(tower, checkpoint)
+            else:
+                model = self._load_torch_tower(tower, checkpoint)
+
+            # Release the other tower's weights before measuring
+            gc.collect()
+
+            if self.torch_compile:
+                self._compile_tower(tower, model, MODEL_CONFIGS[checkpoint]["type"])
+
+            if tower == "text":
+                self.text_model = model
+                if self.backend == "onnx":
+                    self.model_type = "onnx"
+            else:
+                self.vision_model = model
+                if self.backend == "onnx":
+                    self.vision_model_type = "onnx"
+
+            self._tower_load_stats[tower] = {
+                "load_seconds": round(time.perf_counter() - started, 3),
+                "rss_delta_mb": round((_rss_bytes() - rss_before) / (1024 * 1024), 1),
+            }
+            if tower in self._weight_cache_status:
+                self._tower_load_stats[tower]["weight_cache"] = self._weight_cache_status[tower]
+            logger.info(
+                f"Loaded {tower} tower from {checkpoint} in {self._tower_load_stats[tower]['load_seconds']:.2f}s "
+                f"(RSS +{self._tower_load_stats[tower]['rss_delta_mb']:.0f} MB)"
+            )
+
+            if self.warmup_batch_sizes and not self._warmup_deferred:
+                self._warmup_tower(tower)
+
+    def warmup(self):
+        """
+        Run the deferred warmup of the loaded towers.
+
+        Call it in the process that serves requests: warmup starts torch's
+        intra-op thread pool, which a process forked afterwards cannot use.
+        Towers loaded later warm up as they load.
+        """
+        with self._load_lock:
+            self._warmup_deferred = False
+            if not self.warmup_batch_sizes:
+                return
+            for tower in TOWERS:
+                if self.is_loaded(tower) and tower not in self.warmup_stats:
+                    self._warmup_tower(tower)
+
+    def tower_status(self) -> dict:
+        """Return per-tower checkpoint, load state, load time and RSS growth."""
+        return {
+            tower: {
+                "checkpoint": self._checkpoint(tower),
+                "loaded": self.is_loaded(tower),
+                **self._tower_load_stats.get(tower, {}),
+                "warmup": self.warmup_stats.get(tower),
+            }
+            for tower in TOWERS
+        }
+
+    def _compile_cache_path(self) -> str:
+        """Return the compiled-artifact file for this model, device, precision and torch version."""
+        safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", self.model_name)
+        precision = self.quantize or "fp32"
+        return os.path.join(
+            self.compile_cache_dir,
+            f"{safe_name}-{self.device.type}-{precision}-torch{torch.__version__}.bin"
+        )
+
+    def _compile_tower(self, tower: str, model, model_type: str):
+        """Compile a tower's transformer submodules in place, seeding the compiler from the disk cache."""
+        if not self._compile_cache_loaded:
+            self._compile_cache_loaded = True
+            path = self._compile_cache_path()
+            if not hasattr(torch.compiler, "load_cache_artifacts"):
+                logger.info(f"torch {torch.__version__} cannot persist compiled artifacts; compiling from scratch")
+            elif os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        torch.compiler.load_cache_artifacts(f.read())
+                    self.compile_cache_hit = True
+                    logger.info(f"Loaded compiled artifacts from {path}")
+                except Exception as e:
+                    logger.warning(f"Ignoring unreadable compile cache {path}: {e}")
+
+        for index, module in enumerate(self._compile_targets(model, model_type, tower)):
+            self._compile_module(module, f"{tower}[{index}] {type(module).__name__}")
+        logger.info(f"Compiled {tower} tower with torch.compile")
+
+    def _compile_module(self, module: torch.nn.Module, name: str):
+        """
+        Compile a module's forward, switching it back to eager if compilation fails.
+
+        Modules compile on their first call (usually the warmup). A compiler error
+        is logged and that module runs eagerly from then on; errors elsewhere in
+        the process are not suppressed.
+        """
+        eager = module.forward
+        compiled = torch.compile(eager)
+
+        def forward(*args, **kwargs):
+            try:
+                return compiled(*args, **kwargs)
+            except torch._dynamo.exc.TorchDynamoException as e:
+                logger.warning(f"torch.compile failed for {name}; running it eagerly: {e}")
+                module.forward = eager
+                self.compile_fallbacks.append(name)
+                return eager(*args, **kwargs)
+
+        module.forward = forward
+
+    @staticmethod
+    def _compile_targets(model, model_type: str, tower: str) -> list:
+        """Return the submodules that run a tower's layers, called through __call__ by their parents."""
+        if model_type == "open_clip":
+            names = ("transformer", "text") if tower == "text" else ("visual",)
+            return [getattr(model, name) for name in names if getattr(model, name, None) is not None][:1]
+
+        inner = getattr(model[0], "model", None) or getattr(model[0], "auto_model", None)
+        if hasattr(inner, "get_image_features"):
+            return [inner.text_model if tower == "text" else inner.vision_model]
+        # Text-only encoder: sentence-transformers calls its forward directly, so compile its children
+        return list(inner.children())
+
+    def _save_compile_cache(self):
+        """Write everything compiled so far to the disk cache for later boots."""
+        if not hasattr(torch.compiler, "save_cache_artifacts"):
+            return
+        artifacts = torch.compiler.save_cache_artifacts()
+        if not artifacts:
+            return
+
+        path = self._compile_cache_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(artifacts[0])
+        os.replace(tmp_path, path)
+        logger.info(f"Saved compiled artifacts to {path}")
+
+    def _warmup_tower(self, tower: str):
+        """Push each warmup batch size through a tower twice and record first-call and steady-state times."""
+        started = time.perf_counter()
+        timings = {}
+        try:
+            for batch_size in self.warmup_batch_sizes:
+                if tower == "text":
+                    texts = [AGREEMENT_SAMPLE_TEXTS[i % len(AGREEMENT_SAMPLE_TEXTS)] for i in range(batch_size)]
+                    run = lambda: self.encode_text(texts, as_numpy=True)
+                else:
+                    images = sample_images(count=batch_size)
+                    run = lambda: self.encode_images_batch(images, batch_size=batch_size, as_numpy=True)
+
+                call_times = []
+                for _ in range(2):
+                    call_started = time.perf_counter()
+                    run()
+                    call_times.append(round((time.perf_counter() - call_started) * 1000, 1))
+                timings[str(batch_size)] = {"first_ms": call_times[0], "steady_ms": call_times[1]}
+
+            if self.torch_compile:
+                self._save_compile_cache()
+        except Exception as e:
+            # Warmup is best-effort; the first requests just run cold
+            logger.warning(f"Warmup of the {tower} tower failed: {e}")
+
+        self.warmup_stats[tower] = {
+            "seconds": round(time.perf_counter() - started, 3),
+            "compiled": self.torch_compile,
+            "batch_sizes": timings,
+        }
+        logger.info(f"Warmed up {tower} tower in {self.warmup_stats[tower]['seconds']:.2f}s: {timings}")
+
+    def _load_torch_checkpoint(self, checkpoint: str, empty: bool = False) -> tuple:
+        """
+        Load a full torch checkpoint.
+
+        Args:
+            checkpoint: MODEL_CONFIGS name
+            empty: Build OpenCLIP models on the meta device without reading any weights
+                (sentence-transformers models are always loaded with their weights)
+
+        Returns:
+            Tuple of (model, tokenizer, preprocess); tokenizer and preprocess are
+            only set for OpenCLIP models
+        """
+        config = MODEL_CONFIGS[checkpoint]
+
+        if config["type"] == "sentence-transformers":
+            from sentence_transformers import SentenceTransformer
+
+            return SentenceTransformer(checkpoint, device=str(self.device)), None, None
 
-    def _load_open_clip(self, pretrained: str):
-        """Load an OpenCLIP model."""
         import open_clip
 
         # Parse model name - remove the prefix if present
-        clip_model_name = self.model_name
-        if "xlm-roberta" in self.model_name.lower():
+        clip_model_name = checkpoint
+        if "xlm-roberta" in checkpoint.lower():
             clip_model_name = "xlm-roberta-large-ViT-H-14"
 
-        self.model, _, self.preprocess = open_clip.create_model_and_transforms(
-            clip_model_name,
-            pretrained=pretrained,
-            device=self.device
+        if empty:
+            with torch.device("meta"):
+                # Resolving the tag keeps its preprocessing config; no weights are read
+                model, _, preprocess = open_clip.create_model_and_transforms(
+                    clip_model_name,
+                    pretrained=config.get("pretrained"),
+                    load_weights=False,
+                    pretrained_hf=False,
+                    device="meta"
+                )
+        else:
+            model, _, preprocess = open_clip.create_model_and_transforms(
+                clip_model_name,
+                pretrained=config.get("pretrained"),
+                device=self.device
+            )
+        model.eval()
+        return model, open_clip.get_tokenizer(clip_model_name), preprocess
+
+    @staticmethod
+    def _strip_to_tower(model, model_type: str, tower: str):
+        """Drop the other tower's submodules from a dual-tower checkpoint so its weights can be freed."""
+        if model_type == "sentence-transformers":
+            model = getattr(model[0], "model", None)
+            if not hasattr(model, "get_image_features"):
+                # Text-only checkpoint, nothing to drop
+                return
+
+        other = "vision" if tower == "text" else "text"
+        for name in TOWER_SUBMODULES[model_type][other]:
+            if getattr(model, name, None) is not None:
+                setattr(model, name, None)
+
+    def _load_torch_tower(self, tower: str, checkpoint: str):
+        """Load a checkpoint and keep only the given tower (quantized if requested)."""
+        model_type = MODEL_CONFIGS[checkpoint]["type"]
+
+        if self.weight_cache:
+            model, tokenizer, preprocess = self._load_cached_tower(tower, checkpoint)
+        else:
+            model, tokenizer, preprocess = self._load_torch_checkpoint(checkpoint)
+            self._strip_to_tower(model, model_type, tower)
+
+        if tower == "text":
+            self.tokenizer = tokenizer
+        else:
+            self.preprocess = preprocess
+
+        if self.quantize == "int8":
+            model = self._quantize_int8(tower, model, model_type)
+        return model
+
+    def _load_cached_tower(self, tower: str, checkpoint: str) -> tuple:
+        """
+        Load one tower with its weights mapped from the weight cache, converting the checkpoint on a miss.
+
+        Returns:
+            Tuple of (model, tokenizer, preprocess)
+        """
+        model_type = MODEL_CONFIGS[checkpoint]["type"]
+        path = weight_cache_path(self.weight_cache_dir, checkpoint, tower)
+
+        if os.path.exists(path):
+            model, tokenizer, preprocess = self._load_torch_checkpoint(checkpoint, empty=True)
+            self._strip_to_tower(model, model_type, tower)
+            try:
+                assign_weights(model, load_weights(path))
+                self._weight_cache_status[tower] = "hit"
+                logger.info(f"Mapped {tower} tower weights from {path}")
+                return model, tokenizer, preprocess
+            except (WeightCacheError, OSError) as e:
+                logger.warning(f"Rebuilding weight cache {path}: {e}")
+
+        model, tokenizer, preprocess = self._load_torch_checkpoint(checkpoint)
+        self._strip_to_tower(model, model_type, tower)
+        try:
+            save_weights(model, path, metadata={"checkpoint": checkpoint, "tower": tower})
+            # Swap the private copy for the mapped one so this process shares pages too
+            assign_weights(model, load_weights(path))
+            self._weight_cache_status[tower] = "converted"
+            logger.info(f"Converted {tower} tower weights of {checkpoint} to {path}")
+        except (WeightCacheError, OSError) as e:
+            self._weight_cache_status[tower] = "disabled"
+            logger.warning(f"Weight cache unavailable for {checkpoint} ({tower}); using private weights: {e}")
+        return model, tokenizer, preprocess
+
+    def _load_onnx_tower(self, tower: str, checkpoint: str):
+        """Load one tower's ONNX Runtime session, exporting the checkpoint first if no cached export exists."""
+        from .onnx_backend import OnnxClipBackend
+
+        source_type = MODEL_CONFIGS[checkpoint]["type"]
+        onnx_backend = OnnxClipBackend(
+            checkpoint, source_type, cache_dir=self.onnx_cache_dir, num_threads=self.num_threads
         )
-        self.tokenizer = open_clip.get_tokenizer(clip_model_name)
-        self.model.eval()
 
-    def encode_text(self, text: Union[str, List[str]]) -> List[float]:
+        if not onnx_backend.is_exported():
+            logger.info(f"No cached ONNX export for {checkpoint}; exporting from torch...")
+            self._export_onnx(onnx_backend, checkpoint)
+
+        onnx_backend.load(towers=(tower,))
+        return onnx_backend
+
+    def _export_onnx(self, onnx_backend, checkpoint: str):
+        """Export a checkpoint to ONNX and check every exported tower against torch; discard it if they disagree."""
+        from .onnx_backend import OnnxClipBackend
+
+        source_type = MODEL_CONFIGS[checkpoint]["type"]
+        model, tokenizer, preprocess = self._load_torch_checkpoint(checkpoint)
+        onnx_backend.export(model, preprocess)
+
+        # Verify with a throwaway instance so the caller only keeps the sessions it asked for
+        exported = OnnxClipBackend(checkpoint, source_type, cache_dir=self.onnx_cache_dir)
+        exported.load()
+        towers = ["text", "vision"] if exported.vision_session is not None else ["text"]
+
+        for tower in towers:
+            reference = self._encode_samples(tower, model, source_type, tokenizer, preprocess)
+            agreement = embedding_agreement(reference, self._encode_samples(tower, exported, "onnx"))
+            logger.info(f"ONNX vs torch agreement for {checkpoint} ({tower}): {agreement}")
+
+            if agreement["max_abs_diff"] > self.onnx_tolerance:
+                import shutil
+
+                shutil.rmtree(onnx_backend.cache_dir, ignore_errors=True)
+                raise RuntimeError(
+                    f"ONNX export of {checkpoint} ({tower} tower) differs from torch by "
+                    f"{agreement['max_abs_diff']:.2e} (tolerance {self.onnx_tolerance:.0e})"
+                )
+            if self._checkpoint(tower) == checkpoint:
+                self.onnx_agreement[tower] = agreement
+
+    def _quantize_int8(self, tower: str, model, model_type: str):
+        """Apply dynamic INT8 quantization to a tower's Linear layers, keeping fp32 if agreement is too low."""
+        reference = self._encode_samples(tower, model, model_type)
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        if model_type == "open_clip":
+            # OpenCLIP picks its activation dtype from a Linear weight's dtype, but quantized
+            # Linear layers expose weight() as a method; activations stay fp32 either way
+            for module in quantized.modules():
+                if hasattr(module, "get_cast_dtype"):
+                    module.get_cast_dtype = lambda: torch.float32
+
+        agreement = embedding_agreement(reference, self._encode_samples(tower, quantized, model_type))
+        agreement["quantized"] = agreement["min_cosine"] >= self.quantize_min_cosine
+        self.quantization_agreement[tower] = agreement
+        logger.info(f"INT8 vs fp32 agreement for {self._checkpoint(tower)} ({tower}): {agreement}")
+
+        if not agreement["quantized"]:
+            logger.warning(
+                f"INT8 {tower} tower agreement {agreement['min_cosine']:.4f} is below "
+                f"{self.quantize_min_cosine}; keeping the fp32 weights"
+            )
+            return model
+        return quantized
+
+    def _encode_samples(self, tower: str, model, model_type: str, tokenizer=None, preprocess=None) -> np.ndarray:
+        """Encode the fixed agreement samples with one tower of the given model."""
+        if tower == "text":
+            return self._run_text(model, model_type, AGREEMENT_SAMPLE_TEXTS, tokenizer or self.tokenizer)
+        preprocess = preprocess or self.preprocess
+        prepared = [self._preprocess_with(model_type, preprocess, img) for img in sample_images()]
+        return self._run_vision(model, model_type, prepared)
+
+    def share_memory(self):
+        """
+        Move loaded tower weights into shared memory.
+
+        Worker processes forked afterwards read the same physical pages instead
+        of each holding a private copy. Only applies to CPU models.
+        """
+        if self.device.type != "cpu":
+            return
+        for tower, model in (("text", self.text_model), ("vision", self.vision_model)):
+            if self._weight_cache_status.get(tower) in ("hit", "converted"):
+                # Already file-backed; moving them to shared memory would make a private copy
+                continue
+            if isinstance(model, torch.nn.Module):
+                model.share_memory()
+
+    def _load_image(self, image: Union[str, BytesIO, Image.Image, bytes]) -> Image.Image:
+        """Decode an image to RGB near the model's input size."""
+        return decode_image(image, target_size=self.image_size, max_pixels=self.max_image_pixels)
+
+    def _run_text(self, model, model_type: str, texts: List[str], tokenizer=None) -> np.ndarray:
+        """Run a text tower on a list of texts."""
+        if model_type == "sentence-transformers":
+            return model.encode(
+                texts,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+        if model_type == "onnx":
+            return model.encode_text(texts)
+
+        # OpenCLIP
+        with torch.no_grad():
+            tokens = tokenizer(texts).to(self.device)
+            embeddings = model.encode_text(tokens)
+            embeddings = embeddings / embeddings.norm(dim=-1, keepdim=True)
+            return embeddings.cpu().numpy()
+
+    def _run_vision(self, model, model_type: str, prepared: list) -> np.ndarray:
+        """Run a vision tower on a batch of prepared images."""
+        if model_type == "sentence-transformers":
+            return model.encode(
+                prepared,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+        if model_type == "onnx":
+            return model.encode_images(prepared)
+
+        # OpenCLIP
+        with torch.no_grad():
+            image_tensors = torch.stack(prepared).to(self.device)
+            embeddings = model.encode_image(image_tensors)
+            embeddings = embeddings / embeddings.norm(dim=-1, keepdim=True)
+            return embeddings.cpu().numpy()
+
+    @staticmethod
+    def _preprocess_with(model_type: str, preprocess, pil_image: Image.Image):
+        """Apply a model's tensor preprocessing where it is separate from encoding (OpenCLIP)."""
+        if model_type == "open_clip":
+            return preprocess(pil_image)
+        return pil_image
+
+    def encode_text(self, text: Union[str, List[str]], as_numpy: bool = False) -> Union[List[float], np.ndarray]:
         """
         Encode text to embedding vector.
 
         Args:
             text: Single text string or list of strings
+            as_numpy: Return a contiguous float32 array instead of Python lists
 
         Returns:
-            Embedding as a list of floats (for single text) or list of lists
+            Embedding as a list of floats (for single text) or list of lists;
+            with as_numpy, a 1-D (single text) or 2-D float32 array
         """
         if isinstance(text, str):
             texts = [text]
@@ -127,114 +793,98 @@ class EmbeddingService:
             texts = text
             single = False
 
-        if self.model_type == "sentence-transformers":
-            embeddings = self.model.encode(
-                texts,
-                convert_to_numpy=True,
-                normalize_embeddings=True
-            )
-        else:
-            # OpenCLIP
-            with torch.no_grad():
-                tokens = self.tokenizer(texts).to(self.device)
-                embeddings = self.model.encode_text(tokens)
-                embeddings = embeddings / embeddings.norm(dim=-1, keepdim=True)
-                embeddings = embeddings.cpu().numpy()
+        embeddings = self._run_text(self.text_model, self.model_type, texts, self.tokenizer)
 
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
         if single:
-            return embeddings[0].tolist()
-        return [e.tolist() for e in embeddings]
-
-    def encode_image(self, image: Union[str, BytesIO, Image.Image, bytes]) -> List[float]:
+            embeddings = embeddings[0]
+        return embeddings if as_numpy else embeddings.tolist()
+
+    def encode_image(
+        self,
+        image: Union[str, BytesIO, Image.Image, bytes],
+        as_numpy: bool = False
+    ) -> Union[List[float], np.ndarray]:
         """
         Encode an image to embedding vector.
 
+        Loads the vision tower first if it is not loaded yet.
+
         Args:
             image: Image path, BytesIO, PIL Image, or bytes
+            as_numpy: Return a contiguous float32 array instead of a Python list
 
         Returns:
-            Embedding as a list of floats
-        """
-        # Load image if needed
-        if isinstance(image, str):
-            pil_image = Image.open(image)
-        elif isinstance(image, bytes):
-            pil_image = Image.open(BytesIO(image))
-        elif isinstance(image, BytesIO):
-            pil_image = Image.open(image)
-        elif isinstance(image, Image.Image):
-            pil_image = image
-        else:
-            raise ValueError(f"Unsupported image type: {type(image)}")
-
-        # Convert to RGB if necessary
-        if pil_image.mode != "RGB":
-            pil_image = pil_image.convert("RGB")
-
-        if self.model_type == "sentence-transformers":
-            embedding = self.model.encode(
-                pil_image,
-                convert_to_numpy=True,
-                normalize_embeddings=True
+            Embedding as a list of floats (or 1-D float32 array with as_numpy)
+        """
+        self.load_tower("vision")
+        embedding = self._encode_prepared([self._prepare_image(image)])[0]
+
+        embedding = np.ascontiguousarray(embedding, dtype=np.float32)
+        return embedding if as_numpy else embedding.tolist()
+
+    def _prepare_image(self, image: Union[str, BytesIO, Image.Image, bytes]):
+        """Decode an image and, where the model allows it, apply its tensor preprocessing."""
+        return self._preprocess_with(self.vision_model_type, self.preprocess, self._load_image(image))
+
+    def _encode_prepared(self, prepared: list) -> np.ndarray:
+        """Run the vision tower on a batch of prepared images."""
+        return self._run_vision(self.vision_model, self.vision_model_type, prepared)
+
+    def _get_decode_pool(self) -> ThreadPoolExecutor:
+        """Return the image decode pool, recreating it in forked worker processes."""
+        if self._decode_pool is None or self._decode_pool_pid != os.getpid():
+            self._decode_pool = ThreadPoolExecutor(
+                max_workers=self.decode_workers,
+                thread_name_prefix="image-decode"
             )
-        else:
-            # OpenCLIP
-            with torch.no_grad():
-                image_tensor = self.preprocess(pil_image).unsqueeze(0).to(self.device)
-                embedding = self.model.encode_image(image_tensor)
-                embedding = embedding / embedding.norm(dim=-1, keepdim=True)
-                embedding = embedding.cpu().numpy()[0]
-
-        return embedding.tolist()
-
-    def encode_images_batch(self, images: List[Union[str, BytesIO, Image.Image]], batch_size: int = 8) -> List[List[float]]:
+            self._decode_pool_pid = os.getpid()
+        return self._decode_pool
+
+    def encode_images_batch(
+        self,
+        images: List[Union[str, BytesIO, Image.Image, bytes]],
+        batch_size: int = 8,
+        as_numpy: bool = False
+    ) -> Union[List[List[float]], np.ndarray]:
         """
         Encode multiple images in batches.
 
+        Decoding is pipelined: a thread pool decodes and preprocesses the next
+        batches (up to decode_prefetch batches ahead) while the model runs on
+        the current one.
+
         Args:
-            images: List of image paths, BytesIO objects, or PIL Images
+            images: List of image paths, BytesIO objects, PIL Images, or bytes
             batch_size: Batch size for processing
+            as_numpy: Return one contiguous (N x D) float32 array instead of Python lists
 
         Returns:
-            List of embeddings
-        """
-        all_embeddings = []
-
-        for i in range(0, len(images), batch_size):
-            batch = images[i:i + batch_size]
-
-            # Load images
-            pil_images = []
-            for img in batch:
-                if isinstance(img, str):
-                    pil_image = Image.open(img)
-                elif isinstance(img, BytesIO):
-                    pil_image = Image.open(img)
-                elif isinstance(img, Image.Image):
-                    pil_image = img
-                else:
-                    raise ValueError(f"Unsupported image type: {type(img)}")
-
-                if pil_image.mode != "RGB":
-                    pil_image = pil_image.convert("RGB")
-                pil_images.append(pil_image)
-
-            if self.model_type == "sentence-transformers":
-                embeddings = self.model.encode(
-                    pil_images,
-                    convert_to_numpy=True,
-                    normalize_embeddings=True
-                )
-            else:
-                # OpenCLIP
-                with torch.no_grad():
-                    image_tensors = torch.stack([
-                        self.preprocess(img) for img in pil_images
-                    ]).to(self.device)
-                    embeddings = self.model.encode_image(image_tensors)
-                    embeddings = embeddings / embeddings.norm(dim=-1, keepdim=True)
-                    embeddings = embeddings.cpu().numpy()
-
-            all_embeddings.extend([e.tolist() for e in embeddings])
-
-        return all_embeddings
+            List of embeddings (or an N x D float32 array with as_numpy)
+        """
+        self.load_tower("vision")
+
+        # Batches are written straight into one preallocated matrix
+        all_embeddings = np.empty((len(images), self.embedding_dim), dtype=np.float32)
+        batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+        pool = self._get_decode_pool()
+        in_flight = deque()
+        next_batch = 0
+
+        try:
+            offset = 0
+            while offset < len(images):
+                # Keep up to decode_prefetch batches decoding ahead of the model
+                while next_batch < len(batches) and len(in_flight) <= self.decode_prefetch:
+                    in_flight.append([pool.submit(self._prepare_image, img) for img in batches[next_batch]])
+                    next_batch += 1
+
+                prepared = [future.result() for future in in_flight.popleft()]
+                all_embeddings[offset:offset + len(prepared)] = self._encode_prepared(prepared)
+                offset += len(prepared)
+        finally:
+            for futures in in_flight:
+                for future in futures:
+                    future.cancel()
+
+        return all_embeddings if as_numpy else all_embeddings.tolist()
@@ -0,0 +1,92 @@
+"""
+Image Decoding.
+Decodes uploaded images close to the model's input size instead of at full resolution.
+
+JPEGs are decoded with the decoder's DCT scaling (PIL draft mode, 1/2 to 1/8 scale);
+other formats are box-reduced by an integer factor after decoding. Both keep the
+shorter side at or above the target, so the model's own resize still does the final step.
+"""
+
+import logging
+import math
+from io import BytesIO
+from typing import Union
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_IMAGE_PIXELS = 100_000_000
+
+
+class ImageDecodeError(ValueError):
+    """Raised when an image cannot be decoded or exceeds the pixel limit."""
+
+
+def decode_image(
+    image: Union[str, bytes, BytesIO, Image.Image],
+    target_size: int = 224,
+    max_pixels: int = DEFAULT_MAX_IMAGE_PIXELS
+) -> Image.Image:
+    """
+    Decode an image to RGB at reduced resolution, applying EXIF orientation.
+
+    Args:
+        image: Image path, bytes, BytesIO, or PIL Image
+        target_size: Minimum shorter side to keep (the model's input size)
+        max_pixels: Reject images whose declared size exceeds this many pixels
+
+    Returns:
+        RGB PIL Image
+
+    Raises:
+        ImageDecodeError: If the image is unreadable or too large
+    """
+    if isinstance(image, Image.Image):
+        # Already decoded by the caller
+        return image if image.mode == "RGB" else image.convert("RGB")
+
+    if isinstance(image, bytes):
+        image = BytesIO(image)
+    elif not isinstance(image, (str, BytesIO)):
+        raise ValueError(f"Unsupported image type: {type(image)}")
+
+    try:
+        # Image.open only parses the header; nothing is decoded yet
+        pil_image = Image.open(image)
+    except Image.DecompressionBombError as e:
+        raise ImageDecodeError(str(e))
+    except UnidentifiedImageError:
+        raise ImageDecodeError("Cannot identify image file")
+    except OSError as e:
+        raise ImageDecodeError(f"Cannot open image: {e}")
+
+    width, height = pil_image.size
+    if width * height > max_pixels:
+        raise ImageDecodeError(
+            f"Image is {width}x{height} ({width * height} pixels), limit is {max_pixels} pixels"
+        )
+
+    shorter = min(width, height)
+    try:
+        if pil_image.format == "JPEG" and shorter > target_size:
+            # The decoder picks the largest DCT scale that stays at or above the requested size
+            scale = target_size / shorter
+            pil_image.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+
+        pil_image.load()
+
+        # Orientation is read from the EXIF block, which reduce() does not carry over
+        pil_image = ImageOps.exif_transpose(pil_image)
+
+        factor = min(pil_image.size) // target_size
+        if factor >= 2 and pil_image.mode in ("RGB", "RGBA", "L", "LA", "I", "F"):
+            pil_image = pil_image.reduce(factor)
+    except Image.DecompressionBombError as e:
+        raise ImageDecodeError(str(e))
+    except OSError as e:
+        raise ImageDecodeError(f"Failed to decode image: {e}")
+
+    if pil_image.mode != "RGB":
+        pil_image = pil_image.convert("RGB")
+    return pil_image
@@ -0,0 +1,240 @@
+"""
+Image Fetcher.
+Downloads query images from URLs over one pooled async HTTP client, with size, time and host limits.
+
+The body is streamed: Content-Length is checked before reading, the image
+header is parsed as soon as enough bytes arrive (so an oversized image is
+rejected before the rest is downloaded), and the download stops as soon as
+it passes the byte limit. Redirects are followed by hand so every hop is
+checked against private and loopback addresses, and each request is sent to
+the address that was checked (keeping the original Host header and TLS server
+name), so a second DNS answer cannot point it elsewhere.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import socket
+from io import BytesIO
+from typing import Tuple
+from urllib.parse import urljoin
+
+import httpx
+from PIL import Image, UnidentifiedImageError
+
+from .image_decoding import DEFAULT_MAX_IMAGE_PIXELS, ImageDecodeError
+
+logger = logging.getLogger(__name__)
+
+# The image header is first parsed at this many bytes, then each time the body doubles
+HEADER_FIRST_PROBE_BYTES = 4096
+
+# Stop trying to parse the image header after this many bytes
+HEADER_PROBE_BYTES = 1024 * 1024
+
+
+class ImageFetchError(Exception):
+    """Raised when an image URL cannot be fetched."""
+
+
+class ImageURLRejected(ImageFetchError):
+    """Raised for URLs that are malformed, not http(s), or point at a private address."""
+
+
+class ImageTooLarge(ImageFetchError):
+    """Raised when the response body exceeds the byte limit."""
+
+
+class ImageFetchTimeout(ImageFetchError):
+    """Raised when the whole fetch takes longer than the time limit."""
+
+
+class ImageFetcher:
+    """Fetches images over a shared, connection-pooled httpx.AsyncClient."""
+
+    def __init__(
+        self,
+        max_bytes: int = 20 * 1024 * 1024,
+        timeout_seconds: float = 10.0,
+        max_connections: int = 20,
+        max_redirects: int = 3,
+        allow_private_hosts: bool = False,
+        max_pixels: int = DEFAULT_MAX_IMAGE_PIXELS
+    ):
+        """
+        Initialize the fetcher and its connection pool.
+
+        Args:
+            max_bytes: Max response body size
+            timeout_seconds: Max total time per fetch, including redirects
+            max_connections: Max open connections in the pool
+            max_redirects: Max redirects followed per fetch
+            allow_private_hosts: Allow URLs resolving to private, loopback or link-local addresses
+            max_pixels: Reject images whose declared size exceeds this many pixels
+        """
+        self.max_bytes = max_bytes
+        self.timeout_seconds = timeout_seconds
+        self.max_redirects = max_redirects
+        self.allow_private_hosts = allow_private_hosts
+        self.max_pixels = max_pixels
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout_seconds),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            follow_redirects=False,
+            headers={"User-Agent": "saga-search-image-fetcher/1.0", "Accept": "image/*"},
+        )
+
+        self.fetches = 0
+        self.failures = 0
+        self.bytes_fetched = 0
+
+    async def fetch(self, url: str) -> bytes:
+        """
+        Download an image.
+
+        Args:
+            url: http(s) URL of the image
+
+        Returns:
+            The encoded image bytes
+
+        Raises:
+            ImageURLRejected: If the URL (or a redirect) is not allowed
+            ImageTooLarge: If the body exceeds max_bytes
+            ImageFetchTimeout: If the fetch exceeds timeout_seconds
+            ImageFetchError: On HTTP errors and non-image responses
+            ImageDecodeError: If the image header declares more than max_pixels
+        """
+        try:
+            data = await asyncio.wait_for(self._fetch(url), timeout=self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            raise ImageFetchTimeout(f"Fetching the image took longer than {self.timeout_seconds:g}s")
+        except httpx.TimeoutException:
+            self.failures += 1
+            raise ImageFetchTimeout(f"Fetching the image took longer than {self.timeout_seconds:g}s")
+        except httpx.HTTPError as e:
+            self.failures += 1
+            raise ImageFetchError(f"Failed to fetch image: {e}")
+        except (ImageFetchError, ImageDecodeError):
+            self.failures += 1
+            raise
+
+        self.fetches += 1
+        self.bytes_fetched += len(data)
+        return data
+
+    async def _fetch(self, url: str) -> bytes:
+        """Follow redirects by hand, checking each hop, and stream the final body."""
+        for _ in range(self.max_redirects + 1):
+            target, options = await self._pin_url(url)
+
+            async with self.client.stream("GET", target, **options) as response:
+                if response.is_redirect:
+                    location = response.headers.get("location")
+                    if not location:
+                        raise ImageFetchError(f"Redirect without a Location from {url}")
+                    url = urljoin(url, location)
+                    continue
+
+                if response.status_code != 200:
+                    raise ImageFetchError(f"Image URL returned HTTP {response.status_code}")
+
+                content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+                is_image = content_type.startswith("image/") or content_type == "application/octet-stream"
+                if content_type and not is_image:
+                    raise ImageFetchError(f"URL is not an image (content type {content_type})")
+
+                content_length = response.headers.get("content-length")
+                if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+                    raise ImageTooLarge(f"Image is {int(content_length)} bytes, limit is {self.max_bytes}")
+
+                return await self._read_body(response)
+
+        raise ImageFetchError(f"More than {self.max_redirects} redirects")
+
+    async def _read_body(self, response: httpx.Response) -> bytes:
+        """Read the body up to max_bytes, checking the image size as soon as its header has arrived."""
+        body = bytearray()
+        next_probe = HEADER_FIRST_PROBE_BYTES
+        async for chunk in response.aiter_bytes():
+            body.extend(chunk)
+            if len(body) > self.max_bytes:
+                raise ImageTooLarge(f"Image is larger than {self.max_bytes} bytes")
+            # Parsing re-reads the whole prefix, so only retry as the body doubles
+            if next_probe and len(body) >= next_probe:
+                if self._check_header(bytes(body[:HEADER_PROBE_BYTES])):
+                    next_probe = 0
+                else:
+                    next_probe = len(body) * 2 if len(body) < HEADER_PROBE_BYTES else 0
+        if next_probe:
+            # Bodies smaller than the first probe
+            self._check_header(bytes(body))
+        return bytes(body)
+
+    def _check_header(self, data: bytes) -> bool:
+        """Return True once the image header parses; raise if it declares too many pixels."""
+        try:
+            # Image.open only parses the header
+            width, height = Image.open(BytesIO(data)).size
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            return False
+        except Image.DecompressionBombError as e:
+            raise ImageDecodeError(str(e))
+
+        if width * height > self.max_pixels:
+            raise ImageDecodeError(
+                f"Image is {width}x{height} ({width * height} pixels), limit is {self.max_pixels} pixels"
+            )
+        return True
+
+    async def _pin_url(self, url: str) -> Tuple[httpx.URL, dict]:
+        """
+        Check a URL and return the URL to request with its request options.
+
+        Unless private hosts are allowed, the returned URL points at the checked
+        address, with the original Host header and TLS server name.
+
+        Raises:
+            ImageURLRejected: For non-http(s) or malformed URLs, and hosts resolving to non-public addresses
+        """
+        try:
+            target = httpx.URL(url)
+            port = target.port or (443 if target.scheme == "https" else 80)
+            if port > 65535:
+                raise ValueError(f"Invalid port: {port}")
+        except (httpx.InvalidURL, ValueError) as e:
+            raise ImageURLRejected(f"Malformed image URL: {e}")
+        if target.scheme not in ("http", "https") or not target.host:
+            raise ImageURLRejected("Image URL must be an absolute http(s) URL")
+        if self.allow_private_hosts:
+            return target, {}
+
+        hostname = target.raw_host.decode("ascii")
+        try:
+            addresses = await asyncio.get_running_loop().getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise ImageURLRejected(f"Cannot resolve {hostname}: {e}")
+
+        checked = [ipaddress.ip_address(sockaddr[0].split("%")[0]) for _, _, _, _, sockaddr in addresses]
+        if not checked or any(not address.is_global for address in checked):
+            raise ImageURLRejected(f"Image URL host {hostname} is not a public address")
+
+        return target.copy_with(host=str(checked[0])), {
+            "headers": {"Host": target.netloc.decode("ascii")},
+            "extensions": {"sni_hostname": hostname},
+        }
+
+    def stats(self) -> dict:
+        """Return fetch counters."""
+        return {
+            "fetches": self.fetches,
+            "failures": self.failures,
+            "bytes_fetched": self.bytes_fetched,
+            "max_bytes": self.max_bytes,
+            "timeout_seconds": self.timeout_seconds,
+        }
+
+    async def aclose(self):
+        """Close the connection pool."""
+        await self.client.aclose()
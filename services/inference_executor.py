@@ -0,0 +1,123 @@
+"""
+Inference Executor.
+Runs EmbeddingService calls on a bounded worker pool so the asyncio event loop stays free for I/O.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference queue is at capacity."""
+
+
+class InferenceExecutor:
+    """Bounded thread pool that executes EmbeddingService methods off the event loop."""
+
+    kind = "thread"
+
+    def __init__(self, embedding_service, max_workers: int = 1, max_queue: int = 64):
+        """
+        Initialize the executor.
+
+        Args:
+            embedding_service: Loaded EmbeddingService instance
+            max_workers: Number of inference threads
+            max_queue: Maximum number of calls waiting for a free worker
+        """
+        self.embedding_service = embedding_service
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="inference"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+        logger.info(
+            f"Inference executor started ({self.kind}, workers={self.max_workers}, queue={self.max_queue})"
+        )
+
+    async def run(self, method: str, *args, **kwargs) -> Any:
+        """
+        Run an EmbeddingService method on the executor.
+
+        Args:
+            method: Name of the EmbeddingService method (e.g. "encode_text")
+            *args: Positional arguments for the method
+            **kwargs: Keyword arguments for the method
+
+        Returns:
+            The method's return value
+
+        Raises:
+            InferenceQueueFull: If the queue is already at max_queue
+            RuntimeError: If the executor has been shut down
+        """
+        with self._lock:
+            if self._queued + self._running >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise InferenceQueueFull(
+                    f"Inference queue is full ({self.max_queue} waiting, {self.max_workers} running)"
+                )
+            self._queued += 1
+
+        try:
+            future = self._executor.submit(self._call, method, args, kwargs)
+        except RuntimeError:
+            # Shut down: the call never reaches the queue
+            with self._lock:
+                self._queued -= 1
+            raise
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _call(self, method: str, args: tuple, kwargs: dict) -> Any:
+        """Execute a method on a worker thread."""
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return getattr(self.embedding_service, method)(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _on_done(self, future):
+        """Update counters once a call finishes or is cancelled before starting."""
+        with self._lock:
+            if future.cancelled():
+                self._queued -= 1
+            elif future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def stats(self) -> dict:
+        """Return executor size, queue depth and counters."""
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self):
+        """Stop accepting work and wait for running calls to finish."""
+        self._executor.shutdown(wait=True)
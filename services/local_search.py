@@ -0,0 +1,593 @@
+"""
+Local Search Service.
+Answers embedding searches from an in-process index of media_items instead of the Supabase RPC.
+
+The embedding columns of media_items are indexed per search_type and kept
+current by sync(), which pages through rows changed after an (updated_at, id)
+watermark and upserts them. Each sync starts sync_overlap_seconds before the
+watermark, so rows whose transactions committed after a later row was already
+read are not skipped; re-reading a row just upserts it again. Deleted rows are found by periodically comparing
+ids with the table. With a state directory, the items, indexes and watermark
+are saved as a snapshot, so a restart only reads what changed meanwhile.
+With shards > 1 each index is split across worker processes (ShardedIndex);
+if a shard process dies, the service reloads from the snapshot or the table.
+
+Until the index is loaded, and for RPCs or search types it does not cover,
+every call is passed through to the remote SupabaseSearchService, so results
+never depend on whether the index is ready. Text search always goes to the
+remote service.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .sharded_index import ShardedIndex, ShardUnavailable
+from .supabase_service import SupabaseSearchService
+from .vector_index import create_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_COLUMNS = {
+    "visual": "visual_embedding",
+    "text": "text_embedding",
+    "combined": "combined_embedding",
+}
+
+# media_items columns kept in memory to build results
+RESULT_COLUMNS = [
+    "id", "filename", "original_filename", "file_type", "mime_type", "file_size",
+    "storage_path", "thumbnail_path", "description", "tags", "decade",
+    "duration_seconds", "metadata", "created_at", "updated_at",
+]
+
+# Bump when the snapshot layout changes
+SNAPSHOT_VERSION = 1
+
+# Snapshots no longer named by state.json are removed once this old; younger
+# ones may still be being written or read by another process
+STALE_SNAPSHOT_SECONDS = 600
+
+
+def parse_embedding(value) -> Optional[np.ndarray]:
+    """Return a pgvector value (a JSON-style string through PostgREST, or a list) as float32, or None."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _parse_timestamp(value: str) -> Optional[datetime]:
+    """Parse an updated_at value from PostgREST, treating one without an offset as UTC; None if unparseable."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _watermark_key(watermark: Tuple[str, str]) -> tuple:
+    """Sort key of a watermark: by time (not by how the timestamp is written), then id."""
+    updated_at = _parse_timestamp(watermark[0])
+    return (updated_at.timestamp() if updated_at else float("-inf"), watermark[0], watermark[1])
+
+
+def parse_embedding_columns(spec: str) -> Dict[str, str]:
+    """Parse 'visual=visual_embedding,text=text_embedding' into {search_type: column}."""
+    columns = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        search_type, _, column = part.partition("=")
+        if not column.strip():
+            raise ValueError(f"Expected search_type=column, got '{part.strip()}'")
+        columns[search_type.strip()] = column.strip()
+    return columns
+
+
+class LocalSearchService:
+    """Serves search_by_embedding from local indexes kept in sync with media_items, falling back to the RPC."""
+
+    def __init__(
+        self,
+        remote: SupabaseSearchService,
+        index_kind: str = "hnsw",
+        index_params: Optional[dict] = None,
+        embedding_columns: Optional[Dict[str, str]] = None,
+        rpc_name: str = "search_media_by_embedding",
+        page_size: int = 1000,
+        state_dir: Optional[str] = None,
+        reconcile_seconds: float = 3600.0,
+        save_seconds: float = 300.0,
+        shards: int = 1,
+        shard_timeout_seconds: float = 10.0,
+        sync_overlap_seconds: float = 30.0
+    ):
+        """
+        Initialize the service. The index is empty until load() runs.
+
+        Args:
+            remote: Service used for text search and as the fallback
+            index_kind: Index type for create_index ('exact', 'hnsw' or 'ivfpq')
+            index_params: Keyword arguments for the index (e.g. block_rows for exact, m and ef_search for hnsw)
+            embedding_columns: media_items column holding each search type's embeddings
+            rpc_name: The RPC whose embedding space the indexed columns belong to
+            page_size: Rows read per request while loading and syncing
+            state_dir: Directory for snapshots of the index and watermark; None keeps nothing on disk
+            reconcile_seconds: Min time between checks for deleted rows (and recall measurements)
+            save_seconds: Min time between snapshots after changes
+            shards: Worker processes each index is split across; 1 keeps indexes in this process
+            shard_timeout_seconds: Max time a sharded search waits for the slowest shard
+            sync_overlap_seconds: How far behind the watermark each sync starts reading, to pick
+                up rows committed late with an older updated_at
+        """
+        self.remote = remote
+        self.index_kind = index_kind
+        self.index_params = index_params or {}
+        self.embedding_columns = embedding_columns or dict(DEFAULT_EMBEDDING_COLUMNS)
+        self.rpc_name = rpc_name
+        self.page_size = page_size
+        self.state_dir = state_dir
+        self.reconcile_seconds = reconcile_seconds
+        self.save_seconds = save_seconds
+        self.shards = max(1, shards)
+        self.shard_timeout_seconds = shard_timeout_seconds
+        self.sync_overlap_seconds = max(0.0, sync_overlap_seconds)
+
+        # Only load() and sync() change the state below, one at a time; searches
+        # read it without locking, so arrays are replaced rather than resized
+        self._lock = threading.Lock()
+        self.ready = False
+        self.indexes: Dict[str, object] = {}
+        self._slots: Dict[str, int] = {}
+        self._results: List[Optional[dict]] = []
+        self._codes: Dict[str, Dict[str, int]] = {"file_type": {}, "decade": {}}
+        self._file_type_codes = np.zeros(0, dtype=np.int32)
+        self._decade_codes = np.zeros(0, dtype=np.int32)
+        self.watermark: Optional[Tuple[str, str]] = None
+
+        self.loaded_from: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.last_synced_at: Optional[float] = None
+        self._last_reconciled_at = 0.0
+        self._last_saved_at = 0.0
+        self._dirty = False
+        self.sync_error: Optional[str] = None
+        self.pending_rows = 0
+        self.upserted_rows = 0
+        self.deleted_rows = 0
+        self.local_searches = 0
+        self.fallback_searches = 0
+        self.failed_searches = 0
+
+    def load(self):
+        """
+        Load the index (blocking): from the last snapshot plus the changes since, or from the whole table.
+        """
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                if self.state_dir and self._restore():
+                    self.loaded_from = "snapshot"
+                    self._reconcile()
+                else:
+                    self._reset()
+                    self.loaded_from = "table"
+                    # Rows without updated_at are invisible to the watermark; read them once here
+                    columns = RESULT_COLUMNS + sorted(set(self.embedding_columns.values()))
+                    for page in self.remote.fetch_media_items(columns, self.page_size, without_updated_at=True):
+                        self._apply_rows(page)
+                    self._last_reconciled_at = time.monotonic()
+                self._sync_changes()
+                self._measure_recall()
+            except Exception as e:
+                self.sync_error = str(e)
+                raise
+
+            self.ready = True
+            self.load_seconds = time.perf_counter() - started
+            logger.info(
+                f"Local {self.index_kind} index loaded from {self.loaded_from}: {len(self._slots)} items, "
+                f"types {sorted(self.indexes)} in {self.load_seconds:.1f}s"
+            )
+            self._save(force=True)
+
+    def sync(self):
+        """
+        Apply rows changed since the watermark, and deletions when a reconcile is due (blocking).
+
+        Loads the index first if it is not loaded yet.
+        """
+        if not self.ready:
+            self.load()
+            return
+
+        with self._lock:
+            try:
+                self._sync_changes()
+                if time.monotonic() - self._last_reconciled_at >= self.reconcile_seconds:
+                    self._reconcile()
+                    self._measure_recall()
+            except Exception as e:
+                self.sync_error = str(e)
+                if isinstance(e, ShardUnavailable):
+                    # The next sync() reloads everything into new shards
+                    self.ready = False
+                raise
+            self._save()
+
+    def _sync_changes(self):
+        """Page through rows changed since the watermark, less the overlap window, and upsert them."""
+        after = self._sync_start()
+        self.pending_rows = self.remote.count_media_changes(after)
+        columns = RESULT_COLUMNS + sorted(set(self.embedding_columns.values()))
+        for page in self.remote.fetch_media_changes(columns, after, self.page_size):
+            self._apply_rows(page)
+            last = (page[-1]["updated_at"], str(page[-1]["id"]))
+            # Rows re-read from the overlap window must not move the watermark back
+            if self.watermark is None or _watermark_key(last) > _watermark_key(self.watermark):
+                self.watermark = last
+            self.pending_rows = max(0, self.pending_rows - len(page))
+        self.pending_rows = 0
+        self.last_synced_at = time.time()
+        self.sync_error = None
+
+    def _sync_start(self) -> Optional[Tuple[str, Optional[str]]]:
+        """Return where a sync starts reading: sync_overlap_seconds before the watermark."""
+        if self.watermark is None or not self.sync_overlap_seconds:
+            return self.watermark
+        updated_at = _parse_timestamp(self.watermark[0])
+        if updated_at is None:
+            return self.watermark
+        return (updated_at - timedelta(seconds=self.sync_overlap_seconds)).isoformat(), None
+
+    def _reconcile(self):
+        """Remove items whose rows no longer exist in media_items."""
+        existing = set()
+        for ids in self.remote.fetch_media_ids():
+            existing.update(ids)
+        deleted = [item_id for item_id in self._slots if item_id not in existing]
+        if deleted:
+            self._delete(deleted)
+            logger.info(f"Local index: removed {len(deleted)} deleted items")
+        self._last_reconciled_at = time.monotonic()
+
+    def _measure_recall(self):
+        """Re-measure recall of approximate indexes that support it (ivfpq), as the data changes."""
+        for index in self.indexes.values():
+            measure_recall = getattr(index, "measure_recall", None)
+            if measure_recall is not None:
+                measure_recall()
+
+    def _create_index(self):
+        """Create an empty index of the configured kind, sharded when shards > 1."""
+        if self.shards > 1:
+            return ShardedIndex(
+                self.index_kind, self.shards, timeout_seconds=self.shard_timeout_seconds, **self.index_params
+            )
+        return create_index(self.index_kind, **self.index_params)
+
+    def _code(self, field: str, value: Optional[str]) -> int:
+        """Return the integer code of a filter value, assigning one to new values."""
+        if value is None:
+            return -1
+        codes = self._codes[field]
+        if value not in codes:
+            codes[value] = len(codes)
+        return codes[value]
+
+    def _apply_rows(self, rows: List[dict]):
+        """Upsert media_items rows into the items and every index."""
+        count = len(self._results)
+        slots = []
+        for row in rows:
+            item_id = str(row["id"])
+            slot = self._slots.get(item_id)
+            if slot is None:
+                slot = count
+                count += 1
+            slots.append(slot)
+
+        if count > len(self._file_type_codes):
+            size = max(count, int(len(self._file_type_codes) * 1.5))
+            file_type_codes = np.full(size, -1, dtype=np.int32)
+            file_type_codes[:len(self._file_type_codes)] = self._file_type_codes
+            decade_codes = np.full(size, -1, dtype=np.int32)
+            decade_codes[:len(self._decade_codes)] = self._decade_codes
+            self._file_type_codes, self._decade_codes = file_type_codes, decade_codes
+
+        additions: Dict[str, Tuple[List[int], List[np.ndarray]]] = {
+            search_type: ([], []) for search_type in self.embedding_columns
+        }
+        removals: Dict[str, List[int]] = {search_type: [] for search_type in self.embedding_columns}
+        for row, slot in zip(rows, slots):
+            result = self.remote.format_result(row, 0.0)
+            if slot == len(self._results):
+                self._results.append(result)
+            else:
+                self._results[slot] = result
+            self._slots[result["id"]] = slot
+            self._file_type_codes[slot] = self._code("file_type", result["file_type"])
+            self._decade_codes[slot] = self._code("decade", result["decade"])
+
+            for search_type, column in self.embedding_columns.items():
+                vector = parse_embedding(row.get(column))
+                if vector is None:
+                    removals[search_type].append(slot)
+                else:
+                    additions[search_type][0].append(slot)
+                    additions[search_type][1].append(vector)
+
+        for search_type, (added_slots, vectors) in additions.items():
+            if added_slots:
+                matrix = np.stack(vectors)
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                if search_type not in self.indexes:
+                    self.indexes[search_type] = self._create_index()
+                self.indexes[search_type].add(np.asarray(added_slots, dtype=np.int64), matrix)
+            if removals[search_type] and search_type in self.indexes:
+                self.indexes[search_type].remove(np.asarray(removals[search_type], dtype=np.int64))
+
+        self.upserted_rows += len(rows)
+        self._dirty = True
+
+    def _delete(self, item_ids: List[str]):
+        """Remove items from the items and every index. Their slots are not reused."""
+        slots = np.asarray([self._slots.pop(item_id) for item_id in item_ids], dtype=np.int64)
+        for index in self.indexes.values():
+            index.remove(slots)
+        for slot in slots:
+            self._results[slot] = None
+        self._file_type_codes[slots] = -1
+        self._decade_codes[slots] = -1
+        self.deleted_rows += len(slots)
+        self._dirty = True
+
+    def _reset(self):
+        """Forget every item, index and the watermark."""
+        self._shutdown_indexes()
+        self.indexes = {}
+        self._slots = {}
+        self._results = []
+        self._codes = {"file_type": {}, "decade": {}}
+        self._file_type_codes = np.zeros(0, dtype=np.int32)
+        self._decade_codes = np.zeros(0, dtype=np.int32)
+        self.watermark = None
+
+    def _shutdown_indexes(self):
+        """Stop the processes of sharded indexes."""
+        for index in self.indexes.values():
+            if isinstance(index, ShardedIndex):
+                index.shutdown()
+
+    def _state_matches(self, state: dict) -> bool:
+        """Whether a snapshot was written with this service's settings."""
+        return (
+            state.get("version") == SNAPSHOT_VERSION
+            and state.get("index_kind") == self.index_kind
+            and state.get("index_params") == json.loads(json.dumps(self.index_params))
+            and state.get("shards", 1) == self.shards
+            and state.get("embedding_columns") == self.embedding_columns
+            and state.get("rpc_name") == self.rpc_name
+        )
+
+    def _save(self, force: bool = False):
+        """Write a snapshot when there are changes and the last one is old enough (or when forced)."""
+        if not self.state_dir or not self._dirty:
+            return
+        if not force and time.monotonic() - self._last_saved_at < self.save_seconds:
+            return
+
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            snapshot_dir = tempfile.mkdtemp(prefix="snapshot-", dir=self.state_dir)
+            with open(os.path.join(snapshot_dir, "items.jsonl"), "w") as f:
+                for result in self._results:
+                    f.write(json.dumps(result) + "\n")
+            for search_type, index in self.indexes.items():
+                index.save(os.path.join(snapshot_dir, search_type))
+
+            state = {
+                "version": SNAPSHOT_VERSION,
+                "index_kind": self.index_kind,
+                "index_params": self.index_params,
+                "shards": self.shards,
+                "embedding_columns": self.embedding_columns,
+                "rpc_name": self.rpc_name,
+                "watermark": list(self.watermark) if self.watermark else None,
+                "snapshot": os.path.basename(snapshot_dir),
+                "saved_at": time.time(),
+            }
+            fd, tmp_path = tempfile.mkstemp(prefix=".state-", suffix=".tmp", dir=self.state_dir)
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, os.path.join(self.state_dir, "state.json"))
+        except Exception as e:
+            logger.warning(f"Failed to save local index snapshot: {e}")
+            return
+
+        for name in os.listdir(self.state_dir):
+            path = os.path.join(self.state_dir, name)
+            if name.startswith("snapshot-") and path != snapshot_dir:
+                try:
+                    if time.time() - os.path.getmtime(path) > STALE_SNAPSHOT_SECONDS:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+        self._last_saved_at = time.monotonic()
+        self._dirty = False
+
+    def _restore(self) -> bool:
+        """Load the latest snapshot; return False (with nothing loaded) if there is none or it does not fit."""
+        state_path = os.path.join(self.state_dir, "state.json")
+        if not os.path.exists(state_path):
+            return False
+
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+            if not self._state_matches(state):
+                logger.info("Local index snapshot was written with other settings; reloading from the table")
+                return False
+
+            snapshot_dir = os.path.join(self.state_dir, state["snapshot"])
+            self._reset()
+            with open(os.path.join(snapshot_dir, "items.jsonl")) as f:
+                self._results = [json.loads(line) for line in f]
+            self._file_type_codes = np.full(len(self._results), -1, dtype=np.int32)
+            self._decade_codes = np.full(len(self._results), -1, dtype=np.int32)
+            for slot, result in enumerate(self._results):
+                if result is not None:
+                    self._slots[result["id"]] = slot
+                    self._file_type_codes[slot] = self._code("file_type", result["file_type"])
+                    self._decade_codes[slot] = self._code("decade", result["decade"])
+
+            for search_type in self.embedding_columns:
+                index_dir = os.path.join(snapshot_dir, search_type)
+                if os.path.isdir(index_dir):
+                    index = self._create_index()
+                    self.indexes[search_type] = index
+                    index.load(index_dir)
+            self.watermark = tuple(state["watermark"]) if state["watermark"] else None
+        except Exception as e:
+            logger.warning(f"Failed to restore local index snapshot; reloading from the table: {e}")
+            self._reset()
+            return False
+
+        self._dirty = False
+        return True
+
+    async def search_by_embedding(
+        self,
+        embedding: Union[List[float], np.ndarray],
+        search_type: str = "combined",
+        limit: int = 20,
+        threshold: float = 0.0,
+        file_type: Optional[str] = None,
+        decade: Optional[str] = None,
+        rpc_name: str = "search_media_by_embedding"
+    ) -> List[dict]:
+        """
+        Search media items by embedding similarity; same arguments and results as SupabaseSearchService.
+
+        Returns:
+            List of search results with similarity scores
+        """
+        if not self.ready or rpc_name != self.rpc_name or search_type not in self.indexes:
+            self.fallback_searches += 1
+            return await self.remote.search_by_embedding(
+                embedding=embedding,
+                search_type=search_type,
+                limit=limit,
+                threshold=threshold,
+                file_type=file_type,
+                decade=decade,
+                rpc_name=rpc_name
+            )
+
+        try:
+            results = await asyncio.to_thread(
+                self._search_local, np.asarray(embedding, dtype=np.float32),
+                search_type, limit, threshold, file_type, decade
+            )
+        except (ShardUnavailable, TimeoutError) as e:
+            logger.warning(f"Local index search failed, using the RPC: {e}")
+            self.failed_searches += 1
+            return await self.remote.search_by_embedding(
+                embedding=embedding,
+                search_type=search_type,
+                limit=limit,
+                threshold=threshold,
+                file_type=file_type,
+                decade=decade,
+                rpc_name=rpc_name
+            )
+
+        self.local_searches += 1
+        return results
+
+    def _search_local(
+        self,
+        query: np.ndarray,
+        search_type: str,
+        limit: int,
+        threshold: float,
+        file_type: Optional[str],
+        decade: Optional[str]
+    ) -> List[dict]:
+        """Search the local index and build the results."""
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        allowed = None
+        for field, value, codes in (
+            ("file_type", file_type, self._file_type_codes),
+            ("decade", decade, self._decade_codes),
+        ):
+            if value is None:
+                continue
+            code = self._codes[field].get(value)
+            if code is None:
+                return []
+            allowed = codes == code if allowed is None else allowed & (codes == code)
+
+        index = self.indexes[search_type]
+        try:
+            rows, scores = index.search(query, limit, allowed)
+        except ShardUnavailable:
+            # Unless a reload already replaced it, the next sync() reloads everything into new shards
+            if self.indexes.get(search_type) is index:
+                self.ready = False
+            raise
+
+        results = []
+        stored = self._results
+        for row, score in zip(rows, scores):
+            if score <= threshold:
+                break
+            # Deleted by a sync since the index was searched
+            if row >= len(stored) or stored[row] is None:
+                continue
+            result = dict(stored[row])
+            result["similarity_score"] = float(score)
+            results.append(result)
+        return results
+
+    async def text_search(self, *args, **kwargs) -> List[dict]:
+        """Keyword search, always answered by the remote service."""
+        return await self.remote.text_search(*args, **kwargs)
+
+    def shutdown(self):
+        """Stop the processes of sharded indexes; searches fall back to the RPC afterwards."""
+        self.ready = False
+        self._shutdown_indexes()
+
+    def stats(self) -> dict:
+        """Return load and sync state, staleness, index sizes and local/fallback counters."""
+        return {
+            "kind": self.index_kind,
+            "shards": self.shards,
+            "ready": self.ready,
+            "loaded_from": self.loaded_from,
+            "items": len(self._slots),
+            "indexes": {search_type: index.stats() for search_type, index in self.indexes.items()},
+            "load_seconds": round(self.load_seconds, 2) if self.load_seconds is not None else None,
+            "watermark": self.watermark[0] if self.watermark else None,
+            "lag_seconds": round(time.time() - self.last_synced_at, 1) if self.last_synced_at else None,
+            "pending_rows": self.pending_rows,
+            "upserted_rows": self.upserted_rows,
+            "deleted_rows": self.deleted_rows,
+            "sync_error": self.sync_error,
+            "local_searches": self.local_searches,
+            "fallback_searches": self.fallback_searches,
+            "failed_searches": self.failed_searches,
+        }
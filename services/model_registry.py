@@ -0,0 +1,274 @@
+"""
+Model Registry.
+Keeps several embedding models loaded under a memory budget, evicting the least recently used one.
+
+Each servable model needs a search RPC over the embedding columns of its
+embedding space. Models in the default model's space use the schema's
+search_media_by_embedding; any other model is only served when its RPC is
+configured. Evicted models are shut down on a worker thread, since stopping
+an executor can block for seconds.
+"""
+
+import asyncio
+import gc
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from .embedding_service import MODEL_CONFIGS
+
+logger = logging.getLogger(__name__)
+
+# The schema's RPC, searching the embedding columns of the default model's space
+DEFAULT_SEARCH_RPC = "search_media_by_embedding"
+
+
+def parse_search_rpcs(spec: str) -> Dict[str, str]:
+    """Parse 'clip-ViT-L-14=search_vit_l_14,...' into {model: rpc}."""
+    rpcs = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        model_name, _, rpc = part.partition("=")
+        if not rpc.strip():
+            raise ValueError(f"Expected model=rpc, got '{part.strip()}'")
+        rpcs[model_name.strip()] = rpc.strip()
+    return rpcs
+
+
+def resolve_search_rpcs(default_model: str, models: List[str], configured: Dict[str, str]) -> Dict[str, str]:
+    """
+    Return the search RPC of each model that has one.
+
+    Args:
+        default_model: The model whose embedding space the schema's RPC searches
+        models: Models to resolve
+        configured: Explicit {model: rpc} entries, which take precedence
+
+    Returns:
+        {model: rpc}; models without an RPC are left out
+    """
+    default_space = MODEL_CONFIGS[default_model].get("embedding_space", default_model)
+    rpcs = {}
+    for model_name in models:
+        if model_name in configured:
+            rpcs[model_name] = configured[model_name]
+        elif model_name == default_model or MODEL_CONFIGS[model_name].get("embedding_space") == default_space:
+            rpcs[model_name] = DEFAULT_SEARCH_RPC
+    return rpcs
+
+
+class UnknownModel(ValueError):
+    """Raised when a request names a model this process does not serve."""
+
+
+class ModelBudgetExceeded(Exception):
+    """Raised when a model cannot be loaded without exceeding the memory budget."""
+
+
+class LoadedModel:
+    """An EmbeddingService together with the inference executor and text batcher serving it."""
+
+    def __init__(self, service, executor, batcher):
+        """
+        Initialize the entry.
+
+        Args:
+            service: Loaded EmbeddingService
+            executor: InferenceExecutor or WorkerPool running the service
+            batcher: TextBatcher in front of the executor
+        """
+        self.service = service
+        self.executor = executor
+        self.batcher = batcher
+        self.active = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def model_name(self) -> str:
+        return self.service.model_name
+
+    def memory_bytes(self) -> int:
+        """Return the size of the loaded weights (grows when the vision tower loads)."""
+        return self.service.memory_bytes()
+
+    def shutdown(self):
+        """Stop the executor serving this model."""
+        self.executor.shutdown()
+
+
+class ModelRegistry:
+    """LRU set of loaded models with a pinned default model and a memory budget."""
+
+    def __init__(
+        self,
+        loader: Callable[[str], LoadedModel],
+        default: LoadedModel,
+        servable_models: Optional[List[str]] = None,
+        memory_budget_mb: float = 0.0,
+        search_rpcs: Optional[Dict[str, str]] = None
+    ):
+        """
+        Initialize the registry.
+
+        Args:
+            loader: Blocking callable that loads a model by MODEL_CONFIGS name
+            default: Already-loaded default model; never evicted
+            servable_models: Models requests may select (default: only the default model)
+            memory_budget_mb: Max total weight size of loaded models in MB (0 = unlimited)
+            search_rpcs: Search RPC per model, for models outside the default model's embedding space
+
+        Raises:
+            ValueError: For servable models not in MODEL_CONFIGS
+        """
+        self.loader = loader
+        self.default_model = default.model_name
+        requested = list(dict.fromkeys([self.default_model] + list(servable_models or [])))
+        for model_name in requested:
+            if model_name not in MODEL_CONFIGS:
+                raise ValueError(f"Unknown model: {model_name}. Available: {list(MODEL_CONFIGS.keys())}")
+
+        self.search_rpcs = resolve_search_rpcs(self.default_model, requested, search_rpcs or {})
+        self.servable_models = [model_name for model_name in requested if model_name in self.search_rpcs]
+        for model_name in requested:
+            if model_name not in self.search_rpcs:
+                logger.error(
+                    f"Not serving {model_name}: its embedding space differs from {self.default_model} "
+                    f"and no search RPC is configured for it (MODEL_SEARCH_RPCS)"
+                )
+        self.memory_budget = int(max(0.0, memory_budget_mb) * 1024 * 1024)
+        self._models: Dict[str, LoadedModel] = {self.default_model: default}
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+
+        self.loads = 0
+        self.evictions = 0
+
+    @property
+    def default(self) -> LoadedModel:
+        return self._models[self.default_model]
+
+    def search_rpc(self, model_name: str) -> str:
+        """Return the search RPC of a servable model."""
+        return self.search_rpcs[model_name]
+
+    def loaded_models(self) -> List[LoadedModel]:
+        """Return the currently loaded models."""
+        return list(self._models.values())
+
+    @asynccontextmanager
+    async def use(self, model_name: Optional[str] = None) -> AsyncIterator[LoadedModel]:
+        """
+        Hold a model for the duration of a request, loading it first if needed.
+
+        A model in use is never evicted.
+
+        Args:
+            model_name: MODEL_CONFIGS name, or None for the default model
+
+        Raises:
+            UnknownModel: If the model is not in servable_models
+            ModelBudgetExceeded: If loading it would exceed the memory budget
+        """
+        entry = await self._get(model_name or self.default_model)
+        entry.active += 1
+        try:
+            yield entry
+        finally:
+            entry.active -= 1
+            entry.last_used = time.monotonic()
+
+    async def _get(self, model_name: str) -> LoadedModel:
+        """Return a loaded model, loading it (once, even under concurrent requests) if needed."""
+        if model_name not in self.servable_models:
+            raise UnknownModel(f"Model {model_name} is not served. Available: {self.servable_models}")
+
+        entry = self._models.get(model_name)
+        if entry is not None:
+            entry.last_used = time.monotonic()
+            return entry
+
+        lock = self._load_locks.setdefault(model_name, asyncio.Lock())
+        async with lock:
+            entry = self._models.get(model_name)
+            if entry is not None:
+                return entry
+
+            estimate = int(MODEL_CONFIGS[model_name].get("size_mb", 0) * 1024 * 1024)
+            await self._release(self._evict(estimate, model_name))
+
+            logger.info(f"Loading model {model_name} on demand...")
+            entry = await asyncio.to_thread(self.loader, model_name)
+            self._models[model_name] = entry
+            self.loads += 1
+
+            # The estimate can be off; settle against the measured size
+            await self._release(self._evict(0, model_name))
+            return entry
+
+    def _evict(self, incoming_bytes: int, keep: str) -> List[LoadedModel]:
+        """
+        Unregister least-recently-used idle models until incoming_bytes fits in the budget.
+
+        Returns:
+            The evicted models, for _release() to shut down
+        """
+        victims: List[LoadedModel] = []
+        if not self.memory_budget:
+            return victims
+
+        while sum(entry.memory_bytes() for entry in self._models.values()) + incoming_bytes > self.memory_budget:
+            candidates = [
+                entry for name, entry in self._models.items()
+                if name not in (self.default_model, keep) and entry.active == 0
+            ]
+            if not candidates:
+                if keep in self._models:
+                    # Already loaded; serve it over budget rather than fail a request in flight
+                    logger.warning("Model memory is over budget and every other model is in use or pinned")
+                    return victims
+                raise ModelBudgetExceeded(
+                    f"Loading {keep} would exceed the model memory budget "
+                    f"({self.memory_budget // (1024 * 1024)} MB) and no idle model can be evicted"
+                )
+
+            victim = min(candidates, key=lambda entry: entry.last_used)
+            del self._models[victim.model_name]
+            victims.append(victim)
+            self.evictions += 1
+            logger.info(f"Evicted model {victim.model_name} ({victim.memory_bytes() / (1024 * 1024):.0f} MB)")
+        return victims
+
+    async def _release(self, victims: List[LoadedModel]):
+        """Shut down evicted models and free their weights on a worker thread."""
+        if not victims:
+            return
+
+        def release():
+            for victim in victims:
+                victim.shutdown()
+            victims.clear()
+            gc.collect()
+
+        await asyncio.to_thread(release)
+
+    def stats(self) -> dict:
+        """Return the budget, load/eviction counters and per-model memory and usage."""
+        now = time.monotonic()
+        return {
+            "default_model": self.default_model,
+            "servable_models": self.servable_models,
+            "memory_budget_mb": self.memory_budget / (1024 * 1024),
+            "memory_mb": round(sum(entry.memory_bytes() for entry in self._models.values()) / (1024 * 1024), 1),
+            "loaded": {
+                name: {
+                    "memory_mb": round(entry.memory_bytes() / (1024 * 1024), 1),
+                    "active": entry.active,
+                    "idle_seconds": round(now - entry.last_used, 1),
+                    "inference_executor": entry.executor.stats(),
+                }
+                for name, entry in self._models.items()
+            },
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,352 @@
+"""
+ONNX Runtime Backend.
+Exports the text and vision towers of a MODEL_CONFIGS model to ONNX once, caches them on disk,
+and runs them with onnxruntime on CPU.
+"""
+
+import inspect
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import List, Optional, Sequence
+
+import numpy as np
+import torch
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "saga-search", "onnx")
+ONNX_OPSET = 17
+
+
+def _normalize(embeddings: torch.Tensor) -> torch.Tensor:
+    """L2-normalize embeddings along the last dimension."""
+    return embeddings / embeddings.norm(dim=-1, keepdim=True)
+
+
+def _projected(output) -> torch.Tensor:
+    """Return projected CLIP features (newer transformers wrap them in a model output)."""
+    if isinstance(output, torch.Tensor):
+        return output
+    return output.pooler_output
+
+
+class _SentenceTransformerTextTower(torch.nn.Module):
+    """Text tower of a non-CLIP sentence-transformers model (transformer + pooling + dense)."""
+
+    def __init__(self, st_model):
+        super().__init__()
+        self.st_model = st_model
+
+    def forward(self, input_ids, attention_mask):
+        features = self.st_model({"input_ids": input_ids, "attention_mask": attention_mask})
+        return _normalize(features["sentence_embedding"])
+
+
+class _HFClipTextTower(torch.nn.Module):
+    """Text tower of a HuggingFace CLIPModel."""
+
+    def __init__(self, clip_model):
+        super().__init__()
+        self.clip_model = clip_model
+
+    def forward(self, input_ids, attention_mask):
+        features = self.clip_model.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+        return _normalize(_projected(features))
+
+
+class _HFClipVisionTower(torch.nn.Module):
+    """Vision tower of a HuggingFace CLIPModel."""
+
+    def __init__(self, clip_model):
+        super().__init__()
+        self.clip_model = clip_model
+
+    def forward(self, pixel_values):
+        return _normalize(_projected(self.clip_model.get_image_features(pixel_values=pixel_values)))
+
+
+class _OpenClipTextTower(torch.nn.Module):
+    """Text tower of an OpenCLIP model."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, tokens):
+        return _normalize(self.model.encode_text(tokens))
+
+
+class _OpenClipVisionTower(torch.nn.Module):
+    """Vision tower of an OpenCLIP model."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return _normalize(self.model.encode_image(pixel_values))
+
+
+class OnnxClipBackend:
+    """ONNX Runtime sessions and preprocessing for one model's text and vision towers."""
+
+    def __init__(self, model_name: str, source_type: str, cache_dir: Optional[str] = None, num_threads: int = 0):
+        """
+        Initialize the backend (nothing is loaded until export() or load()).
+
+        Args:
+            model_name: MODEL_CONFIGS key
+            source_type: MODEL_CONFIGS type the ONNX graphs are exported from
+            cache_dir: Root directory for exported artifacts
+            num_threads: onnxruntime intra-op threads (0 = library default)
+        """
+        self.model_name = model_name
+        self.source_type = source_type
+        self.cache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, model_name)
+        self.num_threads = num_threads
+
+        self.meta: dict = {}
+        self.text_session = None
+        self.vision_session = None
+        self.tokenizer = None
+        self.image_processor = None
+        self.preprocess = None
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.cache_dir, "meta.json")
+
+    def is_exported(self) -> bool:
+        """Return True if a complete export exists in the cache directory."""
+        return os.path.exists(self.meta_path)
+
+    # --- Export ---
+
+    def export(self, model, preprocess=None):
+        """
+        Export the towers of a loaded torch model to ONNX.
+
+        Artifacts are written to a temporary directory and moved into place at the end,
+        so concurrent workers never see a partial export.
+
+        Args:
+            model: Loaded SentenceTransformer or OpenCLIP model
+            preprocess: OpenCLIP image transform (OpenCLIP models only)
+        """
+        os.makedirs(os.path.dirname(self.cache_dir), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{self.model_name}-", dir=os.path.dirname(self.cache_dir))
+
+        try:
+            if self.source_type == "open_clip":
+                meta = self._export_open_clip(model, preprocess, staging)
+            else:
+                meta = self._export_sentence_transformer(model, staging)
+
+            meta["model_name"] = self.model_name
+            meta["source_type"] = self.source_type
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump(meta, f)
+
+            if os.path.exists(self.cache_dir):
+                shutil.rmtree(self.cache_dir)
+            os.replace(staging, self.cache_dir)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        logger.info(f"Exported ONNX towers for {self.model_name} to {self.cache_dir}")
+
+    def _export_sentence_transformer(self, st_model, out_dir: str) -> dict:
+        """Export a sentence-transformers model (CLIP or text-only)."""
+        first_module = st_model[0]
+        clip_model = getattr(first_module, "model", None)
+
+        if clip_model is not None and hasattr(clip_model, "get_image_features"):
+            # CLIP checkpoint: export both towers and keep the HF processor for preprocessing
+            processor = first_module.processor
+            processor.save_pretrained(os.path.join(out_dir, "preprocessor"))
+
+            tokens = processor.tokenizer(["a photo"], padding=True, return_tensors="pt")
+            self._export_tower(
+                _HFClipTextTower(clip_model),
+                (tokens["input_ids"], tokens["attention_mask"]),
+                ["input_ids", "attention_mask"],
+                {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"}},
+                os.path.join(out_dir, "text.onnx")
+            )
+
+            image_size = clip_model.config.vision_config.image_size
+            self._export_tower(
+                _HFClipVisionTower(clip_model),
+                (torch.zeros(1, 3, image_size, image_size),),
+                ["pixel_values"],
+                {"pixel_values": {0: "batch"}},
+                os.path.join(out_dir, "vision.onnx")
+            )
+            return {"kind": "hf_clip", "max_length": processor.tokenizer.model_max_length, "vision": True}
+
+        # Text-only model (e.g. the multilingual distilled text encoder)
+        st_model.tokenizer.save_pretrained(os.path.join(out_dir, "tokenizer"))
+        tokens = st_model.tokenizer(["a photo"], padding=True, return_tensors="pt")
+        self._export_tower(
+            _SentenceTransformerTextTower(st_model),
+            (tokens["input_ids"], tokens["attention_mask"]),
+            ["input_ids", "attention_mask"],
+            {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"}},
+            os.path.join(out_dir, "text.onnx")
+        )
+        return {"kind": "st_text", "max_length": st_model.max_seq_length, "vision": False}
+
+    def _export_open_clip(self, model, preprocess, out_dir: str) -> dict:
+        """Export an OpenCLIP model."""
+        import open_clip
+
+        tokens = open_clip.get_tokenizer(self.model_name)(["a photo"])
+        self._export_tower(
+            _OpenClipTextTower(model),
+            (tokens,),
+            ["tokens"],
+            {"tokens": {0: "batch"}},
+            os.path.join(out_dir, "text.onnx")
+        )
+
+        pixels = preprocess(Image.new("RGB", (224, 224))).unsqueeze(0)
+        self._export_tower(
+            _OpenClipVisionTower(model),
+            (pixels,),
+            ["pixel_values"],
+            {"pixel_values": {0: "batch"}},
+            os.path.join(out_dir, "vision.onnx")
+        )
+
+        visual = model.visual
+        image_size = visual.image_size
+        return {
+            "kind": "open_clip",
+            "vision": True,
+            "image_size": list(image_size) if isinstance(image_size, (tuple, list)) else image_size,
+            "image_mean": list(getattr(visual, "image_mean", None) or open_clip.OPENAI_DATASET_MEAN),
+            "image_std": list(getattr(visual, "image_std", None) or open_clip.OPENAI_DATASET_STD),
+        }
+
+    def _export_tower(self, tower: torch.nn.Module, args: tuple, input_names: List[str], dynamic_axes: dict, path: str):
+        """Trace one tower to an ONNX file on CPU."""
+        tower = tower.to("cpu").eval()
+        dynamic_axes = dict(dynamic_axes, embedding={0: "batch"})
+
+        kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            # The TorchScript exporter handles the dynamic batch/sequence axes these towers need
+            kwargs["dynamo"] = False
+
+        # Traced with grad enabled: under no_grad, nn.MultiheadAttention takes a fused
+        # fast path that has no ONNX symbolic
+        torch.onnx.export(
+            tower,
+            tuple(a.to("cpu") for a in args),
+            path,
+            input_names=input_names,
+            output_names=["embedding"],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            **kwargs
+        )
+
+    # --- Inference ---
+
+    def load(self, towers: Sequence[str] = ("text", "vision")):
+        """
+        Create onnxruntime sessions and preprocessors from the cached export.
+
+        Args:
+            towers: Towers to load ("text" and/or "vision"); the vision tower is
+                skipped if the export has none
+        """
+        import onnxruntime as ort
+
+        with open(self.meta_path) as f:
+            self.meta = json.load(f)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        providers = ["CPUExecutionProvider"]
+
+        if "text" in towers:
+            self.text_session = ort.InferenceSession(
+                os.path.join(self.cache_dir, "text.onnx"), sess_options=options, providers=providers
+            )
+        if "vision" in towers and self.meta.get("vision"):
+            self.vision_session = ort.InferenceSession(
+                os.path.join(self.cache_dir, "vision.onnx"), sess_options=options, providers=providers
+            )
+
+        kind = self.meta["kind"]
+        if kind == "hf_clip":
+            from transformers import CLIPProcessor
+
+            processor = CLIPProcessor.from_pretrained(os.path.join(self.cache_dir, "preprocessor"))
+            self.tokenizer = processor.tokenizer
+            self.image_processor = processor.image_processor
+        elif kind == "st_text":
+            from transformers import AutoTokenizer
+
+            self.tokenizer = AutoTokenizer.from_pretrained(os.path.join(self.cache_dir, "tokenizer"))
+        elif kind == "open_clip":
+            import open_clip
+
+            self.tokenizer = open_clip.get_tokenizer(self.model_name)
+            image_size = self.meta["image_size"]
+            self.preprocess = open_clip.image_transform(
+                tuple(image_size) if isinstance(image_size, list) else image_size,
+                is_train=False,
+                mean=tuple(self.meta["image_mean"]),
+                std=tuple(self.meta["image_std"])
+            )
+
+        logger.info(
+            f"ONNX sessions loaded for {self.model_name} ({kind}, "
+            f"text={self.text_session is not None}, vision={self.vision_session is not None})"
+        )
+
+    def memory_bytes(self) -> int:
+        """Return the on-disk size of the graphs with loaded sessions (weights are stored in the graph)."""
+        total = 0
+        for name, session in (("text.onnx", self.text_session), ("vision.onnx", self.vision_session)):
+            if session is not None:
+                total += os.path.getsize(os.path.join(self.cache_dir, name))
+        return total
+
+    def encode_text(self, texts: List[str]) -> np.ndarray:
+        """Encode texts to L2-normalized float32 embeddings."""
+        if self.meta["kind"] == "open_clip":
+            feeds = {"tokens": self.tokenizer(texts).numpy().astype(np.int64)}
+        else:
+            tokens = self.tokenizer(
+                texts,
+                padding=True,
+                truncation=True,
+                max_length=self.meta["max_length"],
+                return_tensors="np"
+            )
+            feeds = {
+                "input_ids": tokens["input_ids"].astype(np.int64),
+                "attention_mask": tokens["attention_mask"].astype(np.int64),
+            }
+        return self.text_session.run(None, feeds)[0]
+
+    def encode_images(self, images: List[Image.Image]) -> np.ndarray:
+        """Encode RGB PIL images to L2-normalized float32 embeddings."""
+        if self.vision_session is None:
+            raise ValueError(f"No vision session loaded for {self.model_name}")
+
+        if self.meta["kind"] == "open_clip":
+            pixels = np.stack([self.preprocess(img).numpy() for img in images])
+        else:
+            pixels = self.image_processor(images=images, return_tensors="np")["pixel_values"]
+        return self.vision_session.run(None, {"pixel_values": pixels.astype(np.float32)})[0]
@@ -0,0 +1,331 @@
+"""
+Query Embedding Store.
+Persistent, memory-mapped store of float32 query embeddings that survives restarts.
+
+Each model gets one append-only file: a 16-byte header (magic, version, dimension)
+followed by fixed-size records of a 16-byte key hash and the float32 vector.
+Readers map the file read-only, so several uvicorn workers on one host share its
+pages; appends and compaction are serialized with an exclusive file lock.
+Compaction replaces the file, so a writer re-opens it if it was replaced
+between opening and locking. Compaction runs on a background thread; the
+calls here do blocking file I/O and belong off the event loop.
+"""
+
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+from typing import Dict, List, Optional, Set, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SQES"
+VERSION = 1
+HEADER = struct.Struct("<4sIII")  # magic, version, dim, reserved
+KEY_SIZE = 16
+
+
+def _record_dtype(dim: int) -> np.dtype:
+    return np.dtype([("key", f"V{KEY_SIZE}"), ("vector", "<f4", (dim,))])
+
+
+class _StoreFile:
+    """Read-only mapping of one model's store file, with a key -> row index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.inode: Optional[int] = None
+        self.size = 0
+        self.dim = 0
+        self.count = 0
+        self.records: Optional[np.ndarray] = None
+        self.index: Dict[bytes, int] = {}
+        self._mmap: Optional[mmap.mmap] = None
+
+    def refresh(self):
+        """Pick up rows appended by any process, or reopen if the file was compacted."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.close()
+            return
+
+        if stat.st_ino != self.inode:
+            self.close()
+            self.inode = stat.st_ino
+        elif stat.st_size == self.size:
+            return
+
+        with open(self.path, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            magic, version, dim, _ = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                logger.warning(f"Ignoring query store with unknown format: {self.path}")
+                return
+
+            dtype = _record_dtype(dim)
+            count = (stat.st_size - HEADER.size) // dtype.itemsize
+            self.records = None
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if count else None
+
+        start = self.count if dim == self.dim else 0
+        if start == 0:
+            self.index = {}
+        self.dim = dim
+        self.size = stat.st_size
+        self.count = count
+
+        if self._mmap is not None:
+            self.records = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=HEADER.size)
+            keys = self.records["key"]
+            for row in range(start, count):
+                # Later rows win, so a re-appended key resolves to its newest vector
+                self.index[keys[row].tobytes()] = row
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        row = self.index.get(key)
+        if row is None or self.records is None:
+            return None
+        return self.records["vector"][row]
+
+    def close(self):
+        self.records = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self.index = {}
+        self.inode = None
+        self.size = 0
+        self.dim = 0
+        self.count = 0
+
+
+class QueryEmbeddingStore:
+    """On-disk store of query embeddings keyed by (model, normalized text hash)."""
+
+    def __init__(self, directory: str, max_records: int = 100_000, read_only: bool = False):
+        """
+        Initialize the store.
+
+        Args:
+            directory: Directory holding one store file per model
+            max_records: Size cap per model; exceeding it triggers compaction
+            read_only: Only read existing files (for workers that should never write)
+        """
+        self.directory = directory
+        self.max_records = max(1, max_records)
+        self.read_only = read_only
+        self._files: Dict[str, _StoreFile] = {}
+        self._compacting: Set[str] = set()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.appends = 0
+        self.compactions = 0
+
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        logger.info(f"Query embedding store at {directory} (max_records={self.max_records}, read_only={read_only})")
+
+    def _path(self, model_name: str) -> str:
+        safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", model_name)
+        return os.path.join(self.directory, f"{safe_name}.qes")
+
+    @staticmethod
+    def _key(model_name: str, text: str) -> bytes:
+        return hashlib.blake2b(f"{model_name}\0{text}".encode("utf-8"), digest_size=KEY_SIZE).digest()
+
+    def _file(self, model_name: str) -> _StoreFile:
+        store_file = self._files.get(model_name)
+        if store_file is None:
+            store_file = self._files[model_name] = _StoreFile(self._path(model_name))
+        store_file.refresh()
+        return store_file
+
+    @staticmethod
+    def _open_locked(path: str, create: bool = False, blocking: bool = True) -> Optional[int]:
+        """
+        Open the current file at path and take its exclusive lock.
+
+        Returns:
+            The locked descriptor, or None if the file does not exist or (when not
+            blocking) another writer holds the lock
+        """
+        while True:
+            try:
+                fd = os.open(path, os.O_RDWR | (os.O_CREAT if create else 0), 0o644)
+            except FileNotFoundError:
+                return None
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                os.close(fd)
+                return None
+
+            try:
+                current_inode = os.stat(path).st_ino
+            except FileNotFoundError:
+                current_inode = None
+            if current_inode == os.fstat(fd).st_ino:
+                return fd
+            # Compacted between open and lock: writes to this inode would be lost
+            os.close(fd)
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """
+        Look up a stored embedding.
+
+        Args:
+            model_name: Model that produced the embedding
+            text: Normalized query text
+
+        Returns:
+            float32 embedding, or None if not stored
+        """
+        with self._lock:
+            vector = self._file(model_name).get(self._key(model_name, text))
+            if vector is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Copied out of the mapping, which is replaced when the file is compacted
+            return np.array(vector)
+
+    def put(self, model_name: str, text: str, embedding: Union[List[float], np.ndarray]):
+        """
+        Append an embedding. Skipped if another writer currently holds the write lock.
+
+        Compaction, when the file passes max_records, is started on a background thread.
+
+        Args:
+            model_name: Model that produced the embedding
+            text: Normalized query text
+            embedding: Embedding vector
+        """
+        if self.read_only:
+            return
+
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        dim = vector.shape[0]
+        record_size = KEY_SIZE + dim * 4
+        path = self._path(model_name)
+
+        with self._lock:
+            fd = self._open_locked(path, create=True, blocking=False)
+            if fd is None:
+                return
+            try:
+                size = os.fstat(fd).st_size
+                if size < HEADER.size:
+                    os.ftruncate(fd, 0)
+                    os.pwrite(fd, HEADER.pack(MAGIC, VERSION, dim, 0), 0)
+                    size = HEADER.size
+                else:
+                    magic, version, file_dim, _ = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+                    if magic != MAGIC or version != VERSION or file_dim != dim:
+                        logger.warning(f"Query store {path} does not match dim {dim}; not appending")
+                        return
+
+                # Drop any partial record left by a crashed writer before appending
+                count = (size - HEADER.size) // record_size
+                offset = HEADER.size + count * record_size
+                os.pwrite(fd, self._key(model_name, text) + vector.tobytes(), offset)
+                os.ftruncate(fd, offset + record_size)
+                self.appends += 1
+            finally:
+                os.close(fd)
+
+            if count + 1 > self.max_records and model_name not in self._compacting:
+                self._compacting.add(model_name)
+                threading.Thread(
+                    target=self._compact_in_background, args=(model_name,), name="query-store-compact", daemon=True
+                ).start()
+
+    def _compact_in_background(self, model_name: str):
+        """Compact a model's file on a background thread."""
+        try:
+            self.compact(model_name)
+        except Exception as e:
+            logger.warning(f"Query store compaction failed for {model_name}: {e}")
+        finally:
+            with self._lock:
+                self._compacting.discard(model_name)
+
+    def compact(self, model_name: str):
+        """
+        Deduplicate a model's store file and trim it below the size cap (blocking).
+
+        Only the file lock is held, so lookups continue meanwhile and appends are skipped.
+        """
+        if self.read_only:
+            return
+        path = self._path(model_name)
+        fd = self._open_locked(path)
+        if fd is None:
+            return
+        try:
+            header = os.pread(fd, HEADER.size, 0)
+            if len(header) == HEADER.size:
+                magic, version, dim, _ = HEADER.unpack(header)
+                if magic == MAGIC and version == VERSION:
+                    self._compact_locked(fd, path, dim)
+        finally:
+            os.close(fd)
+
+    def _compact_locked(self, fd: int, path: str, dim: int):
+        """Rewrite the store keeping the newest record per key, trimmed to 3/4 of the cap."""
+        dtype = _record_dtype(dim)
+        size = os.fstat(fd).st_size
+        count = (size - HEADER.size) // dtype.itemsize
+        records = np.frombuffer(os.pread(fd, count * dtype.itemsize, HEADER.size), dtype=dtype, count=count)
+
+        # Walk newest-first so the latest vector per key is kept, then restore append order
+        newest_first = records[::-1]
+        _, first_seen = np.unique(newest_first["key"], return_index=True)
+        keep = np.sort(first_seen)[: (self.max_records * 3) // 4]
+        kept = newest_first[keep][::-1]
+
+        # Readers keep their mapping of the old inode until they notice the replacement
+        tmp_fd, tmp_path = tempfile.mkstemp(prefix=".compact-", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(tmp_fd, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, dim, 0))
+                f.write(kept.tobytes())
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self.compactions += 1
+        logger.info(f"Compacted query store {path}: {count} -> {len(kept)} records")
+
+    def stats(self) -> dict:
+        """Return store counters and per-model record counts."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "read_only": self.read_only,
+                "max_records": self.max_records,
+                "records": {
+                    model_name: len(store_file.index) for model_name, store_file in self._files.items()
+                },
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "appends": self.appends,
+                "compactions": self.compactions,
+            }
@@ -0,0 +1,112 @@
+"""
+Runtime Profile.
+Loads and applies the per-machine thread and batch settings written by `python -m services.autotune`.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+from typing import Optional, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+PROFILE_VERSION = 1
+
+# Thread pools are process-wide, so only the first applied profile takes effect
+_applied_threads: Optional[Tuple[int, int]] = None
+
+
+def profile_path(path: str, model_name: str) -> str:
+    """Resolve a profile file, or a directory holding one profile per model, to the model's profile file."""
+    if os.path.isdir(path) or path.endswith(os.sep):
+        safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", model_name)
+        return os.path.join(path, f"{safe_name}.json")
+    return path
+
+
+def load_runtime_profile(path: Optional[str], model_name: str) -> Optional[dict]:
+    """
+    Load a runtime profile for a model.
+
+    Args:
+        path: Profile file, or directory of per-model profiles (None disables profiles)
+        model_name: Model the profile must have been tuned for
+
+    Returns:
+        The profile dict, or None if there is no usable profile
+    """
+    if not path:
+        return None
+
+    path = profile_path(path, model_name)
+    if not os.path.exists(path):
+        logger.warning(f"No runtime profile for {model_name} at {path}; using library defaults")
+        return None
+
+    try:
+        with open(path) as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable runtime profile {path}: {e}")
+        return None
+
+    if profile.get("version") != PROFILE_VERSION:
+        logger.warning(f"Ignoring runtime profile {path} with version {profile.get('version')}")
+        return None
+    if profile.get("model") != model_name:
+        logger.warning(f"Ignoring runtime profile {path}: tuned for {profile.get('model')}, not {model_name}")
+        return None
+
+    tuned_cpus = profile.get("machine", {}).get("cpu_count")
+    if tuned_cpus and tuned_cpus != os.cpu_count():
+        logger.warning(f"Runtime profile {path} was tuned on {tuned_cpus} CPUs; this machine has {os.cpu_count()}")
+
+    logger.info(
+        f"Runtime profile for {model_name}: {profile.get('torch_threads')} threads, "
+        f"{profile.get('interop_threads')} interop threads, text batch {profile.get('text_batch_size')}, "
+        f"image batch {profile.get('image_batch_size')}"
+    )
+    return profile
+
+
+def apply_thread_settings(profile: dict):
+    """Set torch intra- and inter-op thread counts from a profile (once per process)."""
+    global _applied_threads
+
+    threads = profile.get("torch_threads")
+    interop = profile.get("interop_threads")
+    if _applied_threads is not None:
+        if _applied_threads != (threads, interop):
+            logger.warning(
+                f"Thread settings are process-wide; keeping {_applied_threads[0]} threads / "
+                f"{_applied_threads[1]} interop threads from the first profile"
+            )
+        return
+
+    if threads:
+        torch.set_num_threads(threads)
+    if interop:
+        try:
+            torch.set_num_interop_threads(interop)
+        except RuntimeError as e:
+            # Only possible before any inter-op parallel work has started
+            logger.warning(f"Could not set interop threads to {interop}: {e}")
+    _applied_threads = (threads, interop)
+
+
+def save_runtime_profile(profile: dict, path: str):
+    """Write a profile atomically."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".profile-", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(profile, f, indent=2)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
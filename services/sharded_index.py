@@ -0,0 +1,360 @@
+"""
+Sharded Index.
+Splits a local vector index across worker processes and searches the shards in parallel.
+
+Slot s lives on shard s % shards as that shard's row s // shards, so shards
+stay balanced as slots are handed out. A search sends the query (and each
+shard's slice of the filter mask) to every shard at once, and the per-shard
+top-k lists, each already sorted, are merged with a heap. Every shard is an
+ordinary index from create_index, so shards work with any index kind.
+
+Each shard handles one request at a time: a search waits for an update
+being applied to the same shard.
+
+Shard processes are started from a forkserver rather than forked directly:
+indexes are created from worker threads (asyncio.to_thread), and forking a
+multi-threaded process can leave locks held in the child.
+"""
+
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import pickle
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .vector_index import create_index
+
+logger = logging.getLogger(__name__)
+
+# Per-shard latencies kept for the percentiles in stats()
+LATENCY_WINDOW = 1000
+
+# How often a wait for a shard checks that its process is still alive
+ALIVE_CHECK_SECONDS = 1.0
+
+# Imported once by the forkserver, so each shard process starts without re-importing them
+FORKSERVER_PRELOAD = ["services.sharded_index"]
+
+
+class ShardUnavailable(RuntimeError):
+    """Raised when a shard process has exited; the index has lost that shard's rows."""
+
+
+def _shard_main(shard: int, kind: str, params: dict, requests, responses):
+    """Shard process loop: apply requested index methods and report results and timings."""
+    index = create_index(kind, **params)
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+
+        request_id, method, args = request
+        started = time.perf_counter()
+        try:
+            if method == "measure_recall":
+                measure_recall = getattr(index, "measure_recall", None)
+                result = measure_recall() if measure_recall is not None else None
+            else:
+                result = getattr(index, method)(*args)
+            # Searches are answered as fast as possible; everything else refreshes the cached stats
+            stats = None if method == "search" else index.stats()
+            responses.put((request_id, result, stats, time.perf_counter() - started, None))
+        except Exception as e:
+            logger.error(f"Shard {shard} failed on {method}: {e}")
+            try:
+                # Queue.put pickles in a feeder thread, where a failure would be lost
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError(f"{type(e).__name__}: {e}")
+            responses.put((request_id, None, None, time.perf_counter() - started, e))
+
+
+class ShardedIndex:
+    """Index of one kind split across worker processes, searched by scatter-gather."""
+
+    def __init__(self, kind: str, shards: int = 2, timeout_seconds: float = 10.0, **params):
+        """
+        Initialize the shards and start their processes.
+
+        Args:
+            kind: Index kind of every shard ('exact', 'hnsw' or 'ivfpq')
+            shards: Number of shard processes
+            timeout_seconds: Max time a search waits for the slowest shard
+            **params: Keyword arguments for each shard's index
+        """
+        self.kind = kind
+        self.shards = max(1, shards)
+        self.timeout_seconds = timeout_seconds
+        self.params = params
+
+        self._pending: Dict[int, Tuple[concurrent.futures.Future, int, str, float]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._shard_stats: List[Optional[dict]] = [None] * self.shards
+        self._compute: List[deque] = [deque(maxlen=LATENCY_WINDOW) for _ in range(self.shards)]
+        self._round_trip: List[deque] = [deque(maxlen=LATENCY_WINDOW) for _ in range(self.shards)]
+        self._search_latency: deque = deque(maxlen=LATENCY_WINDOW)
+        self.searches = 0
+        self.recall: Optional[float] = None
+
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload(FORKSERVER_PRELOAD)
+        self._requests = [ctx.Queue() for _ in range(self.shards)]
+        self._responses = ctx.Queue()
+        self._workers = [
+            ctx.Process(
+                target=_shard_main,
+                args=(i, kind, params, self._requests[i], self._responses),
+                name=f"index-shard-{i}",
+                daemon=True
+            )
+            for i in range(self.shards)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        self._reader = threading.Thread(target=self._read_responses, name="index-shard-reader", daemon=True)
+        self._reader.start()
+
+        logger.info(f"Sharded {kind} index started ({self.shards} processes)")
+
+    def _call(self, shard: int, method: str, *args) -> Tuple[int, concurrent.futures.Future]:
+        """Send a method call to one shard; return (shard, future)."""
+        if not self._workers[shard].is_alive():
+            self._abandon(shard)
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self._lock:
+            if self._closed:
+                raise ShardUnavailable("Sharded index is shut down")
+            request_id = self._next_id
+            self._next_id += 1
+            self._pending[request_id] = (future, shard, method, time.perf_counter())
+        self._requests[shard].put((request_id, method, args))
+        return shard, future
+
+    def _abandon(self, shard: int):
+        """
+        Give up on a dead shard: fail its waiting calls and raise ShardUnavailable.
+
+        Requests the shard never read stay in its queue's pipe, so the queue's
+        feeder thread may be blocked writing; interpreter exit must not wait for it.
+        """
+        self._requests[shard].cancel_join_thread()
+        error = ShardUnavailable(f"Index shard {shard} exited (code {self._workers[shard].exitcode})")
+        with self._lock:
+            lost = [request_id for request_id, entry in self._pending.items() if entry[1] == shard]
+            futures = [self._pending.pop(request_id)[0] for request_id in lost]
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+        raise error
+
+    def _wait(self, calls: List[Tuple[int, concurrent.futures.Future]], timeout: Optional[float] = None) -> List[Any]:
+        """
+        Wait for calls made with _call and return their results in order.
+
+        Raises:
+            ShardUnavailable: If a shard process exits while it is waited for
+            TimeoutError: If timeout passes first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results = []
+        for shard, future in calls:
+            while True:
+                wait = ALIVE_CHECK_SECONDS
+                if deadline is not None:
+                    wait = min(wait, max(0.0, deadline - time.monotonic()))
+                try:
+                    results.append(future.result(timeout=wait))
+                    break
+                except concurrent.futures.TimeoutError:
+                    if not self._workers[shard].is_alive():
+                        self._abandon(shard)
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError(f"Index shard {shard} did not answer within {timeout:g}s")
+        return results
+
+    def _read_responses(self):
+        """Resolve waiting futures as shards report finished requests."""
+        while True:
+            message = self._responses.get()
+            if message is None:
+                break
+
+            request_id, result, stats, compute_seconds, error = message
+            with self._lock:
+                entry = self._pending.pop(request_id, None)
+            if entry is None:
+                continue
+            future, shard, method, sent_at = entry
+
+            if stats is not None:
+                self._shard_stats[shard] = stats
+            if method == "search" and error is None:
+                self._compute[shard].append(compute_seconds)
+                self._round_trip[shard].append(time.perf_counter() - sent_at)
+
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _partition(self, rows: np.ndarray) -> List[np.ndarray]:
+        """Return, per shard, the positions in rows that belong to it."""
+        owners = rows % self.shards
+        return [np.flatnonzero(owners == shard) for shard in range(self.shards)]
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        """Insert or replace rows on their shards."""
+        self._wait([
+            self._call(shard, "add", rows[positions] // self.shards, vectors[positions])
+            for shard, positions in enumerate(self._partition(rows)) if len(positions)
+        ])
+
+    def remove(self, rows: np.ndarray):
+        """Remove rows from their shards."""
+        self._wait([
+            self._call(shard, "remove", rows[positions] // self.shards)
+            for shard, positions in enumerate(self._partition(rows)) if len(positions)
+        ])
+
+    def __len__(self) -> int:
+        return sum(stats["rows"] for stats in self._shard_stats if stats is not None)
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search every shard in parallel and merge their top-k lists.
+
+        Args:
+            query: Normalized query vector
+            k: Number of results
+            allowed: Optional boolean mask over slots; False slots are never returned
+
+        Returns:
+            (slots, scores), best first
+
+        Raises:
+            ShardUnavailable: If a shard process has exited
+            TimeoutError: If a shard does not answer within timeout_seconds
+        """
+        started = time.perf_counter()
+        answers = self._wait([
+            self._call(shard, "search", query, k, None if allowed is None else allowed[shard::self.shards])
+            for shard in range(self.shards)
+        ], self.timeout_seconds)
+
+        # Each shard's list is sorted best first, so a heap merge only looks at the heads
+        merged = heapq.merge(
+            *(
+                zip(scores.tolist(), (rows * self.shards + shard).tolist())
+                for shard, (rows, scores) in enumerate(answers)
+            ),
+            key=lambda pair: pair[0],
+            reverse=True
+        )
+        top = list(itertools.islice(merged, k))
+
+        self.searches += 1
+        self._search_latency.append(time.perf_counter() - started)
+        if not top:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores, slots = zip(*top)
+        return np.asarray(slots, dtype=np.int64), np.asarray(scores, dtype=np.float32)
+
+    def measure_recall(self) -> Optional[float]:
+        """Measure recall on every shard that supports it; return their mean, or None."""
+        recalls = [
+            recall for recall in self._wait([self._call(s, "measure_recall") for s in range(self.shards)])
+            if recall is not None
+        ]
+        self.recall = sum(recalls) / len(recalls) if recalls else None
+        return self.recall
+
+    def save(self, directory: str):
+        """Write every shard's index into its own subdirectory, in parallel."""
+        os.makedirs(directory, exist_ok=True)
+        self._wait([
+            self._call(shard, "save", os.path.join(directory, f"shard-{shard}")) for shard in range(self.shards)
+        ])
+
+    def load(self, directory: str):
+        """Read shards written by save() with the same shard count."""
+        self._wait([
+            self._call(shard, "load", os.path.join(directory, f"shard-{shard}")) for shard in range(self.shards)
+        ])
+
+    def stats(self) -> dict:
+        """Return the shard count, merged-search latency and a per-shard latency breakdown."""
+        per_shard = []
+        for shard in range(self.shards):
+            shard_stats = dict(self._shard_stats[shard] or {})
+            shard_stats.pop("kind", None)
+            shard_stats.update({
+                "alive": self._workers[shard].is_alive(),
+                "search_ms_p50": _percentile_ms(self._compute[shard], 50),
+                "search_ms_p95": _percentile_ms(self._compute[shard], 95),
+                "round_trip_ms_p50": _percentile_ms(self._round_trip[shard], 50),
+                "round_trip_ms_p95": _percentile_ms(self._round_trip[shard], 95),
+            })
+            per_shard.append(shard_stats)
+
+        return {
+            "kind": self.kind,
+            "rows": len(self),
+            "shards": self.shards,
+            "searches": self.searches,
+            "search_ms_p50": _percentile_ms(self._search_latency, 50),
+            "search_ms_p95": _percentile_ms(self._search_latency, 95),
+            "recall": round(self.recall, 4) if self.recall is not None else None,
+            "per_shard": per_shard,
+        }
+
+    def shutdown(self):
+        """Stop the shard processes; calls still waiting fail with ShardUnavailable."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future, _, _, _ in pending:
+            future.set_exception(ShardUnavailable("Sharded index is shut down"))
+
+        for shard, requests in enumerate(self._requests):
+            if self._workers[shard].is_alive():
+                requests.put(None)
+        for worker in self._workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join(timeout=5)
+
+        self._responses.put(None)
+        self._reader.join(timeout=5)
+        # Every shard has exited; anything still queued for one is never read
+        for queue in self._requests + [self._responses]:
+            queue.cancel_join_thread()
+            queue.close()
+
+
+def _percentile_ms(samples: deque, percentile: float) -> Optional[float]:
+    """Return a percentile of latencies in seconds as milliseconds, or None without samples."""
+    if not samples:
+        return None
+    return round(float(np.percentile(np.fromiter(samples, dtype=np.float64), percentile)) * 1000, 2)
@@ -0,0 +1,67 @@
+"""
+Single Flight.
+Collapses concurrent identical requests into one shared computation.
+
+Only calls that overlap in time are merged: the key is forgotten as soon as
+the computation finishes, so this is not a cache.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        """Initialize with no computations in flight."""
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+        self.leaders = 0
+        self.shared = 0
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        """
+        Return the result of compute(), sharing it with concurrent callers using the same key.
+
+        The computation runs as its own task, so a caller that disconnects does
+        not cancel it for the others. Exceptions are raised to every caller.
+
+        Args:
+            key: Hashable identity of the request
+            compute: Coroutine factory producing the result
+
+        Returns:
+            The (possibly shared) result
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.leaders += 1
+        else:
+            self.shared += 1
+
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        """Forget a finished computation and mark its exception as retrieved."""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Every caller may have gone away; don't log "exception was never retrieved"
+            task.exception()
+
+    def stats(self) -> dict:
+        """Return in-flight count and leader/shared counters."""
+        return {
+            "in_flight": len(self._in_flight),
+            "leaders": self.leaders,
+            "shared": self.shared,
+        }
@@ -6,8 +6,9 @@ Handles searching media items by embedding similarity.
 import os
 import logging
 import re
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple, Union
 
+import numpy as np
 from supabase import create_client, Client
 
 logger = logging.getLogger(__name__)
@@ -40,33 +41,181 @@ class SupabaseSearchService:
             logger.warning(f"Failed to get public URL for {storage_path}: {e}")
             return None
 
+    def format_result(self, item: dict, similarity_score: float) -> dict:
+        """
+        Build an API search result from a media_items row.
+
+        Args:
+            item: media_items row (or RPC result row)
+            similarity_score: Score to report for the item
+
+        Returns:
+            Result dict with public storage and thumbnail URLs
+        """
+        result = {
+            "id": str(item.get("id", "")),
+            "filename": item.get("filename", ""),
+            "original_filename": item.get("original_filename"),
+            "file_type": item.get("file_type", ""),
+            "mime_type": item.get("mime_type"),
+            "file_size": item.get("file_size"),
+            "storage_path": item.get("storage_path", ""),
+            "thumbnail_path": item.get("thumbnail_path"),
+            "description": item.get("description"),
+            "tags": item.get("tags"),
+            "decade": item.get("decade"),
+            "duration_seconds": item.get("duration_seconds"),
+            "metadata": item.get("metadata"),
+            "similarity_score": similarity_score,
+            "created_at": item.get("created_at"),
+            "updated_at": item.get("updated_at"),
+        }
+
+        # Add public URLs
+        result["storage_url"] = self._get_public_url(result["storage_path"])
+        result["thumbnail_url"] = self._get_public_url(result["thumbnail_path"])
+        return result
+
+    def fetch_media_items(
+        self,
+        columns: List[str],
+        page_size: int = 1000,
+        without_updated_at: bool = False
+    ) -> Iterator[List[dict]]:
+        """
+        Read media_items in pages ordered by id.
+
+        Args:
+            columns: Columns to select
+            page_size: Rows per request
+            without_updated_at: Only read rows whose updated_at is null
+
+        Yields:
+            Lists of rows, until the table is exhausted
+        """
+        start = 0
+        while True:
+            query = self.client.table("media_items").select(",".join(columns))
+            if without_updated_at:
+                query = query.is_("updated_at", "null")
+            response = query.order("id").range(start, start + page_size - 1).execute()
+            rows = response.data or []
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            start += page_size
+
+    @staticmethod
+    def _after_watermark(query, after: Optional[Tuple[str, str]]):
+        """
+        Restrict a media_items query to rows ordered after an (updated_at, id) watermark.
+
+        A watermark with a None id selects every row updated at or after its timestamp.
+        """
+        if after is None:
+            return query.not_.is_("updated_at", "null")
+        updated_at, item_id = after
+        if item_id is None:
+            return query.gte("updated_at", updated_at)
+        # Quoted: timestamps contain PostgREST's reserved '.' and ':'
+        return query.or_(
+            f'updated_at.gt."{updated_at}",and(updated_at.eq."{updated_at}",id.gt."{item_id}")'
+        )
+
+    def fetch_media_changes(
+        self,
+        columns: List[str],
+        after: Optional[Tuple[str, str]] = None,
+        page_size: int = 1000
+    ) -> Iterator[List[dict]]:
+        """
+        Read media_items changed after a watermark, oldest change first.
+
+        Pages by (updated_at, id) keyset rather than offset, so rows updated while
+        paging move to the end and are read again instead of shifting pages.
+
+        Args:
+            columns: Columns to select (updated_at and id are always included)
+            after: (updated_at, id) of the last row already seen, (updated_at, None) for rows
+                updated since a time, or None for all rows
+            page_size: Rows per request
+
+        Yields:
+            Lists of rows, until no newer rows remain
+        """
+        columns = list(dict.fromkeys(list(columns) + ["id", "updated_at"]))
+        while True:
+            query = self._after_watermark(
+                self.client.table("media_items").select(",".join(columns)), after
+            )
+            response = query.order("updated_at").order("id").limit(page_size).execute()
+            rows = response.data or []
+            if rows:
+                yield rows
+                after = (rows[-1]["updated_at"], str(rows[-1]["id"]))
+            if len(rows) < page_size:
+                return
+
+    def count_media_changes(self, after: Optional[Tuple[str, str]] = None) -> int:
+        """Return how many media_items rows changed after a watermark."""
+        query = self._after_watermark(
+            self.client.table("media_items").select("id", count="exact"), after
+        )
+        return query.limit(1).execute().count or 0
+
+    def fetch_media_ids(self, page_size: int = 10000) -> Iterator[List[str]]:
+        """
+        Read every media_items id, in pages.
+
+        Yields:
+            Lists of ids (as strings)
+        """
+        last_id = None
+        while True:
+            query = self.client.table("media_items").select("id")
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            rows = query.order("id").limit(page_size).execute().data or []
+            if rows:
+                yield [str(row["id"]) for row in rows]
+                last_id = str(rows[-1]["id"])
+            if len(rows) < page_size:
+                return
+
     async def search_by_embedding(
         self,
-        embedding: List[float],
+        embedding: Union[List[float], np.ndarray],
         search_type: str = "combined",
         limit: int = 20,
         threshold: float = 0.0,
         file_type: Optional[str] = None,
-        decade: Optional[str] = None
+        decade: Optional[str] = None,
+        rpc_name: str = "search_media_by_embedding"
     ) -> List[dict]:
         """
         Search media items by embedding similarity.
 
         Args:
-            embedding: Query embedding vector
+            embedding: Query embedding vector (list or float32 array)
             search_type: Which embedding to search against ('visual', 'text', 'combined')
             limit: Maximum number of results
             threshold: Minimum similarity score (0-1)
             file_type: Filter by 'image' or 'video'
             decade: Filter by decade (e.g., '1950s')
+            rpc_name: RPC searching the embedding columns of the query's model
 
         Returns:
             List of search results with similarity scores
         """
         try:
+            # The RPC payload is JSON, so this is the one place vectors become Python lists
+            if isinstance(embedding, np.ndarray):
+                embedding = embedding.tolist()
+
             # Call the Supabase RPC function
             response = self.client.rpc(
-                "search_media_by_embedding",
+                rpc_name,
                 {
                     "query_embedding": embedding,
                     "search_type": search_type,
@@ -81,32 +230,7 @@ class SupabaseSearchService:
                 return []
 
             # Process results
-            results = []
-            for item in response.data:
-                result = {
-                    "id": str(item.get("id", "")),
-                    "filename": item.get("filename", ""),
-                    "original_filename": item.get("original_filename"),
-                    "file_type": item.get("file_type", ""),
-                    "mime_type": item.get("mime_type"),
-                    "file_size": item.get("file_size"),
-                    "storage_path": item.get("storage_path", ""),
-                    "thumbnail_path": item.get("thumbnail_path"),
-                    "description": item.get("description"),
-                    "tags": item.get("tags"),
-                    "decade": item.get("decade"),
-                    "duration_seconds": item.get("duration_seconds"),
-                    "metadata": item.get("metadata"),
-                    "similarity_score": float(item.get("similarity", 0)),
-                    "created_at": item.get("created_at"),
-                    "updated_at": item.get("updated_at"),
-                }
-
-                # Add public URLs
-                result["storage_url"] = self._get_public_url(result["storage_path"])
-                result["thumbnail_url"] = self._get_public_url(result["thumbnail_path"])
-
-                results.append(result)
+            results = [self.format_result(item, float(item.get("similarity", 0))) for item in response.data]
 
             logger.info(f"Search returned {len(results)} results")
             return results
@@ -171,30 +295,7 @@ class SupabaseSearchService:
             for item in response.data:
                 # Calculate a simple text relevance score based on match quality
                 text_score = self._calculate_text_relevance(item, text_query, keywords)
-
-                result = {
-                    "id": str(item.get("id", "")),
-                    "filename": item.get("filename", ""),
-                    "original_filename": item.get("original_filename"),
-                    "file_type": item.get("file_type", ""),
-                    "mime_type": item.get("mime_type"),
-                    "file_size": item.get("file_size"),
-                    "storage_path": item.get("storage_path", ""),
-                    "thumbnail_path": item.get("thumbnail_path"),
-                    "description": item.get("description"),
-                    "tags": item.get("tags"),
-                    "decade": item.get("decade"),
-                    "duration_seconds": item.get("duration_seconds"),
-                    "metadata": item.get("metadata"),
-                    "similarity_score": text_score,
-                    "created_at": item.get("created_at"),
-                    "updated_at": item.get("updated_at"),
-                }
-
-                result["storage_url"] = self._get_public_url(result["storage_path"])
-                result["thumbnail_url"] = self._get_public_url(result["thumbnail_path"])
-
-                results.append(result)
+                results.append(self.format_result(item, text_score))
 
             # Sort by text relevance score
             results.sort(key=lambda x: x["similarity_score"], reverse=True)
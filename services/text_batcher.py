@@ -0,0 +1,114 @@
+"""
+Text Batcher.
+Collects concurrent query texts for a few milliseconds and encodes them in one model call.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class TextBatcher:
+    """Micro-batching scheduler in front of EmbeddingService.encode_text."""
+
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], Awaitable[np.ndarray]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        Initialize the batcher.
+
+        Args:
+            encode_batch: Async callable that encodes a list of texts to an (N x D) float32 array
+            max_batch_size: Maximum number of texts sent to the model in one call
+            max_wait_ms: Maximum time a query waits for others to join its batch
+        """
+        self.encode_batch = encode_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight = 0
+        # The event loop only keeps weak references to tasks; hold running batches here
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.items = 0
+
+    async def encode(self, text: str) -> np.ndarray:
+        """
+        Encode a single text, sharing a model call with concurrent callers.
+
+        Args:
+            text: Query text
+
+        Returns:
+            float32 embedding (a row of the batch result)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            # When the model is idle, dispatch on the next loop tick so a lone
+            # query does not pay the batching window; under load, wait for more.
+            delay = self.max_wait if self._inflight else 0.0
+            self._timer = loop.call_later(delay, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Dispatch pending texts as one or more batches."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            self._inflight += 1
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Encode one batch and fan the vectors back out to the waiting requests."""
+        # Identical queries in the same window only need one forward pass
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+
+        try:
+            embeddings = await self.encode_batch(unique_texts)
+        except Exception as e:
+            logger.error(f"Batched text encode failed ({len(unique_texts)} texts): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            by_text = dict(zip(unique_texts, embeddings))
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(by_text[text])
+            self.batches += 1
+            self.items += len(batch)
+        finally:
+            self._inflight -= 1
+
+    def stats(self) -> dict:
+        """Return batching counters."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": (self.items / self.batches) if self.batches else 0.0,
+            "pending": len(self._pending),
+        }
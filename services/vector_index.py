@@ -0,0 +1,741 @@
+"""
+Vector Index.
+In-process nearest-neighbour indexes over L2-normalized embeddings, scored by cosine similarity.
+
+Rows are identified by integer slots chosen by the caller, which maps slots
+back to items. Rows can be added, replaced and removed while the index is
+being searched. Every index takes an optional boolean slot mask so metadata
+filters are applied during the search instead of after it.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Filters that keep fewer rows than this are scored exactly; a graph walk
+# would mostly visit rows it then has to throw away
+EXACT_FILTER_MAX_ROWS = 2048
+
+# A filter keeping less than this share of the rows is scored by gathering
+# just those rows rather than masking every block
+EXACT_GATHER_MAX_FRACTION = 0.1
+
+# Capacity grows by this factor (at least MIN_CAPACITY rows) when a slot past the end is added
+GROWTH_FACTOR = 1.5
+MIN_CAPACITY = 1024
+
+# Rows encoded per step when compressing vectors; bounds the temporary residual arrays
+ENCODE_BLOCK_ROWS = 8192
+
+# Codes per product-quantizer subspace (one byte each)
+PQ_CENTROIDS = 256
+
+
+def exact_search(
+    vectors: np.ndarray,
+    query: np.ndarray,
+    k: int,
+    rows: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score a query against every (or every selected) row.
+
+    Args:
+        vectors: (n, dim) float32 normalized vectors
+        query: (dim,) float32 normalized query
+        k: Number of results
+        rows: Optional row numbers to restrict the search to
+
+    Returns:
+        (rows, scores), best first
+    """
+    candidates = vectors if rows is None else vectors[rows]
+    scores = candidates @ query
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    top = top[np.argsort(-scores[top], kind="stable")]
+    found = top if rows is None else rows[top]
+    return found.astype(np.int64), scores[top].astype(np.float32)
+
+
+def _fit_mask(mask: np.ndarray, size: int) -> np.ndarray:
+    """Truncate a boolean mask to size, or pad it with False."""
+    if len(mask) >= size:
+        return mask[:size]
+    return np.concatenate([mask, np.zeros(size - len(mask), dtype=bool)])
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    """Return a copy of a 1-d array enlarged to size, padded with zeros."""
+    grown = np.zeros(size, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class HnswIndex:
+    """HNSW graph (hnswlib) over inner product, which is cosine similarity for normalized vectors."""
+
+    kind = "hnsw"
+
+    def __init__(self, m: int = 16, ef_construction: int = 200, ef_search: int = 64, build_threads: int = -1):
+        """
+        Initialize an empty index.
+
+        Args:
+            m: Graph links per node; higher raises recall and memory
+            ef_construction: Candidate list size while building; higher raises recall and build time
+            ef_search: Candidate list size while searching (at least k); higher raises recall and latency
+            build_threads: Threads used to insert vectors (-1 for all cores)
+        """
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.build_threads = build_threads
+        self._index = None
+        self._present = np.zeros(0, dtype=bool)
+        self._live = 0
+        # hnswlib cannot resize while searching, so searches and updates take turns
+        self._lock = threading.Lock()
+
+    def _create(self, dim: int, capacity: int):
+        """Create the hnswlib index."""
+        try:
+            import hnswlib
+        except ImportError:
+            raise RuntimeError("LOCAL_INDEX=hnsw requires hnswlib (pip install hnswlib)")
+
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.init_index(max_elements=capacity, M=self.m, ef_construction=self.ef_construction)
+        index.set_ef(self.ef_search)
+        return index
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        """
+        Insert or replace rows.
+
+        Raises:
+            RuntimeError: If hnswlib is not installed
+        """
+        if len(rows) == 0:
+            return
+        needed = int(rows.max()) + 1
+        with self._lock:
+            if self._index is None:
+                self._index = self._create(vectors.shape[1], max(needed, MIN_CAPACITY))
+            capacity = self._index.get_max_elements()
+            if needed > capacity:
+                capacity = max(needed, int(capacity * GROWTH_FACTOR))
+                self._index.resize_index(capacity)
+            if len(self._present) < capacity:
+                self._present = _grow(self._present, capacity)
+
+            # Re-adding a removed label restores it with the new vector
+            self._index.add_items(vectors, rows, num_threads=self.build_threads)
+            self._live += int((~self._present[rows]).sum())
+            self._present[rows] = True
+
+    def remove(self, rows: np.ndarray):
+        """Remove rows; rows that are not in the index are ignored."""
+        with self._lock:
+            for row in rows:
+                if row < len(self._present) and self._present[row]:
+                    self._index.mark_deleted(int(row))
+                    self._present[row] = False
+                    self._live -= 1
+
+    def __len__(self) -> int:
+        return self._live
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the approximate k most similar rows.
+
+        Args:
+            query: (dim,) float32 normalized query
+            k: Number of results
+            allowed: Optional boolean mask of slots that may be returned
+
+        Returns:
+            (rows, scores), best first
+        """
+        with self._lock:
+            if self._live == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+            if allowed is not None:
+                allowed = _fit_mask(allowed, len(self._present)) & self._present
+                rows = np.flatnonzero(allowed)
+                if len(rows) <= max(EXACT_FILTER_MAX_ROWS, k):
+                    return self._score_rows(query, k, rows)
+
+            k = min(k, self._live)
+            ef = max(self.ef_search, k)
+            if self._index.ef != ef:
+                self._index.set_ef(ef)
+
+            filter_fn = None if allowed is None else (lambda row: bool(allowed[row]))
+            try:
+                labels, distances = self._index.knn_query(query, k=k, num_threads=1, filter=filter_fn)
+            except RuntimeError:
+                # The walk reached fewer than k rows (a heavily filtered or pruned graph)
+                return self._score_rows(query, k, np.flatnonzero(self._present if allowed is None else allowed))
+
+        # hnswlib's "ip" distance is 1 - inner product
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+    def _score_rows(self, query: np.ndarray, k: int, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Score the given rows exactly, reading their vectors back from the graph."""
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        vectors = np.asarray(self._index.get_items(rows), dtype=np.float32)
+        found, scores = exact_search(vectors, query, k)
+        return rows[found], scores
+
+    def save(self, directory: str):
+        """Write the graph and its slot map into a directory."""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._index.save_index(os.path.join(directory, "hnsw.bin"))
+            np.save(os.path.join(directory, "present.npy"), self._present)
+            with open(os.path.join(directory, "index.json"), "w") as f:
+                json.dump({"dim": self._index.dim, "capacity": self._index.get_max_elements()}, f)
+
+    def load(self, directory: str):
+        """Read a graph written by save()."""
+        with open(os.path.join(directory, "index.json")) as f:
+            meta = json.load(f)
+        try:
+            import hnswlib
+        except ImportError:
+            raise RuntimeError("LOCAL_INDEX=hnsw requires hnswlib (pip install hnswlib)")
+
+        index = hnswlib.Index(space="ip", dim=meta["dim"])
+        index.load_index(os.path.join(directory, "hnsw.bin"), max_elements=meta["capacity"])
+        index.set_ef(self.ef_search)
+        present = np.load(os.path.join(directory, "present.npy"))
+        with self._lock:
+            self._index = index
+            self._present = present
+            self._live = int(present.sum())
+
+    def stats(self) -> dict:
+        """Return index parameters and size."""
+        return {
+            "kind": self.kind,
+            "rows": len(self),
+            "capacity": len(self._present),
+            "m": self.m,
+            "ef_construction": self.ef_construction,
+            "ef_search": self.ef_search,
+        }
+
+
+class ExactIndex:
+    """Brute-force cosine search over a memory-mapped float32 matrix; perfect recall."""
+
+    kind = "exact"
+
+    def __init__(self, block_rows: int = 65536, storage_dir: Optional[str] = None):
+        """
+        Initialize an empty index.
+
+        Args:
+            block_rows: Rows scored per matrix-vector product; bounds the temporary score arrays
+            storage_dir: Directory for the backing file (default: the system temp directory)
+        """
+        self.block_rows = block_rows
+        self.storage_dir = storage_dir
+        self._matrix: Optional[np.ndarray] = None
+        self._present = np.zeros(0, dtype=bool)
+        self._end = 0
+        self._live = 0
+        # Serializes updates; searches read the current arrays without locking
+        self._lock = threading.Lock()
+
+    def _allocate(self, capacity: int, dim: int) -> np.ndarray:
+        """
+        Map a new zero-filled matrix backed by an unlinked file.
+
+        The mapped pages live in the page cache rather than the process heap, so
+        the kernel can write them back and drop them under memory pressure.
+        """
+        if self.storage_dir:
+            os.makedirs(self.storage_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(prefix="exact-index-", suffix=".f32", dir=self.storage_dir) as f:
+            f.truncate(capacity * dim * 4)
+            # The mapping keeps the data alive after the file is removed on close
+            return np.memmap(f.name, dtype=np.float32, mode="r+", shape=(capacity, dim))
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        """Insert or replace rows."""
+        if len(rows) == 0:
+            return
+        needed = int(rows.max()) + 1
+        with self._lock:
+            if self._matrix is None or needed > len(self._matrix):
+                capacity = max(needed, MIN_CAPACITY, int(len(self._present) * GROWTH_FACTOR))
+                matrix = self._allocate(capacity, vectors.shape[1])
+                if self._matrix is not None:
+                    matrix[:len(self._matrix)] = self._matrix
+                # Searches already running keep the old arrays
+                self._matrix = matrix
+                self._present = _grow(self._present, capacity)
+
+            # A search running meanwhile may score a replaced row with a partly written vector
+            self._matrix[rows] = vectors
+            self._live += int((~self._present[rows]).sum())
+            self._present[rows] = True
+            self._end = max(self._end, needed)
+
+    def remove(self, rows: np.ndarray):
+        """Remove rows; rows that are not in the index are ignored."""
+        with self._lock:
+            rows = rows[rows < len(self._present)]
+            self._live -= int(self._present[rows].sum())
+            self._present[rows] = False
+
+    def __len__(self) -> int:
+        return self._live
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the exact k most similar rows, block by block.
+
+        Args:
+            query: (dim,) float32 normalized query
+            k: Number of results
+            allowed: Optional boolean mask of slots that may be returned
+
+        Returns:
+            (rows, scores), best first
+        """
+        matrix, present, end, live = self._matrix, self._present, self._end, self._live
+        if matrix is None or live == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        end = min(end, len(matrix), len(present))
+
+        # Removed slots are masked like filtered-out ones; a full table needs no mask
+        mask = None if live == end else present[:end]
+        if allowed is not None:
+            mask = _fit_mask(allowed, end) & present[:end]
+            rows = np.flatnonzero(mask)
+            if len(rows) <= max(EXACT_FILTER_MAX_ROWS, k, EXACT_GATHER_MAX_FRACTION * end):
+                return exact_search(matrix, query, k, rows)
+
+        # Keep each block's top k, then pick the overall top k from those
+        candidate_rows = []
+        candidate_scores = []
+        for start in range(0, end, self.block_rows):
+            stop = min(start + self.block_rows, end)
+            scores = matrix[start:stop] @ query
+            if mask is not None:
+                scores[~mask[start:stop]] = -np.inf
+            block_k = min(k, len(scores))
+            top = np.argpartition(-scores, block_k - 1)[:block_k] if block_k < len(scores) else np.arange(len(scores))
+            candidate_rows.append(top + start)
+            candidate_scores.append(scores[top])
+
+        rows = np.concatenate(candidate_rows)
+        scores = np.concatenate(candidate_scores)
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        rows, scores = rows[order], scores[order]
+
+        keep = np.isfinite(scores)
+        return rows[keep].astype(np.int64), scores[keep].astype(np.float32)
+
+    def save(self, directory: str):
+        """Write the matrix and its slot map into a directory."""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            np.save(os.path.join(directory, "vectors.npy"), self._matrix[:self._end])
+            np.save(os.path.join(directory, "present.npy"), self._present[:self._end])
+
+    def load(self, directory: str):
+        """Read a matrix written by save()."""
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        present = np.load(os.path.join(directory, "present.npy"))
+        capacity = max(len(present), MIN_CAPACITY)
+        matrix = self._allocate(capacity, vectors.shape[1])
+        for start in range(0, len(vectors), self.block_rows):
+            block = vectors[start:start + self.block_rows]
+            matrix[start:start + len(block)] = block
+        with self._lock:
+            self._matrix = matrix
+            self._present = _grow(present, capacity)
+            self._end = len(present)
+            self._live = int(present.sum())
+
+    def stats(self) -> dict:
+        """Return index size and block size."""
+        return {
+            "kind": self.kind,
+            "rows": len(self),
+            "capacity": len(self._present),
+            "block_rows": self.block_rows,
+        }
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Return the index of the nearest centroid (L2) for every row."""
+    distances = (centroids ** 2).sum(axis=1) - 2.0 * (data @ centroids.T)
+    return np.argmin(distances, axis=1)
+
+
+def _kmeans(data: np.ndarray, clusters: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd's k-means; empty clusters are reseeded with random rows."""
+    centroids = data[rng.choice(len(data), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(data, centroids)
+        counts = np.bincount(assign, minlength=clusters)
+        # Sum the members of every cluster with one matrix product
+        one_hot = np.zeros((clusters, len(data)), dtype=np.float32)
+        one_hot[assign, np.arange(len(data))] = 1.0
+        sums = one_hot @ data
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+    return centroids
+
+
+class IvfPqIndex:
+    """
+    Compressed index: an inverted file of coarse clusters with product-quantized residuals.
+
+    Each vector is stored as its coarse cluster and one byte per subspace, and
+    queries are scored with asymmetric distance computation (the uncompressed
+    query against the codes, through per-query lookup tables). The top
+    candidates can be rescored exactly from the full vectors, which are kept in
+    a disk-backed matrix (an ExactIndex) and only read for those rows. Until
+    train_size vectors have arrived the index searches that matrix exactly.
+    """
+
+    kind = "ivfpq"
+
+    def __init__(
+        self,
+        nlist: int = 256,
+        nprobe: int = 16,
+        m: int = 0,
+        rerank: int = 100,
+        train_size: int = 20000,
+        train_iterations: int = 20,
+        recall_queries: int = 50,
+        storage_dir: Optional[str] = None
+    ):
+        """
+        Initialize an empty index.
+
+        Args:
+            nlist: Coarse clusters
+            nprobe: Clusters searched per query; higher raises recall and latency
+            m: Subspaces (code bytes per vector); 0 for one per 8 dimensions
+            rerank: Candidates rescored exactly from the full vectors; 0 returns approximate scores
+            train_size: Vectors collected before the quantizers are trained
+            train_iterations: k-means iterations when training
+            recall_queries: Stored vectors used as queries when measuring recall
+            storage_dir: Directory for the full-vector matrix (default: the system temp directory)
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.m = m
+        self.rerank = rerank
+        self.train_size = train_size
+        self.train_iterations = train_iterations
+        self.recall_queries = recall_queries
+        self.storage_dir = storage_dir
+
+        self._raw = ExactIndex(storage_dir=storage_dir)
+        self._coarse: Optional[np.ndarray] = None
+        self._coarse_norms: Optional[np.ndarray] = None
+        self._pq: Optional[np.ndarray] = None
+        self._codes = np.zeros((0, 0), dtype=np.uint8)
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lock = threading.Lock()
+        self.recall: Optional[float] = None
+        self.recall_k: Optional[int] = None
+
+    @property
+    def trained(self) -> bool:
+        """Whether the quantizers have been trained (before that, searches are exact)."""
+        return self._pq is not None
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        """Insert or replace rows; trains the quantizers once train_size vectors are stored."""
+        if len(rows) == 0:
+            return
+        with self._lock:
+            if self.trained:
+                self._encode_into(rows, vectors)
+            self._raw.add(rows, vectors)
+            if not self.trained and len(self._raw) >= self.train_size:
+                self._train()
+
+    def remove(self, rows: np.ndarray):
+        """Remove rows; rows that are not in the index are ignored."""
+        with self._lock:
+            self._raw.remove(rows)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def _train(self):
+        """Train the coarse and product quantizers on a sample and encode every stored vector."""
+        started = time.perf_counter()
+        rng = np.random.default_rng(0)
+        end = self._raw._end
+        present = np.flatnonzero(self._raw._present[:end])
+        sample = np.sort(rng.choice(present, min(len(present), self.train_size), replace=False))
+        data = np.asarray(self._raw._matrix[sample], dtype=np.float32)
+        dim = data.shape[1]
+
+        m = self.m or max(1, dim // 8)
+        if dim % m:
+            raise ValueError(f"IVF-PQ subspaces ({m}) must divide the embedding dimension ({dim})")
+        # k-means wants a few dozen points per cluster
+        nlist = max(1, min(self.nlist, len(data) // 39))
+
+        coarse = _kmeans(data, nlist, self.train_iterations, rng)
+        residuals = data - coarse[_nearest(data, coarse)]
+        dsub = dim // m
+        pq = np.stack([
+            _kmeans(residuals[:, j * dsub:(j + 1) * dsub], PQ_CENTROIDS, self.train_iterations, rng)
+            for j in range(m)
+        ])
+
+        self._coarse, self.m, self.nlist = coarse, m, nlist
+        self._coarse_norms = (coarse ** 2).sum(axis=1)
+        self._codes = np.zeros((len(self._raw._present), m), dtype=np.uint8)
+        self._assign = np.full(len(self._raw._present), -1, dtype=np.int32)
+        for start in range(0, end, ENCODE_BLOCK_ROWS):
+            block = np.arange(start, min(start + ENCODE_BLOCK_ROWS, end))
+            block = block[self._raw._present[block]]
+            if len(block):
+                self._encode_into(block, np.asarray(self._raw._matrix[block]), pq)
+        # Searches switch to the codes only once every stored vector has one
+        self._pq = pq
+        logger.info(
+            f"IVF-PQ trained on {len(data)} vectors ({nlist} lists, {m} subspaces) "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        self.measure_recall()
+
+    def _encode_into(self, rows: np.ndarray, vectors: np.ndarray, pq: Optional[np.ndarray] = None):
+        """Compute coarse clusters and PQ codes for rows and store them, growing the arrays if needed."""
+        pq = self._pq if pq is None else pq
+        needed = int(rows.max()) + 1
+        if needed > len(self._assign):
+            capacity = max(needed, MIN_CAPACITY, int(len(self._assign) * GROWTH_FACTOR))
+            codes = np.zeros((capacity, self.m), dtype=np.uint8)
+            codes[:len(self._codes)] = self._codes
+            assign = np.full(capacity, -1, dtype=np.int32)
+            assign[:len(self._assign)] = self._assign
+            self._codes, self._assign = codes, assign
+
+        dsub = vectors.shape[1] // self.m
+        for start in range(0, len(rows), ENCODE_BLOCK_ROWS):
+            block_rows = rows[start:start + ENCODE_BLOCK_ROWS]
+            block = np.asarray(vectors[start:start + ENCODE_BLOCK_ROWS], dtype=np.float32)
+            clusters = _nearest(block, self._coarse)
+            residuals = block - self._coarse[clusters]
+            codes = np.empty((len(block), self.m), dtype=np.uint8)
+            for j in range(self.m):
+                codes[:, j] = _nearest(residuals[:, j * dsub:(j + 1) * dsub], pq[j])
+            self._codes[block_rows] = codes
+            self._assign[block_rows] = clusters
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the approximate k most similar rows.
+
+        Args:
+            query: (dim,) float32 normalized query
+            k: Number of results
+            allowed: Optional boolean mask of slots that may be returned
+
+        Returns:
+            (rows, scores), best first; exact scores for reranked rows
+        """
+        pq = self._pq
+        if pq is None:
+            return self._raw.search(query, k, allowed)
+        return self._search_codes(query, k, allowed, pq, self.nprobe, self.rerank)
+
+    def _search_codes(
+        self,
+        query: np.ndarray,
+        k: int,
+        allowed: Optional[np.ndarray],
+        pq: np.ndarray,
+        nprobe: int,
+        rerank: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Score the rows of the nprobe nearest clusters from their codes, then optionally rescore exactly."""
+        raw_matrix, present, end = self._raw._matrix, self._raw._present, self._raw._end
+        codes, assign, coarse = self._codes, self._assign, self._coarse
+        end = min(end, len(present), len(assign))
+        if end == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        mask = present[:end]
+        if allowed is not None:
+            mask = _fit_mask(allowed, end) & mask
+            rows = np.flatnonzero(mask)
+            if len(rows) <= max(EXACT_FILTER_MAX_ROWS, k):
+                return exact_search(raw_matrix, query, k, rows)
+
+        # q . x ~= q . centroid + sum over subspaces of q_j . codeword_j
+        centroid_scores = coarse @ query
+        # Rows were assigned to their nearest centroid by L2, so probe by L2 too
+        probe = np.argpartition(self._coarse_norms - 2.0 * centroid_scores, min(nprobe, len(coarse)) - 1)[:nprobe]
+        # One extra False slot so unencoded rows (cluster -1) never match
+        probed = np.zeros(len(coarse) + 1, dtype=bool)
+        probed[probe] = True
+        candidates = np.flatnonzero(mask & probed[assign[:end]])
+        if len(candidates) < k:
+            # Too few rows in the probed clusters (e.g. a strict filter): score every cluster
+            candidates = np.flatnonzero(mask & (assign[:end] >= 0))
+        if len(candidates) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        dsub = query.shape[0] // pq.shape[0]
+        tables = np.einsum("jcd,jd->jc", pq, query.reshape(pq.shape[0], dsub))
+        scores = centroid_scores[assign[candidates]] + tables[np.arange(pq.shape[0]), codes[candidates]].sum(axis=1)
+
+        keep = min(max(k, rerank), len(scores))
+        top = np.argpartition(-scores, keep - 1)[:keep] if keep < len(scores) else np.arange(len(scores))
+        rows, scores = candidates[top], scores[top]
+        if rerank:
+            scores = raw_matrix[np.sort(rows)] @ query
+            rows = np.sort(rows)
+
+        order = np.argsort(-scores, kind="stable")[:k]
+        return rows[order].astype(np.int64), scores[order].astype(np.float32)
+
+    def measure_recall(self, k: int = 10) -> Optional[float]:
+        """
+        Measure recall@k against exact search.
+
+        Queries are normalized midpoints of two random stored vectors: like real
+        (often cross-modal) queries they lie between items, where a stored
+        vector used as its own query would overstate recall.
+
+        Returns:
+            The recall (also kept for stats), or None before training
+        """
+        pq = self._pq
+        if pq is None or len(self) <= k:
+            return None
+
+        rng = np.random.default_rng()
+        end = self._raw._end
+        present = np.flatnonzero(self._raw._present[:end])
+        pairs = rng.choice(present, (self.recall_queries, 2))
+        queries = self._raw._matrix[pairs[:, 0]] + self._raw._matrix[pairs[:, 1]]
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        hits = 0
+        for query in queries:
+            truth, _ = self._raw.search(query, k)
+            found, _ = self._search_codes(query, k, None, pq, self.nprobe, self.rerank)
+            hits += len(set(truth.tolist()) & set(found.tolist()))
+        self.recall = hits / (k * len(queries))
+        self.recall_k = k
+        logger.info(f"IVF-PQ recall@{k}: {self.recall:.3f} over {len(queries)} queries")
+        return self.recall
+
+    def save(self, directory: str):
+        """Write the quantizers, codes and full vectors into a directory."""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._raw.save(os.path.join(directory, "raw"))
+            if self.trained:
+                end = self._raw._end
+                np.save(os.path.join(directory, "coarse.npy"), self._coarse)
+                np.save(os.path.join(directory, "pq.npy"), self._pq)
+                np.save(os.path.join(directory, "codes.npy"), self._codes[:end])
+                np.save(os.path.join(directory, "assign.npy"), self._assign[:end])
+            with open(os.path.join(directory, "index.json"), "w") as f:
+                json.dump({"trained": self.trained, "recall": self.recall, "recall_k": self.recall_k}, f)
+
+    def load(self, directory: str):
+        """Read an index written by save()."""
+        with open(os.path.join(directory, "index.json")) as f:
+            meta = json.load(f)
+        with self._lock:
+            self._raw.load(os.path.join(directory, "raw"))
+            if meta["trained"]:
+                self._coarse = np.load(os.path.join(directory, "coarse.npy"))
+                self._coarse_norms = (self._coarse ** 2).sum(axis=1)
+                pq = np.load(os.path.join(directory, "pq.npy"))
+                self.nlist, self.m = len(self._coarse), len(pq)
+                self._codes = np.load(os.path.join(directory, "codes.npy"))
+                self._assign = np.load(os.path.join(directory, "assign.npy"))
+                self._pq = pq
+            self.recall, self.recall_k = meta.get("recall"), meta.get("recall_k")
+
+    def stats(self) -> dict:
+        """Return parameters, size, memory per item and the last measured recall."""
+        stats = {
+            "kind": self.kind,
+            "rows": len(self),
+            "trained": self.trained,
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "rerank": self.rerank,
+            "recall": round(self.recall, 4) if self.recall is not None else None,
+            "recall_k": self.recall_k,
+        }
+        if self.trained:
+            # Resident per item: one byte per subspace, the cluster number and the presence flag
+            code_bytes = self.m + self._assign.itemsize + 1
+            stats["subspaces"] = self.m
+            stats["bytes_per_item"] = code_bytes
+            stats["compression"] = round(self._coarse.shape[1] * 4 / code_bytes, 1)
+        return stats
+
+
+def create_index(kind: str, **params):
+    """
+    Create an empty index of the given kind.
+
+    Raises:
+        ValueError: For unknown kinds
+    """
+    if kind == "hnsw":
+        return HnswIndex(**params)
+    if kind == "exact":
+        return ExactIndex(**params)
+    if kind == "ivfpq":
+        return IvfPqIndex(**params)
+    raise ValueError(f"Unknown local index kind: {kind}")
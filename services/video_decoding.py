@@ -0,0 +1,113 @@
+"""
+Video Decoding.
+Samples frames from an uploaded video clip at a fixed rate, with hard limits on the work done.
+
+Frames are decoded in order and kept when they cross the next sampling
+timestamp; each kept frame is scaled by the decoder's converter so its shorter
+side matches the model's input size. Decoding stops at whichever comes first:
+the end of the clip, max_frames kept frames, max_duration_seconds of video,
+or max_decode_seconds of wall-clock time.
+"""
+
+import logging
+import time
+from io import BytesIO
+from typing import List
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_FPS = 1.0
+DEFAULT_MAX_FRAMES = 16
+DEFAULT_MAX_DURATION_SECONDS = 60.0
+DEFAULT_MAX_DECODE_SECONDS = 10.0
+
+
+class VideoDecodeError(ValueError):
+    """Raised when a video cannot be decoded or has no frames."""
+
+
+class VideoDecoderUnavailable(RuntimeError):
+    """Raised when the optional PyAV dependency is not installed."""
+
+
+def sample_frames(
+    data: bytes,
+    sample_fps: float = DEFAULT_SAMPLE_FPS,
+    max_frames: int = DEFAULT_MAX_FRAMES,
+    max_duration_seconds: float = DEFAULT_MAX_DURATION_SECONDS,
+    max_decode_seconds: float = DEFAULT_MAX_DECODE_SECONDS,
+    target_size: int = 224
+) -> List[Image.Image]:
+    """
+    Decode a clip and return frames sampled at sample_fps.
+
+    Args:
+        data: Encoded video bytes (any container and codec FFmpeg reads)
+        sample_fps: Frames kept per second of video
+        max_frames: Max frames returned
+        max_duration_seconds: Stop after this many seconds of video
+        max_decode_seconds: Stop after this much wall-clock decoding time
+        target_size: Shorter side of the returned frames
+
+    Returns:
+        List of RGB PIL Images, in timestamp order
+
+    Raises:
+        VideoDecoderUnavailable: If PyAV is not installed
+        VideoDecodeError: If the clip is unreadable or yields no frames
+    """
+    try:
+        import av
+    except ImportError:
+        raise VideoDecoderUnavailable("Video search requires PyAV (pip install av)")
+
+    interval = 1.0 / sample_fps
+    started = time.perf_counter()
+    frames: List[Image.Image] = []
+    next_timestamp = 0.0
+    first_time = None
+
+    try:
+        with av.open(BytesIO(data), mode="r") as container:
+            if not container.streams.video:
+                raise VideoDecodeError("File has no video stream")
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+
+            for frame in container.decode(stream):
+                if frame.time is None:
+                    timestamp = next_timestamp
+                else:
+                    # Measured from the first frame; containers may start at a nonzero time
+                    first_time = frame.time if first_time is None else first_time
+                    timestamp = frame.time - first_time
+                if timestamp > max_duration_seconds:
+                    break
+
+                if timestamp >= next_timestamp:
+                    scale = target_size / min(frame.width, frame.height)
+                    if scale < 1.0:
+                        frame = frame.reformat(
+                            width=max(1, round(frame.width * scale)),
+                            height=max(1, round(frame.height * scale))
+                        )
+                    frames.append(frame.to_image())
+                    # Stay on the sampling grid instead of drifting by each frame's offset
+                    next_timestamp = (int(timestamp / interval) + 1) * interval
+                    if len(frames) >= max_frames:
+                        break
+
+                if time.perf_counter() - started > max_decode_seconds:
+                    logger.warning(
+                        f"Video decode budget of {max_decode_seconds}s reached at {timestamp:.1f}s "
+                        f"({len(frames)} frames)"
+                    )
+                    break
+    except av.FFmpegError as e:
+        raise VideoDecodeError(f"Failed to decode video: {e}")
+
+    if not frames:
+        raise VideoDecodeError("No frames could be decoded from the video")
+    return [frame if frame.mode == "RGB" else frame.convert("RGB") for frame in frames]
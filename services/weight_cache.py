@@ -0,0 +1,182 @@
+"""
+Weight Cache.
+Stores each model tower's weights as a safetensors file and maps them back without copying.
+
+Tensors are created directly on a copy-on-write mmap of the file, so their pages
+come from the OS page cache: every process that maps the same file (uvicorn
+workers, forked inference workers) shares one physical copy of the weights, and
+a warm page cache makes later cold starts nearly free.
+"""
+
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+from typing import Dict, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEIGHT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "saga-search", "weights")
+
+# Bump when the layout of cached files changes
+WEIGHT_CACHE_VERSION = "1"
+
+_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+class WeightCacheError(ValueError):
+    """Raised when a cached weight file is unreadable or does not match the model."""
+
+
+def weight_cache_path(cache_dir: str, checkpoint: str, tower: str) -> str:
+    """Return the cache file for one tower of a checkpoint."""
+    safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", checkpoint)
+    return os.path.join(cache_dir, f"{safe_name}-{tower}.safetensors")
+
+
+def _module_tensors(model: torch.nn.Module) -> Dict[str, torch.Tensor]:
+    """Return every parameter and buffer, including non-persistent buffers the state dict leaves out."""
+    tensors = {name: param for name, param in model.named_parameters(remove_duplicate=False)}
+    tensors.update(model.named_buffers(remove_duplicate=False))
+    return {name: tensor for name, tensor in tensors.items() if tensor is not None}
+
+
+def save_weights(model: torch.nn.Module, path: str, metadata: Optional[Dict[str, str]] = None):
+    """
+    Write a module's parameters and buffers to a safetensors file atomically.
+
+    Tensors sharing storage (tied weights) are written once; the other names
+    are recorded as aliases in the file metadata.
+
+    Args:
+        model: CPU module to save
+        path: Destination .safetensors file
+        metadata: Extra string metadata stored in the header
+    """
+    from safetensors.torch import save_file
+
+    tensors = {}
+    aliases = {}
+    seen = {}
+    for name, tensor in _module_tensors(model).items():
+        key = (tensor.untyped_storage().data_ptr(), tensor.storage_offset(), tuple(tensor.shape), tensor.dtype)
+        if tensor.numel() and key in seen:
+            aliases[name] = seen[key]
+            continue
+        seen[key] = name
+        tensors[name] = tensor.detach().contiguous()
+
+    header = dict(metadata or {})
+    header["weight_cache_version"] = WEIGHT_CACHE_VERSION
+    header["aliases"] = json.dumps(aliases)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".weights-", suffix=".tmp", dir=directory)
+    os.close(fd)
+    try:
+        save_file(tensors, tmp_path, metadata=header)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_weights(path: str) -> Dict[str, torch.Tensor]:
+    """
+    Map a safetensors file written by save_weights and return tensors backed by the mapping.
+
+    Returns:
+        Dict of tensor name to CPU tensor, including aliased names
+
+    Raises:
+        WeightCacheError: If the file is truncated, malformed or from another cache version
+    """
+    with open(path, "rb") as f:
+        try:
+            # Private mapping: pages stay shared with the page cache until written (never, for inference)
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except ValueError as e:
+            raise WeightCacheError(f"Cannot map {path}: {e}")
+
+    try:
+        (header_size,) = struct.unpack("<Q", buffer[:8])
+        header = json.loads(buffer[8:8 + header_size])
+    except (struct.error, ValueError) as e:
+        raise WeightCacheError(f"Unreadable weight cache header in {path}: {e}")
+
+    metadata = header.pop("__metadata__", None) or {}
+    if metadata.get("weight_cache_version") != WEIGHT_CACHE_VERSION:
+        raise WeightCacheError(f"Weight cache {path} has version {metadata.get('weight_cache_version')}")
+
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        dtype = _DTYPES.get(info["dtype"])
+        if dtype is None:
+            raise WeightCacheError(f"Unsupported dtype {info['dtype']} for {name} in {path}")
+
+        begin, end = info["data_offsets"]
+        if data_start + end > len(buffer):
+            raise WeightCacheError(f"Weight cache {path} is truncated")
+
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        count = (end - begin) // itemsize
+        if count == 0:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        tensors[name] = torch.frombuffer(
+            buffer, dtype=dtype, count=count, offset=data_start + begin
+        ).view(info["shape"])
+
+    for name, source in json.loads(metadata.get("aliases", "{}")).items():
+        tensors[name] = tensors[source]
+    return tensors
+
+
+def assign_weights(model: torch.nn.Module, tensors: Dict[str, torch.Tensor]):
+    """
+    Point a module's parameters and buffers at the given tensors without copying.
+
+    The module may be an empty skeleton on the meta device.
+
+    Raises:
+        WeightCacheError: If the names or shapes do not match the module
+    """
+    expected = _module_tensors(model)
+    missing = sorted(set(expected) - set(tensors))
+    unexpected = sorted(set(tensors) - set(expected))
+    if missing or unexpected:
+        raise WeightCacheError(
+            f"Weight cache does not match the model (missing: {missing[:5]}, unexpected: {unexpected[:5]})"
+        )
+    for name, tensor in expected.items():
+        if tuple(tensor.shape) != tuple(tensors[name].shape):
+            raise WeightCacheError(f"Weight cache shape mismatch for {name}: {tuple(tensors[name].shape)}")
+
+    result = model.load_state_dict(tensors, strict=False, assign=True)
+
+    # Non-persistent buffers are not part of the state dict
+    for name in result.unexpected_keys:
+        module_name, _, buffer_name = name.rpartition(".")
+        model.get_submodule(module_name).register_buffer(buffer_name, tensors[name], persistent=False)
+
+    for name, tensor in _module_tensors(model).items():
+        if tensor.is_meta:
+            raise WeightCacheError(f"{name} was not restored from the weight cache")
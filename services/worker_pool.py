@@ -0,0 +1,402 @@
+"""
+Worker Pool.
+Runs EmbeddingService methods across several forked processes that share the parent's model weights.
+Requests and results pass through shared-memory rings of per-call slots instead of being pickled.
+
+The first bytes argument of a call (an encoded image) is copied into the
+call's request slot; result vectors are written into its response slot.
+Anything else, and payloads too large for a slot, is pickled. Each worker has
+its own request queue and response pipe, so a worker that dies (OOM kill,
+crash in a native op) only fails the calls it was given; it is then taken out
+of rotation, and calls go to the remaining workers.
+
+Workers are forked after the parent has run the model (quantization and ONNX
+checks), which starts torch's intra-op thread pool. A forked child that runs
+more than one intra-op thread then deadlocks on its first parallel op, so every
+worker runs single-threaded; scale with more workers instead. Each worker runs
+the service's deferred warmup itself once it is forked.
+
+The rings live in /dev/shm. Docker gives containers 64 MB there by default,
+so the pool checks the free space up front rather than failing with SIGBUS
+when a worker first touches a page that does not fit.
+"""
+
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import pickle
+import threading
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .inference_executor import InferenceQueueFull
+
+logger = logging.getLogger(__name__)
+
+# How often the reader thread wakes up to check for shutdown
+READER_POLL_SECONDS = 1.0
+
+# Where POSIX shared memory is allocated on Linux
+SHM_DIR = "/dev/shm"
+
+
+class WorkersUnavailable(RuntimeError):
+    """Raised when a call cannot be served because its worker process exited (or none is left)."""
+
+
+class _SharedBytes:
+    """Placeholder for a bytes argument copied into the call's request slot."""
+
+    def __init__(self, length: int):
+        self.length = length
+
+
+def _worker_main(
+    worker_id: int,
+    embedding_service,
+    ring: np.ndarray,
+    request_ring: np.ndarray,
+    requests,
+    responses,
+    torch_threads: int
+):
+    """Worker process loop: run requested methods and write vectors into the response ring."""
+    import torch
+
+    torch.set_num_threads(max(1, torch_threads))
+    # The parent defers warmup so that it runs here, after the fork
+    embedding_service.warmup()
+    dim = ring.shape[2]
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+
+        request_id, slot, method, args, kwargs = request
+        try:
+            args = tuple(
+                request_ring[slot, :arg.length].tobytes() if isinstance(arg, _SharedBytes) else arg
+                for arg in args
+            )
+            result = getattr(embedding_service, method)(*args, **kwargs)
+            array = np.asarray(result, dtype=np.float32)
+
+            if array.size and array.shape[-1] == dim and array.size <= ring[slot].size:
+                rows = array.reshape(-1, dim)
+                ring[slot, :len(rows)] = rows
+                responses.send((request_id, array.shape, None, None))
+            else:
+                # Too large for a ring slot (or empty): fall back to pickling the array
+                responses.send((request_id, array.shape, array, None))
+        except Exception as e:
+            logger.error(f"Worker {worker_id} failed on {method}: {e}")
+            try:
+                # An exception that cannot be pickled would fail the send itself
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError(f"{type(e).__name__}: {e}")
+            responses.send((request_id, None, None, e))
+
+
+class WorkerPool:
+    """Process pool hosting forked copies of one EmbeddingService, fed through shared-memory rings."""
+
+    kind = "process"
+
+    def __init__(
+        self,
+        embedding_service,
+        num_workers: int = 2,
+        max_queue: int = 64,
+        max_rows: int = 64,
+        torch_threads: int = 1,
+        request_bytes: int = 256 * 1024
+    ):
+        """
+        Initialize the pool and fork the worker processes.
+
+        Args:
+            embedding_service: Loaded EmbeddingService instance (weights are shared with workers)
+            num_workers: Number of worker processes
+            max_queue: Maximum number of calls waiting for a free worker
+            max_rows: Vectors per response slot; larger results are pickled instead
+            torch_threads: torch intra-op threads per worker; must be 1 (see the module docstring)
+            request_bytes: Bytes per request slot; larger bytes arguments are pickled instead
+
+        Raises:
+            ValueError: If torch_threads is above 1
+            RuntimeError: If /dev/shm has no room for the rings
+        """
+        if torch_threads > 1:
+            raise ValueError(
+                f"Forked inference workers deadlock with more than 1 torch thread (got {torch_threads}); "
+                f"use more INFERENCE_WORKERS instead of WORKER_TORCH_THREADS"
+            )
+        self.num_workers = max(1, num_workers)
+        self.max_queue = max(0, max_queue)
+        self.dim = embedding_service.embedding_dim
+        self.request_bytes = request_bytes
+        num_slots = self.num_workers + self.max_queue
+
+        # One slot per admitted call in each ring, so queue depth is bounded by the ring size
+        ring_bytes = num_slots * max_rows * self.dim * 4
+        _check_shm_space(ring_bytes + num_slots * request_bytes)
+        self._shm = shared_memory.SharedMemory(create=True, size=ring_bytes)
+        self._ring = np.ndarray((num_slots, max_rows, self.dim), dtype=np.float32, buffer=self._shm.buf)
+        self._request_shm = shared_memory.SharedMemory(create=True, size=max(1, num_slots * request_bytes))
+        self._request_ring = np.ndarray((num_slots, request_bytes), dtype=np.uint8, buffer=self._request_shm.buf)
+        self._free_slots: List[int] = list(range(num_slots))
+        # request_id -> (loop, future, slot, as_numpy, worker)
+        self._pending: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Future, int, bool, int]] = {}
+        self._in_flight = [0] * self.num_workers
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.crashed = 0
+
+        # Weights live in shared memory before fork, so workers read the same pages
+        embedding_service.share_memory()
+
+        ctx = mp.get_context("fork")
+        self._requests = [ctx.Queue() for _ in range(self.num_workers)]
+        pipes = [ctx.Pipe(duplex=False) for _ in range(self.num_workers)]
+        self._responses = [reader for reader, _ in pipes]
+        self._workers = [
+            ctx.Process(
+                target=_worker_main,
+                args=(
+                    i, embedding_service, self._ring, self._request_ring,
+                    self._requests[i], pipes[i][1], torch_threads
+                ),
+                name=f"embedding-worker-{i}",
+                daemon=True
+            )
+            for i in range(self.num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        # The parent only reads responses
+        for _, writer in pipes:
+            writer.close()
+        self._alive = [True] * self.num_workers
+
+        self._reader = threading.Thread(target=self._read_responses, name="worker-pool-reader", daemon=True)
+        self._reader.start()
+
+        logger.info(
+            f"Worker pool started ({self.num_workers} processes, {num_slots} ring slots x {max_rows} rows, "
+            f"{request_bytes} request bytes)"
+        )
+
+    async def run(self, method: str, *args, **kwargs) -> Any:
+        """
+        Run an EmbeddingService method on the least busy live worker process.
+
+        Args:
+            method: Name of the EmbeddingService method (e.g. "encode_text")
+            *args: Positional arguments for the method (must be picklable)
+            **kwargs: Keyword arguments for the method
+
+        Returns:
+            The method's return value
+
+        Raises:
+            InferenceQueueFull: If every ring slot is in use
+            WorkersUnavailable: If no worker is alive, or the worker exits before answering
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        with self._lock:
+            live = [i for i in range(self.num_workers) if self._alive[i]]
+            if not live:
+                raise WorkersUnavailable("Every inference worker process has exited")
+            if not self._free_slots:
+                self.rejected += 1
+                raise InferenceQueueFull(
+                    f"Inference queue is full ({self.max_queue} waiting, {self.num_workers} running)"
+                )
+            slot = self._free_slots.pop()
+            worker = min(live, key=lambda i: self._in_flight[i])
+            self._in_flight[worker] += 1
+            request_id = self._next_id
+            self._next_id += 1
+            self._pending[request_id] = (loop, future, slot, kwargs.get("as_numpy", False), worker)
+
+        args = list(args)
+        for position, arg in enumerate(args):
+            if isinstance(arg, (bytes, bytearray)) and len(arg) <= self.request_bytes:
+                self._request_ring[slot, :len(arg)] = np.frombuffer(arg, dtype=np.uint8)
+                args[position] = _SharedBytes(len(arg))
+                break
+
+        try:
+            self._requests[worker].put((request_id, slot, method, tuple(args), kwargs))
+        except ValueError:
+            # The worker was retired meanwhile, which already failed this call
+            pass
+        return await future
+
+    def _read_responses(self):
+        """Resolve waiting futures as workers report finished requests, and fail the calls of workers that exit."""
+        while not self._stopping.is_set():
+            with self._lock:
+                live = [i for i in range(self.num_workers) if self._alive[i]]
+            if not live:
+                break
+            sources = {self._responses[i]: i for i in live}
+            sentinels = {self._workers[i].sentinel: i for i in live}
+
+            for ready in wait(list(sources) + list(sentinels), timeout=READER_POLL_SECONDS):
+                if ready in sources:
+                    try:
+                        message = ready.recv()
+                    except (EOFError, OSError):
+                        # The pipe closed: the worker exited, which its sentinel reports
+                        continue
+                    self._finish(*message)
+
+            for worker in sentinels.values():
+                if not self._stopping.is_set() and not self._workers[worker].is_alive():
+                    self._drain(worker)
+                    self._retire(worker)
+
+    def _drain(self, worker: int):
+        """Apply the responses a worker sent before it exited."""
+        connection = self._responses[worker]
+        try:
+            while connection.poll():
+                self._finish(*connection.recv())
+        except (EOFError, OSError):
+            pass
+
+    def _finish(self, request_id: int, shape, payload, error):
+        """Resolve one call from its worker's response."""
+        with self._lock:
+            entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return
+        loop, future, slot, as_numpy, worker = entry
+
+        if error is not None:
+            result = error
+        else:
+            if payload is None:
+                count = int(np.prod(shape))
+                payload = self._ring[slot].reshape(-1)[:count].reshape(shape).copy()
+            result = payload if as_numpy else payload.tolist()
+
+        # The slot is only reused once the worker is done writing to it
+        with self._lock:
+            self._free_slots.append(slot)
+            self._in_flight[worker] -= 1
+            if error is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+        loop.call_soon_threadsafe(self._resolve, future, result)
+
+    def _retire(self, worker: int):
+        """Take an exited worker out of rotation and fail the calls it was given."""
+        process = self._workers[worker]
+        with self._lock:
+            self._alive[worker] = False
+            lost = [
+                (request_id, entry) for request_id, entry in self._pending.items() if entry[4] == worker
+            ]
+            for request_id, (_, _, slot, _, _) in lost:
+                del self._pending[request_id]
+                self._free_slots.append(slot)
+            self._in_flight[worker] = 0
+            self.crashed += len(lost)
+            remaining = sum(self._alive)
+
+        logger.error(
+            f"Inference worker {worker} exited (code {process.exitcode}); failed {len(lost)} calls, "
+            f"{remaining} workers left"
+        )
+        # Nobody reads this queue any more; don't let its feeder thread block interpreter exit
+        self._requests[worker].cancel_join_thread()
+        self._requests[worker].close()
+        error = WorkersUnavailable(f"Inference worker {worker} exited (code {process.exitcode})")
+        for _, (loop, future, _, _, _) in lost:
+            loop.call_soon_threadsafe(self._resolve, future, error)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: Any):
+        """Set a future's result or exception on its own event loop."""
+        if future.done():
+            return
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+    def stats(self) -> dict:
+        """Return pool size, queue depth and counters."""
+        with self._lock:
+            in_flight = len(self._pending)
+            alive = sum(self._alive)
+            return {
+                "kind": self.kind,
+                "workers": self.num_workers,
+                "workers_alive": alive,
+                "max_queue": self.max_queue,
+                "queued": max(0, in_flight - alive),
+                "running": min(in_flight, alive),
+                "completed": self.completed,
+                "failed": self.failed,
+                "crashed": self.crashed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self):
+        """Stop the workers and release the shared-memory rings."""
+        self._stopping.set()
+        for worker, requests in enumerate(self._requests):
+            if self._alive[worker]:
+                requests.put(None)
+        for worker in self._workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+
+        self._reader.join(timeout=5)
+        for requests in self._requests:
+            requests.cancel_join_thread()
+        for connection in self._responses:
+            connection.close()
+
+        del self._ring, self._request_ring
+        for shm in (self._shm, self._request_shm):
+            shm.close()
+            shm.unlink()
+
+
+def _check_shm_space(size: int):
+    """
+    Raise if shared memory cannot hold size more bytes.
+
+    Shared memory is allocated lazily, so an oversized ring is only noticed as a
+    SIGBUS in whichever process first writes past the space that is left.
+    """
+    if not os.path.isdir(SHM_DIR):
+        return
+    stat = os.statvfs(SHM_DIR)
+    free = stat.f_bavail * stat.f_frsize
+    if size > free:
+        raise RuntimeError(
+            f"Worker pool rings need {size / 2 ** 20:.1f} MB of {SHM_DIR} but only {free / 2 ** 20:.1f} MB is free; "
+            f"lower INFERENCE_QUEUE_DEPTH or WORKER_REQUEST_SLOT_MB, or give the container more "
+            f"shared memory (docker run --shm-size)"
+        )
@@ -0,0 +1,69 @@
+"""Tests for choosing a runtime profile from autotune benchmark records."""
+
+from services.autotune import _record, choose_profile
+
+
+def _records(latencies: dict) -> list:
+    """Build records from {(tower, threads, interop, batch_size): median_ms}."""
+    return [
+        _record(tower, threads, interop, batch_size, median_ms)
+        for (tower, threads, interop, batch_size), median_ms in latencies.items()
+    ]
+
+
+def test_fewer_threads_win_when_within_the_latency_slack():
+    records = _records({
+        ("text", 2, 1, 1): 10.3,
+        ("text", 4, 1, 1): 10.0,
+        ("text", 8, 1, 1): 6.0,
+        ("vision", 8, 1, 1): 50.0,
+    })
+    assert choose_profile(records, 500)["torch_threads"] == 8
+
+    records = _records({
+        ("text", 2, 1, 1): 10.3,
+        ("text", 4, 1, 1): 10.0,
+        ("vision", 2, 1, 1): 50.0,
+    })
+    profile = choose_profile(records, 500)
+    assert (profile["torch_threads"], profile["interop_threads"]) == (2, 1)
+
+
+def test_threads_are_chosen_on_single_query_text_latency_only():
+    records = _records({
+        ("text", 2, 1, 1): 20.0,
+        ("text", 4, 1, 1): 10.0,
+        # Faster batches on 2 threads must not pull the choice away from the search path
+        ("text", 2, 1, 32): 40.0,
+        ("text", 4, 1, 32): 80.0,
+        ("vision", 2, 1, 1): 10.0,
+        ("vision", 4, 1, 1): 90.0,
+    })
+    assert choose_profile(records, 500)["torch_threads"] == 4
+
+
+def test_batch_size_is_the_fastest_one_within_the_latency_budget():
+    records = _records({
+        ("text", 4, 1, 1): 5.0,
+        ("text", 4, 1, 32): 100.0,
+        ("text", 4, 1, 64): 160.0,
+        ("vision", 4, 1, 1): 50.0,
+        ("vision", 4, 1, 8): 200.0,
+        ("vision", 4, 1, 16): 600.0,
+        # Other thread counts are ignored when picking batch sizes
+        ("text", 8, 1, 64): 100.0,
+    })
+    profile = choose_profile(records, 300)
+    assert profile["text_batch_size"] == 64
+    assert profile["image_batch_size"] == 8
+
+    assert choose_profile(records, 150)["text_batch_size"] == 32
+
+
+def test_batch_size_falls_back_to_best_throughput_when_nothing_fits_the_budget():
+    records = _records({
+        ("text", 4, 1, 1): 5.0,
+        ("vision", 4, 1, 4): 800.0,
+        ("vision", 4, 1, 8): 1200.0,
+    })
+    assert choose_profile(records, 100)["image_batch_size"] == 8
@@ -0,0 +1,119 @@
+"""Tests for the streaming /embed/batch endpoint."""
+
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from services.image_decoding import ImageDecodeError
+from services.inference_executor import InferenceExecutor
+from services.model_registry import LoadedModel, ModelRegistry
+
+MODEL = "clip-ViT-B-32-multilingual-v1"
+
+
+class FakeService:
+    """Texts embed to their length; images to their first byte. Images starting with b"bad" fail to decode."""
+
+    model_name = MODEL
+    embedding_dim = 4
+
+    def memory_bytes(self) -> int:
+        return 0
+
+    def is_loaded(self, tower: str) -> bool:
+        return True
+
+    def encode_text(self, texts, as_numpy: bool = False):
+        return np.array([[len(text)] * self.embedding_dim for text in texts], dtype=np.float32)
+
+    def encode_image(self, data: bytes, as_numpy: bool = False):
+        if data.startswith(b"bad"):
+            raise ImageDecodeError("cannot identify image")
+        return np.full(self.embedding_dim, data[0], dtype=np.float32)
+
+    def encode_images_batch(self, images, batch_size: int = 8, as_numpy: bool = False):
+        return np.stack([self.encode_image(data) for data in images])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    service = FakeService()
+    executor = InferenceExecutor(service, max_workers=1, max_queue=64)
+    registry = ModelRegistry(loader=None, default=LoadedModel(service, executor, batcher=None))
+    monkeypatch.setattr(main, "embedding_service", service)
+    monkeypatch.setattr(main, "model_registry", registry)
+    monkeypatch.setattr(main, "EMBED_TEXT_BATCH_SIZE", 2)
+    monkeypatch.setattr(main, "EMBED_IMAGE_BATCH_SIZE", 2)
+    yield TestClient(main.app)
+    executor.shutdown()
+
+
+def _lines(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_results_stream_texts_then_images_in_index_order(client):
+    response = client.post(
+        "/embed/batch",
+        data={"texts": ["a", "bb", "ccc"]},
+        files=[("images", ("1.jpg", b"\x07img", "image/jpeg")), ("images", ("2.jpg", b"\x09img", "image/jpeg"))],
+    )
+    assert response.status_code == 200
+    lines = _lines(response)
+    assert [(line["index"], line["type"]) for line in lines] == [
+        (0, "text"), (1, "text"), (2, "text"), (3, "image"), (4, "image")
+    ]
+    assert [line["embedding"][0] for line in lines] == [1, 2, 3, 7, 9]
+
+
+def test_a_bad_image_only_fails_itself(client):
+    response = client.post(
+        "/embed/batch",
+        files=[
+            ("images", ("1.jpg", b"\x05img", "image/jpeg")),
+            ("images", ("2.jpg", b"bad", "image/jpeg")),
+            ("images", ("3.jpg", b"\x06img", "image/jpeg")),
+        ],
+    )
+    lines = _lines(response)
+    assert [line["index"] for line in lines] == [0, 1, 2]
+    assert "embedding" in lines[0] and "embedding" in lines[2]
+    assert "cannot identify image" in lines[1]["error"]
+
+
+def test_more_items_than_multipart_defaults_are_accepted(client, monkeypatch):
+    monkeypatch.setattr(main, "EMBED_BATCH_MAX_ITEMS", 1500)
+    response = client.post("/embed/batch", data={"texts": ["x"] * 1500}, params={"batch_size": 256})
+    assert response.status_code == 200
+    assert len(_lines(response)) == 1500
+
+
+def test_requests_over_the_item_limit_are_rejected(client, monkeypatch):
+    monkeypatch.setattr(main, "EMBED_BATCH_MAX_ITEMS", 10)
+    response = client.post(
+        "/embed/batch",
+        data={"texts": ["x"] * 6},
+        files=[("images", (f"{i}.jpg", b"\x01", "image/jpeg")) for i in range(5)],
+    )
+    assert response.status_code == 400
+    assert "max 10" in response.json()["detail"]
+
+    response = client.post("/embed/batch", data={"texts": ["x"] * 11})
+    assert response.status_code == 400
+    assert "max 10" in response.json()["detail"]
+
+
+def test_float32_frames_carry_start_and_count(client):
+    response = client.post("/embed/batch", data={"texts": ["a", "bb", "ccc"]}, params={"format": "float32"})
+    body = response.content
+    frames = []
+    while body:
+        kind, start, count, dim = main.EMBED_FRAME_HEADER.unpack(body[:main.EMBED_FRAME_HEADER.size])
+        body = body[main.EMBED_FRAME_HEADER.size:]
+        vectors = np.frombuffer(body[:count * dim * 4], dtype="<f4").reshape(count, dim)
+        body = body[count * dim * 4:]
+        frames.append((kind, start, vectors[:, 0].tolist()))
+    assert frames == [(b"T", 0, [1.0, 2.0]), (b"T", 2, [3.0])]
@@ -0,0 +1,52 @@
+"""Tests for the in-process QueryEmbeddingCache."""
+
+import numpy as np
+import pytest
+
+from services.embedding_cache import QueryEmbeddingCache, normalize_query
+
+
+def test_normalize_query_collapses_whitespace_and_composes_unicode():
+    assert normalize_query("  Reykjavík \t 1950\n") == "Reykjavík 1950"
+    # Case is kept: cased encoders embed it differently
+    assert normalize_query("Boats") != normalize_query("boats")
+
+
+def test_entries_are_keyed_by_model_and_read_only():
+    cache = QueryEmbeddingCache(max_entries=4)
+    cache.put("model-a", "boats", [1.0, 2.0])
+
+    vector = cache.get("model-a", "boats")
+    assert vector.dtype == np.float32 and vector.tolist() == [1.0, 2.0]
+    assert cache.get("model-b", "boats") is None
+    with pytest.raises(ValueError):
+        vector[0] = 0.0
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryEmbeddingCache(max_entries=2)
+    cache.put("m", "a", [1.0])
+    cache.put("m", "b", [2.0])
+    cache.get("m", "a")
+    cache.put("m", "c", [3.0])
+
+    assert cache.get("m", "b") is None
+    assert cache.get("m", "a") is not None and cache.get("m", "c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_limit_evicts_and_skips_oversized_vectors():
+    cache = QueryEmbeddingCache(max_entries=100, max_bytes=64)
+    for i in range(5):
+        cache.put("m", str(i), np.zeros(4))
+    assert cache.stats()["entries"] == 4 and cache.stats()["bytes"] == 64
+
+    cache.put("m", "huge", np.zeros(32))
+    assert cache.get("m", "huge") is None
+
+
+def test_zero_entries_disables_the_cache():
+    cache = QueryEmbeddingCache(max_entries=0)
+    cache.put("m", "a", [1.0])
+    assert cache.get("m", "a") is None
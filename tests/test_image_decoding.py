@@ -0,0 +1,54 @@
+"""Tests for reduced-resolution image decoding."""
+
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from services.image_decoding import ImageDecodeError, decode_image
+
+
+def _encode(image: Image.Image, format: str, **params) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def test_large_jpeg_is_decoded_near_the_target_size():
+    data = _encode(Image.new("RGB", (2000, 1000), (200, 50, 50)), "JPEG")
+    image = decode_image(data, target_size=224)
+    assert image.mode == "RGB"
+    # DCT scaling to 1/4, never below the target
+    assert image.size == (500, 250)
+
+
+def test_large_png_is_box_reduced_by_an_integer_factor():
+    data = _encode(Image.new("RGBA", (1000, 900), (0, 0, 255, 128)), "PNG")
+    image = decode_image(data, target_size=224)
+    assert image.mode == "RGB"
+    assert image.size == (250, 225)
+
+
+def test_small_images_keep_their_size():
+    data = _encode(Image.new("L", (100, 80), 128), "PNG")
+    assert decode_image(data, target_size=224).size == (100, 80)
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees clockwise
+    data = _encode(Image.new("RGB", (600, 300)), "JPEG", exif=exif)
+    assert decode_image(data, target_size=224).size == (300, 600)
+
+
+def test_declared_size_over_the_limit_is_rejected_before_decoding():
+    data = _encode(Image.new("RGB", (200, 200)), "PNG")
+    with pytest.raises(ImageDecodeError, match="limit"):
+        decode_image(data, max_pixels=100 * 100)
+
+
+def test_unreadable_bytes_raise_image_decode_error():
+    with pytest.raises(ImageDecodeError):
+        decode_image(b"not an image")
+    with pytest.raises(ImageDecodeError):
+        decode_image(_encode(Image.new("RGB", (300, 300)), "JPEG")[:200])
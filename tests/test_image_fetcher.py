@@ -0,0 +1,102 @@
+"""Tests for ImageFetcher's URL checks, address pinning and streamed header probing."""
+
+import asyncio
+import socket
+from io import BytesIO
+
+import httpx
+import pytest
+from PIL import Image
+
+from services import image_fetcher
+from services.image_decoding import ImageDecodeError
+from services.image_fetcher import ImageFetcher, ImageURLRejected
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (10, 20, 30)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _resolve_to(monkeypatch, *answers):
+    """Make every DNS lookup return the next address in answers (the last one repeats)."""
+    answers = list(answers)
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        address = answers.pop(0) if len(answers) > 1 else answers[0]
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+
+
+def _fetcher(handler, **kwargs) -> ImageFetcher:
+    fetcher = ImageFetcher(**kwargs)
+    fetcher.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return fetcher
+
+
+@pytest.mark.parametrize("url", ["http://example.com:99999/a.png", "http://example.com:port/a.png", "ftp://example.com/a"])
+def test_malformed_and_non_http_urls_are_rejected(url):
+    fetcher = _fetcher(lambda request: httpx.Response(200))
+    with pytest.raises(ImageURLRejected):
+        asyncio.run(fetcher.fetch(url))
+
+
+def test_requests_go_to_the_checked_address_with_the_original_host(monkeypatch):
+    # A rebinding resolver: public for the check, loopback for any later lookup
+    _resolve_to(monkeypatch, "93.184.216.34", "127.0.0.1")
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, headers={"content-type": "image/png"}, content=_png(8, 8))
+
+    data = asyncio.run(_fetcher(handler).fetch("https://images.example.com:8443/a.png"))
+
+    assert data.startswith(b"\x89PNG")
+    request = seen[0]
+    assert request.url.host == "93.184.216.34"
+    assert request.headers["host"] == "images.example.com:8443"
+    assert request.extensions["sni_hostname"] == "images.example.com"
+
+
+def test_private_addresses_are_rejected(monkeypatch):
+    _resolve_to(monkeypatch, "10.0.0.5")
+    fetcher = _fetcher(lambda request: httpx.Response(200))
+    with pytest.raises(ImageURLRejected):
+        asyncio.run(fetcher.fetch("http://internal.example.com/a.png"))
+
+
+def test_header_is_parsed_a_logarithmic_number_of_times(monkeypatch):
+    _resolve_to(monkeypatch, "93.184.216.34")
+    # Not an image header, so every probe fails and keeps probing
+    body = b"\0" * (512 * 1024)
+    calls = []
+    original = ImageFetcher._check_header
+
+    def counting_check(self, data):
+        calls.append(len(data))
+        return original(self, data)
+
+    monkeypatch.setattr(ImageFetcher, "_check_header", counting_check)
+
+    async def chunks():
+        for start in range(0, len(body), 1024):
+            yield body[start:start + 1024]
+
+    fetcher = _fetcher(lambda request: httpx.Response(200, content=chunks()))
+    asyncio.run(fetcher.fetch("http://example.com/a.bin"))
+
+    assert calls[0] == image_fetcher.HEADER_FIRST_PROBE_BYTES
+    assert len(calls) <= 10
+
+
+def test_oversized_image_is_rejected_from_its_header(monkeypatch):
+    _resolve_to(monkeypatch, "93.184.216.34")
+    fetcher = _fetcher(
+        lambda request: httpx.Response(200, headers={"content-type": "image/png"}, content=_png(64, 64)),
+        max_pixels=1000
+    )
+    with pytest.raises(ImageDecodeError):
+        asyncio.run(fetcher.fetch("http://example.com/a.png"))
@@ -0,0 +1,77 @@
+"""Tests for the pipelined decode/encode loop of EmbeddingService.encode_images_batch."""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from services.embedding_service import EmbeddingService  # noqa: E402
+from services.image_decoding import ImageDecodeError  # noqa: E402
+
+
+class TimedService(EmbeddingService):
+    """EmbeddingService whose decode and encode steps just sleep and record when they ran."""
+
+    def __init__(self, decode_seconds: float = 0.05, encode_seconds: float = 0.05):
+        self.embedding_dim = 4
+        self.decode_workers = 2
+        self.decode_prefetch = 2
+        self._decode_pool = None
+        self._decode_pool_pid = None
+        self.decode_seconds = decode_seconds
+        self.encode_seconds = encode_seconds
+        self.events = []
+        self._events_lock = threading.Lock()
+
+    def load_tower(self, tower: str):
+        pass
+
+    def _record(self, *event):
+        with self._events_lock:
+            self.events.append(event + (time.perf_counter(),))
+
+    def _prepare_image(self, image):
+        self._record("decode-start", image)
+        time.sleep(self.decode_seconds)
+        if image == "corrupt":
+            raise ImageDecodeError("cannot identify image")
+        self._record("decode-end", image)
+        return image
+
+    def _encode_prepared(self, prepared):
+        self._record("encode-start", prepared[0])
+        time.sleep(self.encode_seconds)
+        self._record("encode-end", prepared[0])
+        return np.full((len(prepared), self.embedding_dim), prepared[0], dtype=np.float32)
+
+
+def _time_of(service, kind, image):
+    return next(at for event, item, at in service.events if event == kind and item == image)
+
+
+def test_next_item_decodes_while_the_current_one_encodes():
+    service = TimedService()
+    embeddings = service.encode_images_batch([0, 1, 2, 3], batch_size=1, as_numpy=True)
+
+    assert embeddings[:, 0].tolist() == [0, 1, 2, 3]
+    for item in range(3):
+        # Item N+1 is already decoded (or decoding) before item N's encode finishes
+        assert _time_of(service, "decode-start", item + 1) < _time_of(service, "encode-end", item)
+    # Serial decode + encode would take 8 x 50 ms
+    total = service.events[-1][2] - service.events[0][2]
+    assert total < 0.35
+
+
+def test_a_decode_failure_fails_the_call_promptly_and_the_pool_keeps_working():
+    service = TimedService(encode_seconds=0.01)
+    started = time.perf_counter()
+    with pytest.raises(ImageDecodeError):
+        service.encode_images_batch([0, "corrupt", 2, 3, 4, 5], batch_size=1)
+    assert time.perf_counter() - started < 1.0
+    # Batches queued after the failure are not all decoded
+    assert 5 not in [item for event, item, _ in service.events if event == "decode-end"]
+
+    assert service.encode_images_batch([7, 8], batch_size=1) == [[7.0] * 4, [8.0] * 4]
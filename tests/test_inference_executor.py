@@ -0,0 +1,86 @@
+"""Tests for the thread-based InferenceExecutor."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.inference_executor import InferenceExecutor, InferenceQueueFull
+
+
+class SlowService:
+    """Records how many calls overlap; each call sleeps for the given time."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def work(self, seconds: float, fail: bool = False):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(seconds)
+            if fail:
+                raise ValueError("bad input")
+            return seconds
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def test_calls_never_exceed_max_workers():
+    service = SlowService()
+    executor = InferenceExecutor(service, max_workers=2, max_queue=10)
+
+    async def run():
+        return await asyncio.gather(*(executor.run("work", 0.05) for _ in range(6)))
+
+    try:
+        assert asyncio.run(run()) == [0.05] * 6
+    finally:
+        executor.shutdown()
+    assert service.max_running == 2
+    assert executor.stats()["completed"] == 6
+
+
+def test_calls_beyond_the_queue_are_rejected_and_errors_are_counted():
+    executor = InferenceExecutor(SlowService(), max_workers=1, max_queue=1)
+
+    async def run():
+        return await asyncio.gather(
+            executor.run("work", 0.1),
+            executor.run("work", 0.1, fail=True),
+            executor.run("work", 0.1),
+            return_exceptions=True
+        )
+
+    try:
+        first, second, third = asyncio.run(run())
+    finally:
+        executor.shutdown()
+    assert first == 0.1
+    assert isinstance(second, ValueError)
+    assert isinstance(third, InferenceQueueFull)
+    stats = executor.stats()
+    assert (stats["completed"], stats["failed"], stats["rejected"]) == (1, 1, 1)
+    assert (stats["queued"], stats["running"]) == (0, 0)
+
+
+def test_shutdown_waits_for_running_calls_then_refuses_new_ones():
+    executor = InferenceExecutor(SlowService(), max_workers=1, max_queue=1)
+
+    async def start_then_shutdown():
+        call = asyncio.ensure_future(executor.run("work", 0.1))
+        await asyncio.sleep(0.02)
+        # Shutdown blocks until the running call is done
+        await asyncio.to_thread(executor.shutdown)
+        assert executor.stats()["running"] == 0
+        return await call
+
+    assert asyncio.run(start_then_shutdown()) == 0.1
+    with pytest.raises(RuntimeError):
+        asyncio.run(executor.run("work", 0.01))
+    assert executor.stats()["queued"] == 0
@@ -0,0 +1,101 @@
+"""Tests that EmbeddingService loads the vision tower only when images need it."""
+
+import threading
+
+import pytest
+
+torch = pytest.importorskip("torch")
+open_clip = pytest.importorskip("open_clip")
+
+from services.embedding_service import EmbeddingService, sample_images  # noqa: E402
+
+MODEL = "xlm-roberta-large-ViT-H-14"
+
+
+class TinyClip(torch.nn.Module):
+    """Smallest dual-tower model with the OpenCLIP submodule names the service strips."""
+
+    def __init__(self, dim: int = 16):
+        super().__init__()
+        torch.manual_seed(0)
+        self.token_embedding = torch.nn.Embedding(49408, dim)
+        self.visual = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 8, kernel_size=4, stride=4),
+            torch.nn.Flatten(),
+            torch.nn.Linear(8 * 8 * 8, dim)
+        )
+
+    def encode_text(self, tokens):
+        return self.token_embedding(tokens).mean(1)
+
+    def encode_image(self, pixels):
+        return self.visual(pixels)
+
+
+@pytest.fixture
+def checkpoint_loads(monkeypatch):
+    """Replace checkpoint loading with TinyClip and record each load."""
+    loads = []
+
+    def load(self, checkpoint, empty=False):
+        loads.append(checkpoint)
+        model = TinyClip().eval()
+        return model, open_clip.get_tokenizer("ViT-B-32"), open_clip.image_transform(32, is_train=False)
+
+    monkeypatch.setattr(EmbeddingService, "_load_torch_checkpoint", load)
+    return loads
+
+
+def test_vision_tower_loads_on_first_image(checkpoint_loads):
+    service = EmbeddingService(MODEL, device="cpu")
+    assert service.is_loaded("text")
+    assert not service.is_loaded("vision")
+    assert service.vision_model is None
+    text_bytes = service.memory_bytes()
+
+    service.encode_text(["bátar í höfn", "Reykjavík 1950"])
+    assert not service.is_loaded("vision")
+    assert checkpoint_loads == [MODEL]
+
+    embedding = service.encode_image(sample_images()[0], as_numpy=True)
+    assert embedding.shape == (16,)
+    assert service.is_loaded("vision")
+    assert checkpoint_loads == [MODEL, MODEL]
+    assert service.memory_bytes() > text_bytes
+
+    # Each tower only keeps its own submodules
+    assert service.text_model.visual is None
+    assert service.vision_model.token_embedding is None
+
+
+def test_preload_vision_loads_both_towers(checkpoint_loads):
+    service = EmbeddingService(MODEL, device="cpu", preload_vision=True)
+    assert service.is_loaded("text")
+    assert service.is_loaded("vision")
+    assert len(checkpoint_loads) == 2
+
+
+def test_concurrent_first_images_load_the_tower_once(checkpoint_loads):
+    service = EmbeddingService(MODEL, device="cpu")
+    images = sample_images()
+    threads = [threading.Thread(target=service.encode_image, args=(image,)) for image in images]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert service.is_loaded("vision")
+    assert checkpoint_loads == [MODEL, MODEL]
+
+
+def test_deferred_warmup_waits_for_warmup_call(checkpoint_loads):
+    service = EmbeddingService(MODEL, device="cpu", warmup_batch_sizes=(1, 2), defer_warmup=True)
+    assert service.warmup_stats == {}
+
+    service.warmup()
+    assert set(service.warmup_stats) == {"text"}
+    assert set(service.warmup_stats["text"]["batch_sizes"]) == {"1", "2"}
+
+    # Once warmup has run, towers loaded later warm up as they load
+    service.load_tower("vision")
+    assert set(service.warmup_stats) == {"text", "vision"}
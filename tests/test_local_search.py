@@ -0,0 +1,101 @@
+"""Tests for LocalSearchService syncing against an in-memory media_items table."""
+
+import asyncio
+
+import numpy as np
+
+from services.local_search import LocalSearchService
+from services.supabase_service import SupabaseSearchService
+
+
+class FakeTable(SupabaseSearchService):
+    """SupabaseSearchService over a list of rows, with the same (updated_at, id) keyset paging."""
+
+    def __init__(self):
+        self.bucket_name = "media-files"
+        self.rows = {}
+
+    def put(self, item_id: str, updated_at: str, vector):
+        self.rows[item_id] = {
+            "id": item_id, "filename": f"{item_id}.jpg", "file_type": "image", "decade": "1990s",
+            "updated_at": updated_at, "combined_embedding": list(vector),
+        }
+
+    def _changed(self, after):
+        rows = sorted(self.rows.values(), key=lambda row: (row["updated_at"], row["id"]))
+        if after is None:
+            return rows
+        updated_at, item_id = after
+        if item_id is None:
+            return [row for row in rows if row["updated_at"] >= updated_at]
+        return [row for row in rows if (row["updated_at"], row["id"]) > (updated_at, item_id)]
+
+    def fetch_media_items(self, columns, page_size=1000, without_updated_at=False):
+        return iter([])
+
+    def count_media_changes(self, after=None):
+        return len(self._changed(after))
+
+    def fetch_media_changes(self, columns, after=None, page_size=1000):
+        rows = self._changed(after)
+        for start in range(0, len(rows), page_size):
+            yield [dict(row) for row in rows[start:start + page_size]]
+
+    def fetch_media_ids(self, page_size=10000):
+        yield list(self.rows)
+
+
+def _service(table: FakeTable, **kwargs) -> LocalSearchService:
+    return LocalSearchService(
+        table, index_kind="exact", embedding_columns={"combined": "combined_embedding"}, page_size=2, **kwargs
+    )
+
+
+def _search(service: LocalSearchService, vector) -> list:
+    results = asyncio.run(service.search_by_embedding(np.asarray(vector, dtype=np.float32), limit=10))
+    return sorted(result["id"] for result in results)
+
+
+def test_sync_picks_up_rows_committed_late_behind_the_watermark():
+    table = FakeTable()
+    table.put("a", "2024-05-01T12:00:00+00:00", [1, 0])
+    table.put("c", "2024-05-01T12:00:20+00:00", [1, 0])
+    service = _service(table, sync_overlap_seconds=30)
+    service.load()
+    assert service.watermark == ("2024-05-01T12:00:20+00:00", "c")
+
+    # A transaction that started before "c" was written commits after the last sync
+    table.put("b", "2024-05-01T12:00:10+00:00", [1, 0])
+    service.sync()
+
+    assert _search(service, [1, 0]) == ["a", "b", "c"]
+    # Re-reading the overlap window never moves the watermark back
+    assert service.watermark == ("2024-05-01T12:00:20+00:00", "c")
+
+
+def test_without_an_overlap_late_rows_are_skipped():
+    table = FakeTable()
+    table.put("c", "2024-05-01T12:00:20+00:00", [1, 0])
+    service = _service(table, sync_overlap_seconds=0)
+    service.load()
+
+    table.put("b", "2024-05-01T12:00:10+00:00", [1, 0])
+    service.sync()
+
+    assert _search(service, [1, 0]) == ["c"]
+
+
+def test_rows_reread_from_the_overlap_are_updated_in_place():
+    table = FakeTable()
+    table.put("a", "2024-05-01T12:00:00+00:00", [1, 0])
+    service = _service(table, sync_overlap_seconds=30)
+    service.load()
+
+    table.put("a", "2024-05-01T12:00:05+00:00", [0, 1])
+    service.sync()
+    service.sync()
+
+    assert service.stats()["items"] == 1
+    assert _search(service, [0, 1]) == ["a"]
+    results = asyncio.run(service.search_by_embedding(np.asarray([0, 1], dtype=np.float32), limit=1))
+    assert results[0]["similarity_score"] > 0.99
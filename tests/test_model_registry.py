@@ -0,0 +1,109 @@
+"""Tests for the memory-budgeted ModelRegistry."""
+
+import asyncio
+import threading
+
+import pytest
+
+from services.model_registry import (
+    DEFAULT_SEARCH_RPC, LoadedModel, ModelBudgetExceeded, ModelRegistry, UnknownModel, parse_search_rpcs
+)
+
+MB = 1024 * 1024
+
+
+class FakeService:
+    def __init__(self, model_name: str, size_mb: int):
+        self.model_name = model_name
+        self.size = size_mb * MB
+
+    def memory_bytes(self) -> int:
+        return self.size
+
+
+class FakeExecutor:
+    def __init__(self):
+        self.shutdown_thread = None
+
+    def shutdown(self):
+        self.shutdown_thread = threading.current_thread()
+
+    def stats(self) -> dict:
+        return {}
+
+
+def _model(model_name: str, size_mb: int) -> LoadedModel:
+    return LoadedModel(FakeService(model_name, size_mb), FakeExecutor(), batcher=None)
+
+
+SIZES = {"clip-ViT-B-32-multilingual-v1": 600, "clip-ViT-B-32": 350, "clip-ViT-L-14": 900}
+
+
+def _registry(budget_mb: float = 0, servable=("clip-ViT-B-32", "clip-ViT-L-14"), search_rpcs=None) -> ModelRegistry:
+    return ModelRegistry(
+        loader=lambda name: _model(name, SIZES[name]),
+        default=_model("clip-ViT-B-32-multilingual-v1", 600),
+        servable_models=list(servable),
+        memory_budget_mb=budget_mb,
+        search_rpcs=search_rpcs if search_rpcs is not None else {"clip-ViT-L-14": "search_vit_l_14"},
+    )
+
+
+def test_search_rpcs_follow_the_embedding_space():
+    registry = _registry()
+    assert registry.search_rpc("clip-ViT-B-32-multilingual-v1") == DEFAULT_SEARCH_RPC
+    assert registry.search_rpc("clip-ViT-B-32") == DEFAULT_SEARCH_RPC
+    assert registry.search_rpc("clip-ViT-L-14") == "search_vit_l_14"
+
+
+def test_models_without_a_search_rpc_are_not_served():
+    registry = _registry(search_rpcs={})
+    assert registry.servable_models == ["clip-ViT-B-32-multilingual-v1", "clip-ViT-B-32"]
+
+    async def use():
+        async with registry.use("clip-ViT-L-14"):
+            pass
+
+    with pytest.raises(UnknownModel):
+        asyncio.run(use())
+
+
+def test_unknown_models_are_rejected_at_startup():
+    with pytest.raises(ValueError):
+        _registry(servable=["no-such-model"])
+
+
+def test_parse_search_rpcs():
+    assert parse_search_rpcs(" clip-ViT-L-14 = rpc_a ,, x=rpc_b") == {"clip-ViT-L-14": "rpc_a", "x": "rpc_b"}
+    with pytest.raises(ValueError):
+        parse_search_rpcs("clip-ViT-L-14")
+
+
+def test_least_recently_used_idle_model_is_shut_down_off_the_event_loop():
+    registry = _registry(budget_mb=1600)
+
+    async def run():
+        async with registry.use("clip-ViT-B-32") as small:
+            pass
+        async with registry.use("clip-ViT-L-14"):
+            pass
+        return small, threading.current_thread()
+
+    small, loop_thread = asyncio.run(run())
+    assert [model.model_name for model in registry.loaded_models()] == [
+        "clip-ViT-B-32-multilingual-v1", "clip-ViT-L-14"
+    ]
+    assert registry.evictions == 1
+    assert small.executor.shutdown_thread is not None
+    assert small.executor.shutdown_thread is not loop_thread
+
+
+def test_the_default_model_is_never_evicted():
+    registry = _registry(budget_mb=1000)
+
+    async def run():
+        async with registry.use("clip-ViT-L-14"):
+            pass
+
+    with pytest.raises(ModelBudgetExceeded):
+        asyncio.run(run())
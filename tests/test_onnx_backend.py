@@ -0,0 +1,84 @@
+"""Tests that ONNX exports of the towers agree with torch within the backend's tolerance."""
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("onnxruntime")
+open_clip = pytest.importorskip("open_clip")
+
+from services.embedding_service import embedding_agreement, sample_images  # noqa: E402
+from services.onnx_backend import OnnxClipBackend  # noqa: E402
+
+# EmbeddingService's default ONNX_TOLERANCE
+TOLERANCE = 1e-3
+
+
+class TinyVisual(torch.nn.Module):
+    image_size = 32
+    image_mean = open_clip.OPENAI_DATASET_MEAN
+    image_std = open_clip.OPENAI_DATASET_STD
+
+    def __init__(self, dim: int):
+        super().__init__()
+        self.conv = torch.nn.Conv2d(3, 8, kernel_size=4, stride=4)
+        self.proj = torch.nn.Linear(8 * 8 * 8, dim)
+
+    def forward(self, pixels):
+        return self.proj(torch.relu(self.conv(pixels)).flatten(1))
+
+
+class TinyClip(torch.nn.Module):
+    """Smallest model with the OpenCLIP encode_text/encode_image interface."""
+
+    def __init__(self, dim: int = 16):
+        super().__init__()
+        torch.manual_seed(0)
+        self.token_embedding = torch.nn.Embedding(49408, dim)
+        self.text_proj = torch.nn.Linear(dim, dim)
+        self.visual = TinyVisual(dim)
+
+    def encode_text(self, tokens):
+        mask = (tokens != 0).unsqueeze(-1).float()
+        pooled = (self.token_embedding(tokens) * mask).sum(1) / mask.sum(1).clamp(min=1)
+        return self.text_proj(pooled)
+
+    def encode_image(self, pixels):
+        return self.visual(pixels)
+
+
+def _normalized(tensor) -> np.ndarray:
+    return torch.nn.functional.normalize(tensor, dim=-1).detach().numpy()
+
+
+def test_open_clip_export_matches_torch(tmp_path):
+    model = TinyClip().eval()
+    preprocess = open_clip.image_transform(32, is_train=False)
+    backend = OnnxClipBackend("tiny-clip", "open_clip", cache_dir=str(tmp_path))
+    backend.export(model, preprocess)
+    assert backend.is_exported()
+
+    backend.load()
+    texts = ["Reykjavík 1950", "bátar í höfn", "a much longer caption with several more words in it"]
+    tokenizer = open_clip.get_tokenizer("tiny-clip")
+    with torch.no_grad():
+        text_reference = _normalized(model.encode_text(tokenizer(texts)))
+    text_agreement = embedding_agreement(text_reference, backend.encode_text(texts))
+    assert text_agreement["max_abs_diff"] <= TOLERANCE
+
+    images = sample_images()
+    with torch.no_grad():
+        image_reference = _normalized(model.encode_image(torch.stack([preprocess(img) for img in images])))
+    image_agreement = embedding_agreement(image_reference, backend.encode_images(images))
+    assert image_agreement["max_abs_diff"] <= TOLERANCE
+    assert image_agreement["min_cosine"] > 0.9999
+
+
+def test_embedding_agreement_reports_differences():
+    reference = np.eye(3, dtype=np.float32)
+    candidate = reference.copy()
+    candidate[1] = [0.0, 0.6, 0.8]
+    agreement = embedding_agreement(reference, candidate)
+    assert agreement["samples"] == 3
+    assert agreement["min_cosine"] == pytest.approx(0.6)
+    assert agreement["max_abs_diff"] == pytest.approx(0.8)
@@ -0,0 +1,62 @@
+"""Tests for INT8 dynamic quantization and its agreement check against fp32."""
+
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from services.embedding_service import EmbeddingService  # noqa: E402
+
+
+def _tower() -> torch.nn.Module:
+    torch.manual_seed(0)
+    return torch.nn.Sequential(torch.nn.Linear(32, 64), torch.nn.ReLU(), torch.nn.Linear(64, 16)).eval()
+
+
+def _service(min_cosine: float = 0.98) -> SimpleNamespace:
+    """The attributes _quantize_int8 uses; samples are a fixed batch run through the tower."""
+    samples = torch.randn(8, 32, generator=torch.Generator().manual_seed(1))
+
+    def encode_samples(tower, model, model_type):
+        with torch.no_grad():
+            return model(samples).numpy()
+
+    return SimpleNamespace(
+        _encode_samples=encode_samples,
+        _checkpoint=lambda tower: "tiny",
+        quantize_min_cosine=min_cosine,
+        quantization_agreement={},
+    )
+
+
+def _quantized_linears(model) -> int:
+    return sum(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in model.modules())
+
+
+def test_linear_layers_are_quantized_when_outputs_agree():
+    service = _service()
+    model = EmbeddingService._quantize_int8(service, "text", _tower(), "tiny")
+
+    assert _quantized_linears(model) == 2
+    agreement = service.quantization_agreement["text"]
+    assert agreement["quantized"] and agreement["min_cosine"] >= 0.98
+
+
+def test_a_quantized_model_that_disagrees_is_rejected(monkeypatch):
+    original = torch.ao.quantization.quantize_dynamic
+
+    def broken_quantize(model, *args, **kwargs):
+        # Stands in for a quantization that wrecks the outputs
+        broken = original(model, *args, **kwargs)
+        broken[2].register_forward_hook(lambda module, inputs, output: -output)
+        return broken
+
+    monkeypatch.setattr(torch.ao.quantization, "quantize_dynamic", broken_quantize)
+    service = _service()
+    fp32 = _tower()
+    model = EmbeddingService._quantize_int8(service, "vision", fp32, "tiny")
+
+    assert model is fp32
+    assert _quantized_linears(model) == 0
+    assert service.quantization_agreement["vision"]["quantized"] is False
@@ -0,0 +1,84 @@
+"""Tests for the persistent QueryEmbeddingStore."""
+
+import os
+import time
+
+import numpy as np
+
+from services import query_embedding_store
+from services.query_embedding_store import QueryEmbeddingStore
+
+
+def _wait_for_compaction(store: QueryEmbeddingStore, count: int = 1):
+    deadline = time.monotonic() + 10
+    while store.stats()["compactions"] < count or store._compacting:
+        assert time.monotonic() < deadline, "compaction did not finish"
+        time.sleep(0.01)
+
+
+def test_embeddings_survive_a_new_store_instance(tmp_path):
+    store = QueryEmbeddingStore(str(tmp_path))
+    store.put("model-a", "boats", np.array([1.0, 2.0, 3.0]))
+    store.put("model-b", "boats", np.array([4.0, 5.0, 6.0]))
+
+    reopened = QueryEmbeddingStore(str(tmp_path), read_only=True)
+    assert reopened.get("model-a", "boats").tolist() == [1.0, 2.0, 3.0]
+    assert reopened.get("model-b", "boats").tolist() == [4.0, 5.0, 6.0]
+    assert reopened.get("model-a", "harbour") is None
+
+
+def test_newest_vector_wins_and_other_writers_are_seen(tmp_path):
+    reader = QueryEmbeddingStore(str(tmp_path))
+    writer = QueryEmbeddingStore(str(tmp_path))
+    writer.put("m", "q", [1.0, 1.0])
+    assert reader.get("m", "q").tolist() == [1.0, 1.0]
+
+    writer.put("m", "q", [2.0, 2.0])
+    assert reader.get("m", "q").tolist() == [2.0, 2.0]
+
+
+def test_mismatched_dimension_is_not_appended(tmp_path):
+    store = QueryEmbeddingStore(str(tmp_path))
+    store.put("m", "a", [1.0, 2.0])
+    store.put("m", "b", [1.0, 2.0, 3.0])
+    assert store.get("m", "b") is None
+    assert store.stats()["appends"] == 1
+
+
+def test_compaction_runs_in_the_background_and_keeps_the_newest_records(tmp_path):
+    store = QueryEmbeddingStore(str(tmp_path), max_records=8)
+    for i in range(8):
+        store.put("m", f"q{i}", [float(i)])
+    store.put("m", "q7", [70.0])
+    _wait_for_compaction(store)
+
+    # Trimmed to 3/4 of the cap, newest first, one record per key
+    size = os.path.getsize(store._path("m"))
+    assert (size - query_embedding_store.HEADER.size) // (query_embedding_store.KEY_SIZE + 4) == 6
+    assert store.get("m", "q7").tolist() == [70.0]
+    assert store.get("m", "q2").tolist() == [2.0]
+    assert store.get("m", "q1") is None
+
+
+def test_writer_reopens_a_file_replaced_while_it_waited_for_the_lock(tmp_path, monkeypatch):
+    store = QueryEmbeddingStore(str(tmp_path), max_records=100)
+    for i in range(4):
+        store.put("m", f"q{i}", [float(i)])
+
+    other = QueryEmbeddingStore(str(tmp_path), max_records=100)
+    real_flock = query_embedding_store.fcntl.flock
+    compacted = []
+
+    def flock_after_compaction(fd, operation):
+        # Another process compacts after this writer opened the file, before it locks it
+        if not compacted:
+            compacted.append(True)
+            other.compact("m")
+        return real_flock(fd, operation)
+
+    monkeypatch.setattr(query_embedding_store.fcntl, "flock", flock_after_compaction)
+    store.put("m", "late", [9.0])
+    monkeypatch.undo()
+
+    assert compacted
+    assert QueryEmbeddingStore(str(tmp_path)).get("m", "late").tolist() == [9.0]
@@ -0,0 +1,110 @@
+"""Tests for serve.py's model preloading and per-worker torch thread count."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+import serve
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_worker_threads_come_from_the_profile_else_a_core_share(monkeypatch):
+    monkeypatch.delenv("WORKER_TORCH_THREADS", raising=False)
+    monkeypatch.setenv("RUNTIME_PROFILE", "runtime-profiles/")
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+
+    assert serve._worker_torch_threads(2, {"torch_threads": 3}) == 3
+    # RUNTIME_PROFILE is set, but no profile matched the model
+    assert serve._worker_torch_threads(2, None) == 4
+
+
+def test_worker_torch_threads_overrides_the_core_share(monkeypatch):
+    monkeypatch.setenv("WORKER_TORCH_THREADS", "3")
+    assert serve._worker_torch_threads(2, {"torch_threads": 4}) == 3
+
+
+def test_forked_workers_run_the_preloaded_model_with_several_threads():
+    # The master quantizes the model (running its agreement check) before forking;
+    # a worker inheriting a started thread pool would hang on its first matmul
+    pytest.importorskip("torch")
+    pytest.importorskip("open_clip")
+    script = """
+import multiprocessing as mp
+
+import open_clip
+import torch
+
+import serve
+from services.embedding_service import EmbeddingService, sample_images
+
+MODEL = "xlm-roberta-large-ViT-H-14"
+
+
+class TinyClip(torch.nn.Module):
+    def __init__(self, dim=1024):
+        super().__init__()
+        torch.manual_seed(0)
+        self.token_embedding = torch.nn.Embedding(49408, 16)
+        self.text_projection = torch.nn.Linear(16, dim)
+        self.visual = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 8, kernel_size=4, stride=4),
+            torch.nn.Flatten(),
+            torch.nn.Linear(8 * 8 * 8, dim)
+        )
+
+    def encode_text(self, tokens):
+        return self.text_projection(self.token_embedding(tokens).mean(1))
+
+    def encode_image(self, pixels):
+        return self.visual(pixels)
+
+
+def load(self, checkpoint, empty=False):
+    return TinyClip().eval(), open_clip.get_tokenizer("ViT-B-32"), open_clip.image_transform(32, is_train=False)
+
+
+class ServeOnce:
+    # Stands in for uvicorn.Server: runs the model once inside the worker
+    def __init__(self, config):
+        pass
+
+    def run(self, sockets):
+        assert torch.get_num_threads() == 4
+        service.warmup()
+        service.encode_text(["bátar í höfn"] * 16)
+        service.encode_images_batch(sample_images(), batch_size=4)
+
+
+EmbeddingService._load_torch_checkpoint = load
+serve.uvicorn.Server = ServeOnce
+
+profile = {"torch_threads": 4}
+service = serve._preload_model(MODEL, 2, profile)
+assert service.quantize == "int8" and service.quantization_agreement
+assert service.runtime_profile == profile
+assert service.warmup_stats == {}
+assert torch.get_num_threads() == 1
+
+worker = mp.get_context("fork").Process(
+    target=serve._worker_main, args=(0, None, serve._worker_torch_threads(2, profile), "info")
+)
+worker.start()
+worker.join(60)
+if worker.is_alive():
+    worker.kill()
+    raise SystemExit("worker hung")
+assert worker.exitcode == 0, worker.exitcode
+"""
+    env = dict(
+        os.environ,
+        QUANTIZE="int8",
+        QUANTIZE_MIN_COSINE="0.5",
+        WARMUP_BATCH_SIZES="1,4",
+        DEVICE="cpu",
+        INFERENCE_BACKEND="torch",
+    )
+    env.pop("WORKER_TORCH_THREADS", None)
+    subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, env=env, check=True, timeout=180)
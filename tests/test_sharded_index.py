@@ -0,0 +1,79 @@
+"""Tests for ShardedIndex: merged results must match one unsharded index."""
+
+import os
+import signal
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from services.sharded_index import ShardedIndex, ShardUnavailable
+from services.vector_index import ExactIndex
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _vectors(count: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def sharded():
+    index = ShardedIndex("exact", shards=3, timeout_seconds=30)
+    yield index
+    index.shutdown()
+
+
+def test_merged_results_match_an_unsharded_index(sharded, tmp_path):
+    vectors = _vectors(1000)
+    single = ExactIndex(storage_dir=str(tmp_path))
+    single.add(np.arange(1000), vectors)
+    sharded.add(np.arange(1000), vectors)
+    removed = np.arange(0, 1000, 7)
+    single.remove(removed)
+    sharded.remove(removed)
+
+    allowed = np.random.default_rng(1).random(1000) < 0.3
+    assert len(sharded) == len(single)
+    for query in _vectors(5, seed=2):
+        for mask in (None, allowed):
+            expected_slots, expected_scores = single.search(query, 10, mask)
+            slots, scores = sharded.search(query, 10, mask)
+            assert slots.tolist() == expected_slots.tolist()
+            np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+
+def test_a_dead_shard_fails_calls_instead_of_hanging(sharded):
+    sharded.add(np.arange(30), _vectors(30))
+    os.kill(sharded._workers[1].pid, signal.SIGKILL)
+    sharded._workers[1].join(timeout=5)
+
+    with pytest.raises(ShardUnavailable):
+        sharded.search(_vectors(1)[0], 5)
+    assert sharded.stats()["per_shard"][1]["alive"] is False
+
+
+def test_interpreter_exits_with_requests_stuck_for_a_dead_shard():
+    # A batch larger than the pipe is queued for a stopped shard, which is then killed;
+    # exit must not wait for the queue's feeder thread to flush it
+    script = """
+import os, signal
+import numpy as np
+from services.sharded_index import ShardedIndex, ShardUnavailable
+
+index = ShardedIndex("exact", shards=2, timeout_seconds=5)
+shard = index._workers[0]
+os.kill(shard.pid, signal.SIGSTOP)
+rows = np.arange(0, 200000, 2)
+call = index._call(0, "add", rows, np.ones((len(rows), 64), dtype=np.float32))
+os.kill(shard.pid, signal.SIGKILL)
+shard.join()
+try:
+    index._wait([call])
+except ShardUnavailable:
+    pass
+index.shutdown()
+"""
+    subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, check=True, timeout=60)
@@ -0,0 +1,77 @@
+"""Tests for SingleFlight request collapsing."""
+
+import asyncio
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*(flight.run("key", compute) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "shared": 4}
+
+
+def test_different_keys_and_later_calls_compute_again():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def run():
+        first = await asyncio.gather(flight.run("a", lambda: compute("a")), flight.run("b", lambda: compute("b")))
+        # The key is forgotten once the computation finishes
+        second = await flight.run("a", lambda: compute("a"))
+        return first, second
+
+    assert asyncio.run(run()) == (["a", "b"], "a")
+    assert calls == ["a", "b", "a"]
+
+
+def test_exceptions_reach_every_caller_and_the_key_is_released():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(flight.run("key", fail), flight.run("key", fail), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_computation():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        leader = asyncio.create_task(flight.run("key", compute))
+        follower = asyncio.create_task(flight.run("key", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "done"
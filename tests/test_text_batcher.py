@@ -0,0 +1,97 @@
+"""Tests for the TextBatcher micro-batching scheduler."""
+
+import asyncio
+
+import numpy as np
+
+from services.text_batcher import TextBatcher
+
+
+class RecordingEncoder:
+    """encode_batch stand-in that records each batch; the vector holds the text length."""
+
+    def __init__(self, delay: float = 0.0, error: Exception = None):
+        self.batches = []
+        self.delay = delay
+        self.error = error
+
+    async def __call__(self, texts):
+        self.batches.append(list(texts))
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return np.array([[len(text), index] for index, text in enumerate(texts)], dtype=np.float32)
+
+
+def test_concurrent_queries_share_one_call_and_get_their_own_rows():
+    encoder = RecordingEncoder()
+
+    async def run():
+        batcher = TextBatcher(encoder, max_batch_size=8, max_wait_ms=50)
+        return batcher, await asyncio.gather(*(batcher.encode(text) for text in ["a", "bb", "ccc"]))
+
+    batcher, vectors = asyncio.run(run())
+    assert encoder.batches == [["a", "bb", "ccc"]]
+    assert [vector[0] for vector in vectors] == [1, 2, 3]
+    assert batcher.stats()["avg_batch_size"] == 3
+
+
+def test_identical_texts_in_a_batch_are_encoded_once():
+    encoder = RecordingEncoder()
+
+    async def run():
+        batcher = TextBatcher(encoder, max_batch_size=8)
+        return await asyncio.gather(*(batcher.encode(text) for text in ["x", "y", "x"]))
+
+    vectors = asyncio.run(run())
+    assert encoder.batches == [["x", "y"]]
+    assert np.array_equal(vectors[0], vectors[2])
+
+
+def test_batches_are_capped_at_max_batch_size():
+    encoder = RecordingEncoder()
+
+    async def run():
+        batcher = TextBatcher(encoder, max_batch_size=2)
+        await asyncio.gather(*(batcher.encode(str(i)) for i in range(5)))
+
+    asyncio.run(run())
+    assert [len(batch) for batch in encoder.batches] == [2, 2, 1]
+
+
+def test_queries_arriving_while_the_model_is_busy_wait_for_a_batch():
+    encoder = RecordingEncoder(delay=0.05)
+
+    async def run():
+        batcher = TextBatcher(encoder, max_batch_size=8, max_wait_ms=20)
+        first = asyncio.ensure_future(batcher.encode("first"))
+        await asyncio.sleep(0.01)
+        await asyncio.gather(first, batcher.encode("second"), batcher.encode("third"))
+
+    asyncio.run(run())
+    assert encoder.batches == [["first"], ["second", "third"]]
+
+
+def test_encode_errors_reach_every_caller():
+    encoder = RecordingEncoder(error=RuntimeError("model failed"))
+
+    async def run():
+        batcher = TextBatcher(encoder)
+        return await asyncio.gather(batcher.encode("a"), batcher.encode("b"), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert [str(result) for result in results] == ["model failed", "model failed"]
+
+
+def test_running_batches_are_held_until_they_finish():
+    encoder = RecordingEncoder(delay=0.05)
+
+    async def run():
+        batcher = TextBatcher(encoder, max_batch_size=2, max_wait_ms=50)
+        pending = [asyncio.ensure_future(batcher.encode(text)) for text in ["a", "b"]]
+        await asyncio.sleep(0.01)
+        held = len(batcher._tasks)
+        await asyncio.gather(*pending)
+        return held, len(batcher._tasks)
+
+    assert asyncio.run(run()) == (1, 0)
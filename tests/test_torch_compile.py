@@ -0,0 +1,41 @@
+"""Tests for per-module torch.compile with eager fallback."""
+
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from services.embedding_service import EmbeddingService  # noqa: E402
+
+
+def test_compiler_errors_fall_back_to_eager_for_that_module_only(monkeypatch):
+    def failing_compile(fn, *args, **kwargs):
+        def compiled(*call_args, **call_kwargs):
+            raise torch._dynamo.exc.TorchDynamoException("unsupported op")
+        return compiled
+
+    monkeypatch.setattr(torch, "compile", failing_compile)
+    service = SimpleNamespace(compile_fallbacks=[])
+    module = torch.nn.Linear(4, 2)
+    EmbeddingService._compile_module(service, module, "text[0] Linear")
+
+    inputs = torch.ones(1, 4)
+    expected = torch.nn.functional.linear(inputs, module.weight, module.bias)
+    assert torch.equal(module(inputs), expected)
+    assert service.compile_fallbacks == ["text[0] Linear"]
+
+    # Later calls go straight to eager
+    assert torch.equal(module(inputs), expected)
+    assert service.compile_fallbacks == ["text[0] Linear"]
+
+
+def test_other_errors_are_not_suppressed(monkeypatch):
+    monkeypatch.setattr(torch, "compile", lambda fn, *args, **kwargs: fn)
+    service = SimpleNamespace(compile_fallbacks=[])
+    module = torch.nn.Linear(4, 2)
+    EmbeddingService._compile_module(service, module, "vision[0] Linear")
+
+    with pytest.raises(RuntimeError):
+        module(torch.ones(1, 3))
+    assert service.compile_fallbacks == []
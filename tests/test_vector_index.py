@@ -0,0 +1,271 @@
+"""Tests for the local vector indexes: results are checked against a brute-force search."""
+
+import numpy as np
+import pytest
+
+from services import vector_index
+from services.vector_index import ExactIndex, HnswIndex, IvfPqIndex
+
+
+def _vectors(count: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _brute_force(vectors: np.ndarray, query: np.ndarray, k: int, allowed=None) -> list:
+    """Top-k slots by cosine similarity, among allowed slots."""
+    scores = vectors @ query
+    if allowed is not None:
+        scores = np.where(allowed[:len(vectors)], scores, -np.inf)
+    order = np.argsort(-scores, kind="stable")[:k]
+    return [int(slot) for slot in order if np.isfinite(scores[slot])]
+
+
+@pytest.mark.parametrize("block_rows", [64, 65536])
+def test_exact_index_matches_brute_force_across_blocks(block_rows, tmp_path):
+    vectors = _vectors(1000)
+    index = ExactIndex(block_rows=block_rows, storage_dir=str(tmp_path))
+    index.add(np.arange(1000), vectors)
+
+    for query in _vectors(5, seed=1):
+        slots, scores = index.search(query, 10)
+        assert slots.tolist() == _brute_force(vectors, query, 10)
+        assert np.all(np.diff(scores) <= 0)
+        np.testing.assert_allclose(scores, vectors[slots] @ query, rtol=1e-5)
+
+
+@pytest.mark.parametrize("keep_every", [3, 400])
+def test_exact_index_applies_filters_in_both_scoring_paths(keep_every, monkeypatch, tmp_path):
+    # A small EXACT_FILTER_MAX_ROWS sends dense filters through the masked block scan
+    monkeypatch.setattr(vector_index, "EXACT_FILTER_MAX_ROWS", 10)
+    vectors = _vectors(1000)
+    index = ExactIndex(block_rows=128, storage_dir=str(tmp_path))
+    index.add(np.arange(1000), vectors)
+    allowed = np.zeros(1000, dtype=bool)
+    allowed[::keep_every] = True
+
+    query = _vectors(1, seed=2)[0]
+    slots, _ = index.search(query, 10, allowed)
+    assert slots.tolist() == _brute_force(vectors, query, 10, allowed)
+
+
+def test_exact_index_replaces_and_removes_rows(tmp_path):
+    vectors = _vectors(200)
+    index = ExactIndex(block_rows=64, storage_dir=str(tmp_path))
+    index.add(np.arange(200), vectors)
+    query = vectors[5]
+
+    index.remove(np.array([5, 5000]))
+    assert len(index) == 199
+    assert 5 not in index.search(query, 10)[0].tolist()
+
+    # Replacing a row moves it; re-adding a removed one brings it back
+    index.add(np.array([7, 5]), np.stack([query, query]))
+    assert len(index) == 200
+    assert sorted(index.search(query, 2)[0].tolist()) == [5, 7]
+
+
+def test_exact_index_grows_for_slots_past_its_capacity(tmp_path):
+    index = ExactIndex(storage_dir=str(tmp_path))
+    vectors = _vectors(2)
+    index.add(np.array([0]), vectors[:1])
+    index.add(np.array([5000]), vectors[1:])
+
+    assert len(index) == 2
+    assert index.stats()["capacity"] > 5000
+    assert index.search(vectors[1], 1)[0].tolist() == [5000]
+
+
+def test_exact_index_round_trips_through_save_and_load(tmp_path):
+    vectors = _vectors(300)
+    index = ExactIndex(storage_dir=str(tmp_path))
+    index.add(np.arange(300), vectors)
+    index.remove(np.arange(0, 300, 2))
+    index.save(str(tmp_path / "saved"))
+
+    loaded = ExactIndex(storage_dir=str(tmp_path))
+    loaded.load(str(tmp_path / "saved"))
+    query = _vectors(1, seed=3)[0]
+    assert len(loaded) == 150
+    assert loaded.search(query, 10)[0].tolist() == index.search(query, 10)[0].tolist()
+
+
+def test_empty_exact_index_returns_nothing():
+    slots, scores = ExactIndex().search(_vectors(1)[0], 5)
+    assert len(slots) == len(scores) == 0
+
+
+def _hnsw(**params) -> HnswIndex:
+    pytest.importorskip("hnswlib")
+    defaults = dict(m=16, ef_construction=200, ef_search=64, build_threads=1)
+    return HnswIndex(**{**defaults, **params})
+
+
+def _recall(index, vectors: np.ndarray, queries: np.ndarray, k: int = 10, allowed=None) -> float:
+    hits = 0
+    for query in queries:
+        slots, scores = index.search(query, k, allowed)
+        hits += len(set(slots.tolist()) & set(_brute_force(vectors, query, k, allowed)))
+        # hnswlib reports 1 - inner product; the index turns it back into the score
+        np.testing.assert_allclose(scores, vectors[slots] @ query, rtol=1e-4, atol=1e-5)
+    return hits / (k * len(queries))
+
+
+def test_hnsw_index_recall_against_brute_force():
+    vectors = _vectors(2000)
+    index = _hnsw()
+    index.add(np.arange(2000), vectors)
+
+    assert len(index) == 2000
+    assert _recall(index, vectors, _vectors(20, seed=1)) >= 0.9
+
+
+def test_hnsw_index_replaces_removes_and_restores_rows():
+    vectors = _vectors(500)
+    index = _hnsw()
+    index.add(np.arange(500), vectors)
+    query = vectors[5]
+
+    index.remove(np.array([5, 5000]))
+    assert len(index) == 499
+    assert 5 not in index.search(query, 10)[0].tolist()
+
+    # Replacing a live row moves it; re-adding the marked-deleted label restores it
+    index.add(np.array([7, 5]), np.stack([query, query]))
+    assert len(index) == 500
+    slots, scores = index.search(query, 2)
+    assert sorted(slots.tolist()) == [5, 7]
+    np.testing.assert_allclose(scores, [1.0, 1.0], rtol=1e-5)
+
+    # Slots past the capacity grow the graph
+    index.add(np.array([5000]), -query[None, :])
+    assert len(index) == 501
+    assert index.stats()["capacity"] > 5000
+    assert index.search(-query, 1)[0].tolist() == [5000]
+
+
+def test_hnsw_index_filters_through_the_graph_walk(monkeypatch):
+    # A small EXACT_FILTER_MAX_ROWS sends the filter into hnswlib's filter callback
+    monkeypatch.setattr(vector_index, "EXACT_FILTER_MAX_ROWS", 10)
+    vectors = _vectors(2000)
+    index = _hnsw()
+    index.add(np.arange(2000), vectors)
+    index.remove(np.array([3, 6]))
+    allowed = np.zeros(2000, dtype=bool)
+    allowed[::3] = True
+
+    def no_exact_scoring(*args):
+        raise AssertionError("the filtered search fell back to exact scoring")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(HnswIndex, "_score_rows", no_exact_scoring)
+        queries = _vectors(10, seed=2)
+        for query in queries:
+            slots = index.search(query, 10, allowed)[0].tolist()
+            assert len(slots) == 10
+            assert all(allowed[slot] for slot in slots)
+            assert not {3, 6} & set(slots)
+
+        present = allowed.copy()
+        present[[3, 6]] = False
+        assert _recall(index, vectors, queries, allowed=present) >= 0.9
+
+
+def test_hnsw_index_scores_small_filters_exactly():
+    vectors = _vectors(2000)
+    index = _hnsw()
+    index.add(np.arange(2000), vectors)
+    allowed = np.zeros(2000, dtype=bool)
+    allowed[::100] = True
+
+    query = _vectors(1, seed=2)[0]
+    assert index.search(query, 10, allowed)[0].tolist() == _brute_force(vectors, query, 10, allowed)
+
+
+def test_hnsw_index_round_trips_through_save_and_load(tmp_path):
+    vectors = _vectors(1000)
+    index = _hnsw()
+    index.add(np.arange(1000), vectors)
+    index.remove(np.arange(0, 1000, 2))
+    index.save(str(tmp_path / "saved"))
+
+    loaded = _hnsw()
+    loaded.load(str(tmp_path / "saved"))
+    assert len(loaded) == 500
+    assert loaded.stats()["capacity"] == index.stats()["capacity"]
+    for query in _vectors(5, seed=3):
+        slots = loaded.search(query, 10)[0].tolist()
+        assert slots == index.search(query, 10)[0].tolist()
+        assert all(slot % 2 == 1 for slot in slots)
+
+    # The loaded graph keeps taking updates
+    loaded.add(np.array([0]), vectors[1:2])
+    assert len(loaded) == 501
+    assert sorted(loaded.search(vectors[1], 2)[0].tolist()) == [0, 1]
+
+
+def test_empty_hnsw_index_returns_nothing():
+    slots, scores = _hnsw().search(_vectors(1)[0], 5)
+    assert len(slots) == len(scores) == 0
+
+
+def _ivfpq(tmp_path, **params) -> IvfPqIndex:
+    defaults = dict(nlist=16, nprobe=8, rerank=100, train_size=2000, train_iterations=8, storage_dir=str(tmp_path))
+    return IvfPqIndex(**{**defaults, **params})
+
+
+def test_ivfpq_index_is_exact_until_trained(tmp_path):
+    vectors = _vectors(500)
+    index = _ivfpq(tmp_path)
+    index.add(np.arange(500), vectors)
+
+    assert not index.trained
+    query = _vectors(1, seed=1)[0]
+    assert index.search(query, 10)[0].tolist() == _brute_force(vectors, query, 10)
+
+
+def test_ivfpq_index_recall_after_training(tmp_path):
+    vectors = _vectors(3000)
+    index = _ivfpq(tmp_path)
+    index.add(np.arange(3000), vectors)
+    assert index.trained
+
+    hits = 0
+    for query in _vectors(20, seed=1):
+        slots, scores = index.search(query, 10)
+        hits += len(set(slots.tolist()) & set(_brute_force(vectors, query, 10)))
+        # Reranked scores are exact
+        np.testing.assert_allclose(scores, vectors[slots] @ query, rtol=1e-5)
+    assert hits / 200 >= 0.8
+    assert index.measure_recall() >= 0.8
+
+
+def test_ivfpq_index_filters_updates_and_removals_after_training(tmp_path):
+    vectors = _vectors(3000)
+    index = _ivfpq(tmp_path)
+    index.add(np.arange(3000), vectors)
+    query = _vectors(1, seed=2)[0]
+
+    # A strict filter is scored exactly
+    allowed = np.zeros(3000, dtype=bool)
+    allowed[::100] = True
+    assert index.search(query, 10, allowed)[0].tolist() == _brute_force(vectors, query, 10, allowed)
+
+    # Rows added after training are encoded and found; removed ones never come back
+    index.add(np.array([5000]), query[None, :])
+    assert index.search(query, 1)[0].tolist() == [5000]
+    index.remove(np.array([5000]))
+    assert 5000 not in index.search(query, 10)[0].tolist()
+
+
+def test_ivfpq_index_round_trips_through_save_and_load(tmp_path):
+    vectors = _vectors(3000)
+    index = _ivfpq(tmp_path)
+    index.add(np.arange(3000), vectors)
+    index.save(str(tmp_path / "saved"))
+
+    loaded = _ivfpq(tmp_path)
+    loaded.load(str(tmp_path / "saved"))
+    assert loaded.trained and len(loaded) == 3000
+    for query in _vectors(5, seed=3):
+        assert loaded.search(query, 10)[0].tolist() == index.search(query, 10)[0].tolist()
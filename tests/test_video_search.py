@@ -0,0 +1,181 @@
+"""Tests for video frame sampling and the /search/video endpoint."""
+
+import asyncio
+from io import BytesIO
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+av = pytest.importorskip("av")
+
+import main  # noqa: E402
+from services.inference_executor import InferenceExecutor  # noqa: E402
+from services.model_registry import LoadedModel, ModelRegistry  # noqa: E402
+from services.video_decoding import VideoDecodeError, sample_frames  # noqa: E402
+
+MODEL = "clip-ViT-B-32-multilingual-v1"
+
+RED, GREEN, BLUE, GRAY = (255, 0, 0), (0, 255, 0), (0, 0, 255), (128, 128, 128)
+
+
+def _clip(colors, fps: int = 10, width: int = 160, height: int = 120) -> bytes:
+    """Encode an MP4 that shows each color for one second."""
+    buffer = BytesIO()
+    with av.open(buffer, mode="w", format="mp4") as container:
+        stream = container.add_stream("mpeg4", rate=fps)
+        stream.width, stream.height, stream.pix_fmt = width, height, "yuv420p"
+        for color in colors:
+            pixels = np.full((height, width, 3), color, dtype=np.uint8)
+            for _ in range(fps):
+                for packet in stream.encode(av.VideoFrame.from_ndarray(pixels, format="rgb24")):
+                    container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+    return buffer.getvalue()
+
+
+def _color(image) -> np.ndarray:
+    return np.asarray(image, dtype=np.float32).reshape(-1, 3).mean(axis=0)
+
+
+def test_frames_are_sampled_at_the_requested_rate():
+    frames = sample_frames(_clip([RED, GREEN, BLUE, GRAY]), sample_fps=1.0, target_size=60)
+    assert len(frames) == 4
+    for frame, color in zip(frames, [RED, GREEN, BLUE, GRAY]):
+        assert frame.mode == "RGB"
+        # Scaled so the shorter side matches the model input
+        assert frame.size == (80, 60)
+        np.testing.assert_allclose(_color(frame), color, atol=12)
+
+    assert len(sample_frames(_clip([RED, GREEN]), sample_fps=2.0)) == 4
+    # Never upscaled
+    assert sample_frames(_clip([RED]), target_size=224)[0].size == (160, 120)
+
+
+def test_frame_count_and_duration_are_capped():
+    clip = _clip([RED, GREEN, BLUE, GRAY])
+    assert len(sample_frames(clip, sample_fps=4.0, max_frames=3)) == 3
+
+    frames = sample_frames(clip, sample_fps=1.0, max_duration_seconds=1.5)
+    assert len(frames) == 2
+    np.testing.assert_allclose(_color(frames[1]), GREEN, atol=12)
+
+
+def test_unreadable_clips_are_rejected():
+    with pytest.raises(VideoDecodeError):
+        sample_frames(b"not a video")
+
+
+class FrameColorService:
+    """Embeds each frame as its normalized mean color."""
+
+    model_name = MODEL
+    embedding_dim = 3
+    runtime_profile = None
+
+    def __init__(self):
+        self.calls = 0
+
+    def memory_bytes(self) -> int:
+        return 0
+
+    def is_loaded(self, tower: str) -> bool:
+        return True
+
+    def encode_images_batch(self, images, batch_size: int = 8, as_numpy: bool = False):
+        self.calls += 1
+        colors = np.stack([_color(image) for image in images])
+        return colors / np.linalg.norm(colors, axis=1, keepdims=True)
+
+
+class ColorDatabase:
+    """Holds one red, one green and one blue item and scores them against each query."""
+
+    ITEMS = {"red": RED, "green": GREEN, "blue": BLUE}
+
+    def __init__(self):
+        self.queries = []
+
+    async def search_by_embedding(self, embedding, limit, **kwargs):
+        self.queries.append(np.asarray(embedding))
+        results = []
+        for item_id, color in self.ITEMS.items():
+            vector = np.asarray(color, dtype=np.float32) / 255.0
+            results.append({
+                "id": item_id,
+                "filename": f"{item_id}.jpg",
+                "file_type": "image",
+                "storage_path": f"media/{item_id}.jpg",
+                "similarity_score": float(np.dot(embedding, vector)),
+            })
+        return sorted(results, key=lambda result: result["similarity_score"], reverse=True)[:limit]
+
+
+@pytest.fixture
+def video_api(monkeypatch):
+    service = FrameColorService()
+    database = ColorDatabase()
+    executor = InferenceExecutor(service, max_workers=1, max_queue=8)
+    registry = ModelRegistry(loader=None, default=LoadedModel(service, executor, batcher=None))
+    monkeypatch.setattr(main, "embedding_service", service)
+    monkeypatch.setattr(main, "model_registry", registry)
+    monkeypatch.setattr(main, "get_search_service", lambda: database)
+    monkeypatch.setattr(main, "video_decode_slots", asyncio.Semaphore(1))
+    yield TestClient(main.app), service, database
+    executor.shutdown()
+
+
+def _search(client, clip: bytes, **params):
+    return client.post("/search/video", params=params, files={"video": ("clip.mp4", clip, "video/mp4")})
+
+
+def test_max_pooling_searches_every_frame_and_keeps_each_items_best_score(video_api):
+    client, _, database = video_api
+    response = _search(client, _clip([RED, GREEN, BLUE]), pooling="max", sample_fps=1.0)
+    assert response.status_code == 200
+    body = response.json()
+
+    assert body["frames_sampled"] == 3
+    assert len(database.queries) == 3
+    # Every item has a frame of its own color
+    assert {result["id"] for result in body["results"]} == {"red", "green", "blue"}
+    assert all(result["similarity_score"] > 0.95 for result in body["results"])
+
+
+def test_mean_pooling_runs_one_search(video_api):
+    client, _, database = video_api
+    response = _search(client, _clip([RED, GREEN, BLUE]), pooling="mean", sample_fps=1.0)
+    assert response.status_code == 200
+    body = response.json()
+
+    assert len(database.queries) == 1
+    assert np.linalg.norm(database.queries[0]) == pytest.approx(1.0)
+    # The pooled query sits between the three colors
+    for result in body["results"]:
+        assert result["similarity_score"] == pytest.approx(1 / np.sqrt(3), abs=0.05)
+
+
+def test_busy_decode_slots_fail_fast_without_taking_the_model(video_api, monkeypatch):
+    client, service, _ = video_api
+    monkeypatch.setattr(main, "video_decode_slots", asyncio.Semaphore(0))
+    monkeypatch.setattr(main, "VIDEO_DECODE_WAIT_SECONDS", 0.05)
+
+    def decode_not_expected(*args, **kwargs):
+        raise AssertionError("decoded without a slot")
+
+    monkeypatch.setattr(main, "sample_frames", decode_not_expected)
+    response = _search(client, _clip([RED]))
+    assert response.status_code == 503
+    assert "retry" in response.json()["detail"]
+    assert service.calls == 0
+
+
+def test_a_failed_decode_releases_its_slot(video_api):
+    client, _, _ = video_api
+    response = _search(client, b"not a video")
+    assert response.status_code == 400
+    assert "Invalid video" in response.json()["detail"]
+
+    # The only slot is free again
+    assert _search(client, _clip([RED])).status_code == 200
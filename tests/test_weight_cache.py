@@ -0,0 +1,185 @@
+"""Tests for the memory-mapped safetensors weight cache."""
+
+import os
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("safetensors")
+open_clip = pytest.importorskip("open_clip")
+
+from services import weight_cache  # noqa: E402
+from services.embedding_service import EmbeddingService, sample_images  # noqa: E402
+from services.weight_cache import (  # noqa: E402
+    WeightCacheError,
+    assign_weights,
+    load_weights,
+    save_weights,
+    weight_cache_path,
+)
+
+MODEL = "xlm-roberta-large-ViT-H-14"
+
+
+class TinyClip(torch.nn.Module):
+    """Dual-tower model with OpenCLIP submodule names, a tied weight and a non-persistent buffer."""
+
+    def __init__(self, dim: int = 1024):
+        super().__init__()
+        self.token_embedding = torch.nn.Embedding(49408, 16)
+        self.text_projection = torch.nn.Linear(16, dim)
+        self.visual = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 8, kernel_size=4, stride=4),
+            torch.nn.Flatten(),
+            torch.nn.Linear(8 * 8 * 8, dim)
+        )
+        self.tied = torch.nn.Linear(16, 49408, bias=False)
+        self.tied.weight = self.token_embedding.weight
+        self.register_buffer("scale", torch.tensor(2.0), persistent=False)
+
+    def encode_text(self, tokens):
+        return self.text_projection(self.token_embedding(tokens).mean(1)) * self.scale
+
+    def encode_image(self, pixels):
+        return self.visual(pixels) * self.scale
+
+
+def _tiny_clip(empty: bool = False) -> TinyClip:
+    torch.manual_seed(0)
+    if empty:
+        with torch.device("meta"):
+            return TinyClip().eval()
+    model = TinyClip().eval()
+    # Only a real checkpoint fills the non-persistent buffer
+    model.scale.fill_(3.0)
+    return model
+
+
+def _mapped_files(tensor: torch.Tensor) -> set:
+    """Return the files whose mappings contain the tensor's data."""
+    address = tensor.data_ptr()
+    files = set()
+    with open("/proc/self/maps") as f:
+        for line in f:
+            fields = line.split()
+            start, end = (int(value, 16) for value in fields[0].split("-"))
+            if start <= address < end and len(fields) >= 6:
+                files.add(fields[5])
+    return files
+
+
+@pytest.fixture
+def checkpoint_loads(monkeypatch):
+    """Replace checkpoint loading with TinyClip and record whether each load was empty."""
+    loads = []
+
+    def load(self, checkpoint, empty=False):
+        loads.append(empty)
+        tokenizer = open_clip.get_tokenizer("ViT-B-32")
+        return _tiny_clip(empty), tokenizer, open_clip.image_transform(32, is_train=False)
+
+    monkeypatch.setattr(EmbeddingService, "_load_torch_checkpoint", load)
+    return loads
+
+
+def _service(tmp_path) -> EmbeddingService:
+    return EmbeddingService(
+        MODEL, device="cpu", preload_vision=True, weight_cache=True, weight_cache_dir=str(tmp_path)
+    )
+
+
+def test_weights_round_trip_through_a_mapped_file(tmp_path):
+    path = str(tmp_path / "tiny.safetensors")
+    model = _tiny_clip()
+    save_weights(model, path, metadata={"checkpoint": "tiny"})
+
+    tensors = load_weights(path)
+    assert torch.equal(tensors["visual.2.weight"], model.visual[2].weight)
+    assert torch.equal(tensors["scale"], model.scale)
+    # Tied weights are stored once and share their tensor after loading
+    assert tensors["tied.weight"] is tensors["token_embedding.weight"]
+    assert _mapped_files(tensors["visual.2.weight"]) == {path}
+
+    skeleton = _tiny_clip(empty=True)
+    assign_weights(skeleton, tensors)
+    assert skeleton.visual[2].weight.data_ptr() == tensors["visual.2.weight"].data_ptr()
+    assert skeleton.tied.weight.data_ptr() == skeleton.token_embedding.weight.data_ptr()
+    assert skeleton.scale.item() == 3.0
+
+    pixels = torch.rand(2, 3, 32, 32)
+    with torch.no_grad():
+        assert torch.equal(skeleton.encode_image(pixels), model.encode_image(pixels))
+
+
+def test_unusable_files_are_rejected(tmp_path, monkeypatch):
+    path = str(tmp_path / "tiny.safetensors")
+    save_weights(_tiny_clip(), path)
+
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) // 2)
+    with pytest.raises(WeightCacheError, match="truncated"):
+        load_weights(path)
+
+    with open(path, "wb") as f:
+        f.write(b"not a safetensors file")
+    with pytest.raises(WeightCacheError):
+        load_weights(path)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(weight_cache, "WEIGHT_CACHE_VERSION", "0")
+        save_weights(_tiny_clip(), path)
+    with pytest.raises(WeightCacheError, match="version"):
+        load_weights(path)
+
+    with pytest.raises(WeightCacheError, match="missing"):
+        assign_weights(_tiny_clip(empty=True), {"scale": torch.tensor(1.0)})
+
+
+def test_service_converts_then_maps_the_cache(tmp_path, checkpoint_loads):
+    first = _service(tmp_path)
+    assert {tower: stats["weight_cache"] for tower, stats in first.tower_status().items()} == {
+        "text": "converted", "vision": "converted"
+    }
+    assert checkpoint_loads == [False, False]
+    vision_path = weight_cache_path(str(tmp_path), MODEL, "vision")
+    assert _mapped_files(first.vision_model.visual[2].weight) == {vision_path}
+
+    second = _service(tmp_path)
+    assert {tower: stats["weight_cache"] for tower, stats in second.tower_status().items()} == {
+        "text": "hit", "vision": "hit"
+    }
+    # The hit builds empty skeletons; every weight comes from the files
+    assert checkpoint_loads[2:] == [True, True]
+    assert second.vision_model.scale.item() == 3.0
+
+    images = sample_images()
+    np.testing.assert_array_equal(
+        first.encode_images_batch(images, as_numpy=True), second.encode_images_batch(images, as_numpy=True)
+    )
+    np.testing.assert_array_equal(
+        first.encode_text(["bátar í höfn"], as_numpy=True), second.encode_text(["bátar í höfn"], as_numpy=True)
+    )
+
+
+@pytest.mark.parametrize("damage", ["truncate", "stale"])
+def test_service_rebuilds_a_damaged_cache(tmp_path, checkpoint_loads, monkeypatch, damage):
+    reference = _service(tmp_path).encode_images_batch(sample_images(), as_numpy=True)
+    path = weight_cache_path(str(tmp_path), MODEL, "vision")
+
+    if damage == "truncate":
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 100)
+    else:
+        # A file from an older cache layout
+        with monkeypatch.context() as patch:
+            patch.setattr(weight_cache, "WEIGHT_CACHE_VERSION", "0")
+            save_weights(_tiny_clip(), path)
+
+    service = _service(tmp_path)
+    assert service.tower_status()["text"]["weight_cache"] == "hit"
+    assert service.tower_status()["vision"]["weight_cache"] == "converted"
+    np.testing.assert_array_equal(service.encode_images_batch(sample_images(), as_numpy=True), reference)
+
+    # The rebuilt file maps on the next boot
+    assert _service(tmp_path).tower_status()["vision"]["weight_cache"] == "hit"
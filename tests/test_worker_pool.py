@@ -0,0 +1,167 @@
+"""Tests for the multi-process WorkerPool."""
+
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services import worker_pool
+from services.inference_executor import InferenceQueueFull
+from services.worker_pool import WorkerPool, WorkersUnavailable
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeEmbeddingService:
+    """Stands in for EmbeddingService: the vector encodes the input length."""
+
+    embedding_dim = 8
+    warmed_up = False
+
+    def share_memory(self):
+        pass
+
+    def warmup(self):
+        self.warmed_up = True
+
+    def encode_image(self, data: bytes, as_numpy: bool = False):
+        if data == b"warmed-up?":
+            return np.full(self.embedding_dim, float(self.warmed_up), dtype=np.float32)
+        if data == b"exit":
+            os._exit(3)
+        if data == b"slow":
+            time.sleep(1)
+        return np.full(self.embedding_dim, len(data), dtype=np.float32)
+
+    def encode_text(self, texts, as_numpy: bool = False):
+        return np.arange(len(texts) * self.embedding_dim, dtype=np.float32).reshape(len(texts), -1)
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(FakeEmbeddingService(), num_workers=2, max_queue=2, max_rows=4, request_bytes=1024)
+    yield pool
+    pool.shutdown()
+
+
+def test_results_through_the_rings(pool):
+    async def calls():
+        small = await pool.run("encode_image", b"x" * 100, as_numpy=True)
+        # Too large for a request slot: pickled instead
+        large = await pool.run("encode_image", b"x" * 5000)
+        # Too many rows for a response slot: pickled instead
+        texts = await pool.run("encode_text", ["a"] * 6, as_numpy=True)
+        return small, large, texts
+
+    small, large, texts = asyncio.run(calls())
+    assert small.tolist() == [100.0] * 8
+    assert large == [5000.0] * 8
+    assert texts.shape == (6, 8) and texts[5, 7] == 47
+
+
+def test_workers_warm_up_after_the_fork():
+    service = FakeEmbeddingService()
+    pool = WorkerPool(service, num_workers=2, max_queue=2, request_bytes=1024)
+    try:
+        async def calls():
+            return await asyncio.gather(*(pool.run("encode_image", b"warmed-up?") for _ in range(2)))
+
+        assert all(result[0] == 1.0 for result in asyncio.run(calls()))
+        assert not service.warmed_up
+    finally:
+        pool.shutdown()
+
+
+def test_rejects_when_every_slot_is_taken(pool):
+    async def calls():
+        return await asyncio.gather(
+            *(pool.run("encode_image", b"slow") for _ in range(5)), return_exceptions=True
+        )
+
+    results = asyncio.run(calls())
+    assert sum(isinstance(result, InferenceQueueFull) for result in results) == 1
+    assert pool.stats()["rejected"] == 1
+
+
+def test_exited_worker_fails_its_calls_and_leaves_rotation(pool):
+    async def calls():
+        slow = asyncio.ensure_future(pool.run("encode_image", b"slow"))
+        await asyncio.sleep(0.1)
+        with pytest.raises(WorkersUnavailable):
+            await pool.run("encode_image", b"exit")
+        # The other worker keeps serving
+        assert (await slow)[0] == 4.0
+        assert (await pool.run("encode_image", b"ok"))[0] == 2.0
+
+        survivor = next(worker for worker in pool._workers if worker.is_alive())
+        pending = asyncio.ensure_future(pool.run("encode_image", b"slow"))
+        await asyncio.sleep(0.1)
+        os.kill(survivor.pid, signal.SIGKILL)
+        with pytest.raises(WorkersUnavailable):
+            await pending
+        with pytest.raises(WorkersUnavailable):
+            await pool.run("encode_image", b"ok")
+
+    asyncio.run(asyncio.wait_for(calls(), timeout=20))
+    stats = pool.stats()
+    assert stats["workers_alive"] == 0
+    assert stats["crashed"] == 2
+
+
+def test_more_than_one_torch_thread_is_refused():
+    with pytest.raises(ValueError):
+        WorkerPool(FakeEmbeddingService(), num_workers=1, torch_threads=2)
+
+
+def test_missing_shared_memory_fails_with_a_clear_error(monkeypatch):
+    monkeypatch.setattr(worker_pool.os, "statvfs", lambda path: SimpleNamespace(f_bavail=1, f_frsize=4096))
+    with pytest.raises(RuntimeError, match="shm-size"):
+        WorkerPool(FakeEmbeddingService(), num_workers=1)
+
+
+def test_workers_run_real_torch_ops_after_the_parent_did():
+    # The parent runs a multi-threaded op first, as model warmup does; a forked child
+    # that used more than one intra-op thread would hang on its first matmul
+    script = """
+import asyncio
+import numpy as np
+import torch
+from services.worker_pool import WorkerPool
+
+class LinearService:
+    embedding_dim = 64
+
+    def __init__(self):
+        self.linear = torch.nn.Linear(256, 64)
+
+    def share_memory(self):
+        self.linear.share_memory()
+
+    def warmup(self):
+        self.encode_text(["a"] * 8)
+
+    def encode_text(self, texts, as_numpy=False):
+        with torch.no_grad():
+            return self.linear(torch.ones(len(texts), 256)).numpy()
+
+torch.set_num_threads(4)
+service = LinearService()
+expected = service.encode_text(["a"] * 32)
+pool = WorkerPool(service, num_workers=2, max_queue=4)
+
+async def calls():
+    return await asyncio.gather(*(pool.run("encode_text", ["a"] * 32, as_numpy=True) for _ in range(4)))
+
+try:
+    results = asyncio.run(asyncio.wait_for(calls(), timeout=30))
+    assert all(np.allclose(result, expected, atol=1e-5) for result in results)
+finally:
+    pool.shutdown()
+"""
+    subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, check=True, timeout=90)